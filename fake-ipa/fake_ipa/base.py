@@ -25,6 +25,10 @@ import uuid
 
 from fake_ipa import encoding
 from fake_ipa import error
+from fake_ipa.interning import ParamInterner
+from fake_ipa.profiling import HotPathTimers
+from fake_ipa.timing import CommandTimings
+from fake_ipa.tracing import Tracer
 
 
 LOG = logging.getLogger(__name__)
@@ -73,6 +77,8 @@ class BaseCommandResult(encoding.SerializableComparable):
 
     serializable_fields = ('id', 'command_name',
                            'command_status', 'command_error', 'command_result')
+    # Parameters only needed to run the command, never returned by the API
+    released_params = ('node', 'ports', 'configdrive')
 
     def __init__(self, command_name, command_params):
         """Construct an instance of BaseCommandResult.
@@ -97,6 +103,15 @@ class BaseCommandResult(encoding.SerializableComparable):
                  "status": self.command_status,
                  "result": self.command_result})
 
+    def release_params(self):
+        """Drop the parameters no longer needed once the command is done."""
+        if (ParamInterner.enabled
+                and any(name in self.command_params
+                        for name in self.released_params)):
+            self.command_params = {
+                name: value for name, value in self.command_params.items()
+                if name not in self.released_params}
+
     def is_done(self):
         """Checks to see if command is still RUNNING.
 
@@ -144,39 +159,81 @@ class SyncCommandResult(BaseCommandResult):
         else:
             self.command_status = AgentCommandStatus.FAILED
             self.command_error = result_or_error
+        self.release_params()
 
 
 class AsyncCommandResult(BaseCommandResult):
     """A command that executes asynchronously in the background."""
 
     def __init__(self, command_name, command_params, execute_method,
-                 agent=None):
+                 agent=None, tracker=None):
         """Construct an instance of AsyncCommandResult.
 
         :param command_name: name of command to execute
         :param command_params: parameters passed to command
         :param execute_method: a callable to be executed asynchronously
         :param agent: Optional: an instance of IronicPythonAgent
+        :param tracker: Optional: background work the command waits for,
+                        with `is_done()` and `status()` methods
         """
 
         super(AsyncCommandResult, self).__init__(command_name, command_params)
         self.agent = agent
         self.execute_method = execute_method
-        self.time = time.time() + random.randint(5, 10)
+        self.tracker = tracker
+        self.started = time.time_ns()
+        profile = CommandTimings.get_profile(command_name, command_params)
+        delay, self.inject_failure, hangs = profile.outcome()
+        # A hanging command never completes, like an agent stuck on hardware
+        self.time = float('inf') if hangs else time.time() + delay
+
+    def release_params(self):
+        super(AsyncCommandResult, self).release_params()
+        # The bound method holds the extension and its command map
+        self.execute_method = None
 
     def join(self, timeout=None):
         """Block until command has completed, and return result.
 
         :param timeout: float indicating max seconds to wait for command
-                        to complete. Defaults to None.
+                        to complete. Defaults to None. A hanging command
+                        never completes and is returned at once, still
+                        running, instead of blocking the caller until the
+                        timeout.
         """
-        time.sleep(max(0, self.time - time.time()))
+        if self.time == float('inf'):
+            return self
+        deadline = None if timeout is None else time.time() + timeout
+        delay = max(0, self.time - time.time())
+        if timeout is not None:
+            delay = min(delay, timeout)
+        time.sleep(delay)
+        while self.tracker is not None and not self.tracker.is_done():
+            if deadline is not None and time.time() >= deadline:
+                break
+            time.sleep(1)
         return self
 
+    def is_ready(self):
+        """Checks if the command is due to complete."""
+        return (time.time() >= self.time
+                and (self.tracker is None or self.tracker.is_done()))
+
+    def serialize(self):
+        data = super(AsyncCommandResult, self).serialize()
+        if self.tracker is not None and not self.is_done():
+            data['command_result'] = self.tracker.status()
+        return data
+
     def run(self):
         """Run a command."""
 
         try:
+            if self.inject_failure:
+                raise error.CommandExecutionError(
+                    'Injected failure of %s' % self.command_name)
+            if getattr(self.tracker, 'error', None) is not None:
+                raise self.tracker.error
             result = self.execute_method(**self.command_params)
             self.command_result = result
             self.command_status = AgentCommandStatus.SUCCEEDED
@@ -190,40 +247,61 @@ class AsyncCommandResult(BaseCommandResult):
             self.command_error = e
             self.command_status = AgentCommandStatus.FAILED
         finally:
+            self.release_params()
+            Tracer.record(
+                'command.%s' % self.command_name,
+                getattr(self.agent, 'system', None), self.started,
+                error=self.command_status == AgentCommandStatus.FAILED)
             if self.agent:
                 self.agent.force_heartbeat()
 
 
+EXTENSIONS = {
+    "standby": "fake_ipa.standby.StandbyExtension",
+    "clean": "fake_ipa.clean.CleanExtension",
+    "deploy": "fake_ipa.deploy.DeployExtension",
+    "image": "fake_ipa.image.ImageExtension",
+    "log": "fake_ipa.log.LogExtension"
+}
+
+
+def _extension_class(extension_name):
+    try:
+        ext_path, ext_class = EXTENSIONS[extension_name].rsplit(".", 1)
+    except ValueError:
+        raise error.ExtensionError(
+            '%s extension path error' % EXTENSIONS[extension_name]
+        )
+
+    module = import_module(ext_path)
+    return getattr(module, ext_class)
+
+
+def preload_extensions():
+    """Import all the extensions ahead of their first command."""
+    for extension_name in EXTENSIONS:
+        _extension_class(extension_name)
+
+
 class ExecuteCommandMixin(object):
     def __init__(self):
-        self.command_lock = threading.Lock()
+        # Serializes the commands of the agent and the refresh of their
+        # results, API requests are served by concurrent threads
+        self.command_lock = threading.RLock()
         self.command_results = collections.OrderedDict()
+        # Bumped whenever the serialized command results may have changed
+        self.command_results_version = 0
+        # Versions restart for every agent object, the random epoch keeps
+        # them from repeating the ETags of a previous agent of the node
+        self.command_results_epoch = uuid.uuid4().hex[:8]
 
     def get_extension(self, extension_name):
 
-        extensions_list = {
-            "standby": "fake_ipa.standby.StandbyExtension",
-            "clean": "fake_ipa.clean.CleanExtension",
-            "deploy": "fake_ipa.deploy.DeployExtension",
-            "image": "fake_ipa.image.ImageExtension",
-            "log": "fake_ipa.log.LogExtension"
-        }
-
-        if extension_name not in extensions_list:
+        if extension_name not in EXTENSIONS:
             raise error.ExtensionError(
                 'Extension %s does not exist !', extension_name
             )
-        try:
-            ext_path, ext_class = extensions_list[extension_name].rsplit(
-                ".", 1
-            )
-        except ValueError:
-            raise error.ExtensionError(
-                '%s extension path error' % extensions_list[extension_name]
-            )
-
-        module = import_module(ext_path)
-        return getattr(module, ext_class)()
+        return _extension_class(extension_name)(agent=self)
 
     def split_command(self, command_name):
         command_parts = command_name.split('.', 1)
@@ -234,13 +312,24 @@ class ExecuteCommandMixin(object):
         return (command_parts[0], command_parts[1])
 
     def refresh_last_async_command(self):
-        if len(self.command_results) > 0:
-            last_command = list(self.command_results.values())[-1]
-            if not last_command.is_done() and time.time() >= last_command.time:
-                last_command.run()
-
+        with self.command_lock:
+            if len(self.command_results) > 0:
+                last_command = list(self.command_results.values())[-1]
+                if not last_command.is_done():
+                    if last_command.is_ready():
+                        last_command.run()
+                        self.command_results_version += 1
+                    elif last_command.tracker is not None:
+                        # The progress of the command is part of its result
+                        self.command_results_version += 1
+
+    @HotPathTimers.timed('execute_command')
     def execute_command(self, command_name, **kwargs):
         """Execute an agent command."""
+        with self.command_lock:
+            return self._execute_command(command_name, **kwargs)
+
+    def _execute_command(self, command_name, **kwargs):
         self.refresh_last_async_command()
         LOG.debug(
             'Executing command: %(name)s with args: %(args)s',
@@ -249,6 +338,8 @@ class ExecuteCommandMixin(object):
                 'args': kwargs
             })
         extension_part, command_part = self.split_command(command_name)
+        kwargs = ParamInterner.intern_params(
+            kwargs, transient=BaseCommandResult.released_params)
 
         if len(self.command_results) > 0:
             last_command = list(self.command_results.values())[-1]
@@ -282,16 +373,20 @@ class ExecuteCommandMixin(object):
             LOG.exception('Command execution error: %s', e)
             result = SyncCommandResult(command_name, kwargs, False, e)
         self.command_results[result.id] = result
+        self.command_results_version += 1
         return result
 
 
-def async_command(command_name, validator=None):
+def async_command(command_name, validator=None, tracker=None):
     """Will run the command in an AsyncCommandResult in its own thread.
 
     command_name is set based on the func name and command_params will
     be whatever args/kwargs you pass into the decorated command.
     Return values of type `str` or `unicode` are prefixed with the
     `command_name` parameter when returned for consistency.
+    If a tracker is given, it is called with the same arguments when the
+    command starts and the command completes only once the returned
+    tracker is done.
     """
 
     def async_decorator(func):
@@ -307,10 +402,12 @@ def async_command(command_name, validator=None):
             # bind self to func so that AsyncCommandResult doesn't need to
             # know about the mode
             bound_func = functools.partial(func, self)
-            ret = AsyncCommandResult(command_name,
-                                     command_params,
-                                     bound_func,
-                                     agent=self.agent)
+            ret = AsyncCommandResult(
+                command_name,
+                command_params,
+                bound_func,
+                agent=self.agent,
+                tracker=tracker(self, **command_params) if tracker else None)
             LOG.info('Asynchronous command %(name)s started execution',
                      {'name': command_name})
             return ret
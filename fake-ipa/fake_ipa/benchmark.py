@@ -0,0 +1,537 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Microbenchmarks of the FakeIPA hot paths.
+
+`fake-ipa-benchmark run` measures each benchmark and writes the results as
+JSON, `fake-ipa-benchmark compare` compares two result files and exits
+with an error when a benchmark got slower than the threshold.
+`fake-ipa-benchmark memory` measures the memory held by the command
+results of an agent after a cleaning, with and without deduplication of
+the command parameters. `fake-ipa-benchmark scaling` measures the
+heartbeat and command throughput against the number of threads, to
+compare interpreters with and without the GIL.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import os
+import statistics
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+import types
+import uuid
+
+import requests
+
+from fake_ipa import base
+from fake_ipa.fake_agent import AgentPool
+from fake_ipa.fake_agent import FakeIronicPythonAgent
+from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.interning import ParamInterner
+from fake_ipa.ironic_api_client import APIClient
+from fake_ipa.settings import Settings
+from fake_ipa.settings import SharedSettings
+from fake_ipa.tracing import Tracer
+
+LOG = logging.getLogger(__name__)
+
+QUEUE_SIZES = (1000, 10000, 50000)
+API_URL = 'http://192.0.2.2:6385'
+CONFIG = {
+    'FAKE_IPA_ADVERTISE_ADDRESS_IP': '192.0.2.1',
+    'FAKE_IPA_ADVERTISE_ADDRESS_PORT': 9999,
+    'FAKE_IPA_INSECURE': True,
+}
+
+
+def make_system(index=0):
+    return {
+        'uuid': str(uuid.uuid4()),
+        'name': 'bench-%05d' % index,
+        'power_state': 'Off',
+        'boot_device': 'Pxe',
+        'nics': [{'mac': '52:54:02:%02x:%02x:%02x' % (
+            index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff)}],
+    }
+
+
+def make_agent(system=None):
+    agent = FakeIronicPythonAgent(system or make_system(), None)
+    agent.node = {'uuid': agent.system['uuid']}
+    agent.heartbeat_timeout = 300
+    agent.heartbeater = Heatbeater()
+    return agent
+
+
+class _OfflineSession(requests.Session):
+    """Session building and preparing requests without sending them."""
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.status_code = requests.codes.ACCEPTED
+        response.request = request
+        return response
+
+
+class _NoopHeartbeater(Heatbeater):
+
+    def do_heartbeat(self, system, agent):
+        return True
+
+
+def bench_encode_command_list(size):
+    from fake_ipa import main
+    params = {'node': {'uuid': str(uuid.uuid4()), 'provision_state':
+                       'deploying'}, 'ports': []}
+    results = [base.SyncCommandResult('clean.get_clean_steps', params, True,
+                                      {'clean_steps': {}})
+               for _ in range(size)]
+    return lambda: main.jsonify({'commands': results})
+
+
+def bench_execute_command():
+    agent = make_agent()
+    params = {'node': {'uuid': agent.system['uuid']}, 'ports': []}
+
+    def run():
+        agent.execute_command('clean.get_clean_steps', **params)
+        agent.command_results.clear()
+    return run
+
+
+def bench_heartbeater_schedule(size, due):
+    Heatbeater.queue.clear()
+    Heatbeater.remove_from_q.clear()
+    for index in range(size):
+        agent = make_agent(make_system(index))
+        # Due agents are heartbeaten on every pass, idle ones never
+        agent.heartbeater.interval = 0 if due else 3600
+        Heatbeater.queue.append((agent.system, agent, time.time()))
+    return _NoopHeartbeater().process_next
+
+
+def bench_power_cycle(pooled):
+    """Agent of a system booted, looked up and powered off."""
+    system = make_system()
+    lookup = {'node': {'uuid': system['uuid']},
+              'config': {'heartbeat_timeout': 300,
+                         'agent_token': 'x' * 43}}
+
+    def run():
+        if pooled:
+            agent = AgentPool.acquire(system, API_URL)
+        else:
+            agent = FakeIronicPythonAgent(system, API_URL)
+        agent.process_lookup_data(lookup)
+        agent.shutdown()
+    return run
+
+
+def bench_api_heartbeat():
+    client = APIClient(make_system(), API_URL)
+    client.session = _OfflineSession()
+    client._ironic_api_version = (1, 81)
+    client.agent_token = 'x' * 43
+    address = Heatbeater.advertise_address
+    return lambda: client.heartbeat(uuid=client.node['uuid'],
+                                    advertise_address=address)
+
+
+def bench_notification_handler():
+    from fake_ipa import main
+    main.app.logger.setLevel(logging.WARNING)
+    client = main.app.test_client()
+    system = dict(make_system(), pending_power={
+        'power_state': 'Off', 'apply_time': int(time.time())})
+    return lambda: client.put('/', json=system)
+
+
+def make_node(system, step):
+    """Node document as sent by Ironic with the clean step commands."""
+    return {
+        'uuid': system['uuid'],
+        'name': system['name'],
+        'driver': 'redfish',
+        'provision_state': 'cleaning',
+        'properties': {'cpu_arch': 'x86_64', 'local_gb': 50, 'memory_mb': 4096,
+                       'cpus': 2, 'capabilities': 'boot_mode:uefi'},
+        'driver_info': {'redfish_address': 'http://192.0.2.1:8000',
+                        'redfish_system_id': '/redfish/v1/Systems/%s'
+                        % system['uuid'],
+                        'redfish_username': 'admin',
+                        'redfish_verify_ca': False,
+                        'deploy_kernel': 'http://192.0.2.1/ipa.kernel',
+                        'deploy_ramdisk': 'http://192.0.2.1/ipa.initramfs'},
+        'instance_info': {},
+        # Ironic records the progress of the cleaning in the node
+        'driver_internal_info': {'agent_url': 'http://192.0.2.3:9999',
+                                 'clean_step_index': step,
+                                 'agent_version': '9.10.0',
+                                 'last_power_state_change': '2024-01-01T00:'
+                                 '00:%02d' % step},
+        'clean_step': {'step': 'step_%d' % step, 'interface': 'deploy',
+                       'priority': 100 - step, 'args': {},
+                       'abortable': False},
+    }
+
+
+def make_ports(system):
+    return [{'uuid': str(uuid.uuid4()), 'address': nic['mac'],
+             'node_uuid': system['uuid'], 'pxe_enabled': True,
+             'local_link_connection': {}, 'extra': {}}
+            for nic in system['nics']]
+
+
+def clean_agents(count, steps):
+    """Agents of systems cleaned with some steps each."""
+    agents = []
+    for index in range(count):
+        agent = make_agent(make_system(index))
+        ports = make_ports(agent.system)
+        agent.execute_command('clean.get_clean_steps',
+                              node=make_node(agent.system, 0), ports=ports)
+        for step in range(steps):
+            node = make_node(agent.system, step)
+            result = agent.execute_command(
+                'clean.execute_clean_step', node=node, ports=ports,
+                step=dict(node['clean_step']), clean_version={})
+            result.run()
+        agents.append(agent)
+    return agents
+
+
+def command_results_memory(count, steps, dedup):
+    """Bytes allocated per agent by the command results of a cleaning."""
+    ParamInterner.enabled = dedup
+    ParamInterner.documents.clear()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        agents = clean_agents(count, steps)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    # Only what is still referenced by the command results is counted
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del agents
+    return size // count
+
+
+class _NoStress:
+    """Stress schedule of the scaling benchmark, only the slots matter."""
+
+    def record(self, step, latency, success):
+        pass
+
+
+def heartbeat_worker(size):
+    """Heartbeat the agents of a shared queue regardless of interval."""
+    Heatbeater.queue.clear()
+    Heatbeater.remove_from_q.clear()
+    for index in range(size):
+        agent = FakeIronicPythonAgent(make_system(index), API_URL)
+        agent.node = {'uuid': agent.system['uuid']}
+        agent.heartbeat_timeout = 300
+        agent.api_client.session = _OfflineSession()
+        agent.api_client._ironic_api_version = (1, 81)
+        agent.api_client.agent_token = 'x' * 43
+        Heatbeater.add_to_q(agent.system, agent)
+    stress = _NoStress()
+
+    def worker():
+        heartbeater = Heatbeater()
+        return lambda: heartbeater.process_next(stress, 0)
+    return worker
+
+
+def command_worker():
+    """Execute commands, each thread with its own agent."""
+    def worker():
+        agent = make_agent()
+        params = {'node': {'uuid': agent.system['uuid']}, 'ports': []}
+
+        def run():
+            agent.execute_command('clean.get_clean_steps', **params)
+            agent.command_results.clear()
+        return run
+    return worker
+
+
+def throughput(worker, nb_threads, duration):
+    """Calls per second of the functions of some threads running together.
+
+    :param worker: called in each thread, returns the function to call.
+    """
+    counts = [0] * nb_threads
+    barrier = threading.Barrier(nb_threads + 1)
+    deadline = []
+
+    def run(index):
+        func = worker()
+        barrier.wait()
+        count = 0
+        while time.perf_counter() < deadline[0]:
+            func()
+            count += 1
+        counts[index] = count
+
+    threads = [threading.Thread(target=run, args=(index,))
+               for index in range(nb_threads)]
+    for thread in threads:
+        thread.start()
+    deadline.append(time.perf_counter() + duration)
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    return round(sum(counts) / duration, 1)
+
+
+def gil_enabled():
+    # sys._is_gil_enabled() only exists from Python 3.13
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def benchmarks():
+    """Map of benchmark name to the factory of the function to time."""
+    suite = {}
+    for size in (10, 100, 1000):
+        suite['encode_command_list_%d' % size] = (
+            lambda size=size: bench_encode_command_list(size))
+    suite['execute_command'] = bench_execute_command
+    for size in QUEUE_SIZES:
+        suite['heartbeater_schedule_idle_%d' % size] = (
+            lambda size=size: bench_heartbeater_schedule(size, False))
+        suite['heartbeater_schedule_due_%d' % size] = (
+            lambda size=size: bench_heartbeater_schedule(size, True))
+    suite['power_cycle_new_agent'] = lambda: bench_power_cycle(False)
+    suite['power_cycle_pooled_agent'] = lambda: bench_power_cycle(True)
+    suite['api_client_heartbeat'] = bench_api_heartbeat
+    suite['notification_handler'] = bench_notification_handler
+    return suite
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """Time a function.
+
+    :returns: a dict with the per call time statistics in microseconds.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    times = [t / number * 1e6 for t in timer.repeat(repeat, number)]
+    return {
+        'unit': 'us',
+        'number': number,
+        'repeat': repeat,
+        'min': round(min(times), 3),
+        'median': round(statistics.median(times), 3),
+        'max': round(max(times), 3),
+        'stdev': round(statistics.stdev(times), 3) if repeat > 1 else 0.0,
+    }
+
+
+def run_settings():
+    settings = Settings.from_config(CONFIG)
+    Heatbeater.initialize(CONFIG, LOG, settings)
+    APIClient.initialize(CONFIG, LOG, settings)
+    FakeIronicPythonAgent._config = CONFIG
+    SharedSettings.set(settings)
+    FakeIronicPythonAgent.api = types.SimpleNamespace(agents={})
+    FakeIronicPythonAgent._logger = LOG
+
+
+def run(args):
+    run_settings()
+    results = {}
+    for name, factory in benchmarks().items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        results[name] = measure(factory(), args.repeat, args.min_time)
+        print('%-40s %12.3f us' % (name, results[name]['median']),
+              file=sys.stderr)
+    Heatbeater.queue.clear()
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': int(time.time()),
+        },
+        'benchmarks': results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    return 0
+
+
+def memory(args):
+    run_settings()
+    Tracer.enabled = False
+    report = {}
+    for dedup in (False, True):
+        name = 'dedup' if dedup else 'no_dedup'
+        report[name] = command_results_memory(args.agents, args.steps, dedup)
+        print('%-40s %12d bytes per agent' % (name, report[name]),
+              file=sys.stderr)
+    report['saved_ratio'] = round(
+        1 - report['dedup'] / max(report['no_dedup'], 1), 3)
+    report['interner'] = ParamInterner.status()
+    print(json.dumps(report, indent=2, sort_keys=True))
+    return 0
+
+
+def scaling(args):
+    run_settings()
+    workers = {
+        'heartbeat': heartbeat_worker(args.agents),
+        'execute_command': command_worker(),
+    }
+    results = {}
+    for name, worker in workers.items():
+        results[name] = {}
+        for nb_threads in args.threads:
+            rate = throughput(worker, nb_threads, args.duration)
+            results[name][nb_threads] = {
+                'per_second': rate,
+                'speedup': round(rate / results[name][args.threads[0]][
+                    'per_second'], 2) if results[name] else 1.0,
+            }
+            print('%-20s %4d threads %12.1f /s' % (name, nb_threads, rate),
+                  file=sys.stderr)
+    Heatbeater.queue.clear()
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'gil_enabled': gil_enabled(),
+            'cpus': os.cpu_count(),
+            'timestamp': int(time.time()),
+        },
+        'throughput': results,
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    return 0
+
+
+def thread_counts(value):
+    try:
+        counts = [int(count) for count in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('Invalid thread counts %s' % value)
+    if not counts or min(counts) < 1:
+        raise argparse.ArgumentTypeError('Invalid thread counts %s' % value)
+    return counts
+
+
+def compare(args):
+    with open(args.old) as f:
+        old = json.load(f)['benchmarks']
+    with open(args.new) as f:
+        new = json.load(f)['benchmarks']
+
+    regressions = 0
+    print('%-40s %12s %12s %8s' % ('benchmark', 'old (us)', 'new (us)',
+                                   'ratio'))
+    for name in sorted(set(old) | set(new)):
+        if name not in old or name not in new:
+            print('%-40s %s' % (name, 'only in %s' % (
+                args.old if name in old else args.new)))
+            continue
+        ratio = new[name]['median'] / old[name]['median']
+        if ratio > 1 + args.threshold:
+            verdict = 'slower'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            verdict = 'faster'
+        else:
+            verdict = ''
+        print('%-40s %12.3f %12.3f %7.2fx %s' % (
+            name, old[name]['median'], new[name]['median'], ratio,
+            verdict))
+    return 1 if regressions else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('fake-ipa-benchmark')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Run the benchmarks.')
+    run_parser.add_argument('--output', '-o',
+                            help='Results file, stdout if not set.')
+    run_parser.add_argument('--filter', '-k', action='append',
+                            help='Only run the benchmarks whose name '
+                                 'contains this string.')
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--min-time', type=float, default=0.2,
+                            help='Minimum duration of a repeat in seconds.')
+    run_parser.set_defaults(func=run)
+    memory_parser = subparsers.add_parser(
+        'memory', help='Measure the memory held by command results.')
+    memory_parser.add_argument('--agents', type=int, default=100)
+    memory_parser.add_argument('--steps', type=int, default=20,
+                               help='Clean steps executed per agent.')
+    memory_parser.set_defaults(func=memory)
+    scaling_parser = subparsers.add_parser(
+        'scaling', help='Measure the throughput against the number of '
+                        'threads.')
+    scaling_parser.add_argument('--output', '-o',
+                                help='Results file, stdout if not set.')
+    scaling_parser.add_argument('--threads', type=thread_counts,
+                                default=[1, 2, 4, 8],
+                                help='Comma separated thread counts.')
+    scaling_parser.add_argument('--duration', type=float, default=2,
+                                help='Duration of a measure in seconds.')
+    scaling_parser.add_argument('--agents', type=int, default=1000,
+                                help='Agents in the heartbeater queue.')
+    scaling_parser.set_defaults(func=scaling)
+    compare_parser = subparsers.add_parser(
+        'compare', help='Compare two results files.')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Relative slowdown reported as a '
+                                     'regression.')
+    compare_parser.set_defaults(func=compare)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    # Logging output is not part of what is measured
+    logging.getLogger('fake_ipa').setLevel(logging.WARNING)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
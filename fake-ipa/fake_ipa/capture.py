@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import functools
+import json
+import re
+import threading
+import time
+import urllib.parse
+
+CAPTURE_VERSION = 1
+_UUID_RE = re.compile(
+    r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def route_of(path):
+    """Path with the UUIDs replaced, to group the requests of all nodes."""
+    return _UUID_RE.sub('<uuid>', path)
+
+
+class TrafficCapture:
+    """Append-only capture of the FakeIPA traffic in JSON lines.
+
+    Inbound records are the power notifications and the command API calls
+    with their bodies, so they can be replayed by fake-ipa-replay.
+    Outbound records are the responses of Ironic, the inspector and the
+    Redfish emulator, with their latency. Requests failing without a
+    response are not captured.
+    """
+
+    enabled = False
+    # Inbound requests captured, by Flask endpoint
+    inbound_endpoints = ('notification_handler', 'api_list_commands',
+                         'api_get_command', 'api_run_command')
+    _file = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._logger = logger
+        path = settings.capture_file
+        cls.enabled = bool(path)
+        if not path:
+            return cls
+        cls._file = open(path, 'a', buffering=1)
+        cls._write({'type': 'start', 'version': CAPTURE_VERSION,
+                    't': round(time.time(), 6)})
+        logger.info('Capturing the traffic to %s', path)
+        return cls
+
+    @classmethod
+    def _write(cls, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with cls._lock:
+            cls._file.write(line)
+
+    @classmethod
+    def inbound(cls, request, response, started):
+        """Record a request served by FakeIPA.
+
+        :param started: time the request was received, in seconds since
+                        the epoch.
+        """
+        record = {
+            'type': 'in',
+            't': round(started, 6),
+            'latency': round(time.time() - started, 6),
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule,
+            'status': response.status_code,
+        }
+        if request.query_string:
+            record['query'] = request.query_string.decode()
+        body = request.get_json(silent=True)
+        if body is not None:
+            record['body'] = body
+        if (request.endpoint == 'api_run_command' and response.is_json
+                and not response.is_streamed):
+            # Replays map the captured command IDs to the replayed ones,
+            # streamed system logs are not read back to find theirs
+            record['result_id'] = (response.get_json(silent=True)
+                                   or {}).get('id')
+        cls._write(record)
+
+    @classmethod
+    def attach(cls, session, target):
+        """Record the responses received by a requests session."""
+        if cls.enabled:
+            session.hooks['response'].append(
+                functools.partial(cls._outbound, target))
+
+    @classmethod
+    def _outbound(cls, target, response, **kwargs):
+        latency = response.elapsed.total_seconds()
+        url = urllib.parse.urlsplit(response.request.url)
+        cls._write({
+            'type': 'out',
+            't': round(time.time() - latency, 6),
+            'latency': round(latency, 6),
+            'target': target,
+            'method': response.request.method,
+            'path': url.path,
+            'route': route_of(url.path),
+            'status': response.status_code,
+        })
@@ -16,28 +16,10 @@
 import logging
 
 from fake_ipa import base
+from fake_ipa.steps import StepCatalog
 
 LOG = logging.getLogger(__name__)
 
-clean_steps = {
-    "GenericHardwareManager": [
-        {
-            "step": "erase_devices",
-            "priority": 10,
-            "interface": "deploy",
-            "reboot_requested": False,
-            "abortable": True
-            },
-        {
-            "step": "erase_devices_metadata",
-            "priority": 99,
-            "interface": "deploy",
-            "reboot_requested": False,
-            "abortable": True
-            }
-        ]
-}
-
 
 class CleanExtension(base.BaseAgentExtension):
     @base.sync_command('get_clean_steps')
@@ -50,14 +32,8 @@ class CleanExtension(base.BaseAgentExtension):
         :returns: A list of clean steps with keys step, priority, and
             reboot_requested
         """
-        LOG.debug('Getting clean steps, called with node: %(node)s, '
-                  'ports: %(ports)s', {'node': node, 'ports': ports})
-        return {
-            'clean_steps': clean_steps,
-            'hardware_manager_version': {
-                "fake_hardware_manager": "1.1"
-                },
-        }
+        LOG.debug('Getting clean steps for node %s', node.get('uuid'))
+        return StepCatalog.steps_response('clean')
 
     @base.async_command('execute_clean_step')
     def execute_clean_step(self, step, node, ports, clean_version=None,
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import gzip
+import threading
+import time
+import weakref
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ResponseCompressor:
+    """Negotiated compression of the large IPA API responses.
+
+    Responses with an ETag always have the same body for the same ETag, so
+    their compressed bytes are cached and reused by the following polls.
+    The PreEncoded documents embedded in responses, like the step catalogs,
+    are compressed once: the response is sent as concatenated gzip members
+    or zstd frames, the cached ones of its documents and the ones of the
+    JSON around them. Compressed responses get their own ETag, the identity
+    one suffixed with the content coding, as RFC 9110 section 8.8.3
+    requires.
+    """
+
+    encodings = ('gzip', 'zstd')
+
+    enabled = False
+    min_size = 65536
+    level = 1
+    cache_size = 128
+    # route -> [responses, bytes in, bytes out, cpu seconds]
+    stats = collections.defaultdict(lambda: [0, 0, 0, 0.0])
+    _cache = collections.OrderedDict()
+    # PreEncoded document -> {encoding: compressed bytes}
+    _documents = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._logger = logger
+        cls.enabled = settings.compression
+        cls.min_size = settings.compression_min_size
+        cls.level = settings.compression_level
+        cls.cache_size = settings.compression_cache_size
+        if cls.enabled:
+            logger.info('Compressing responses above %d bytes with %s',
+                        cls.min_size,
+                        'zstd and gzip' if zstandard else 'gzip')
+        return cls
+
+    @classmethod
+    def _encoding(cls, accept_encodings):
+        if zstandard is not None and 'zstd' in accept_encodings:
+            return 'zstd'
+        if 'gzip' in accept_encodings:
+            return 'gzip'
+
+    @classmethod
+    def match(cls, etag, if_none_match):
+        """Find the variant of an identity ETag a client already has.
+
+        :param etag: the ETag of the identity response
+        :param if_none_match: the If-None-Match header of the request
+        :returns: the matching ETag, with its content coding suffix if
+                  any, or None.
+        """
+        for variant in (etag,) + tuple('%s-%s' % (etag, encoding)
+                                       for encoding in cls.encodings):
+            if variant in if_none_match:
+                return variant
+
+    @classmethod
+    def _compress(cls, data, encoding):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=cls.level).compress(data)
+        return gzip.compress(data, compresslevel=cls.level)
+
+    @classmethod
+    def _compress_document(cls, document, encoding):
+        with cls._lock:
+            compressed = cls._documents.get(document, {}).get(encoding)
+        if compressed is None:
+            compressed = cls._compress(document.json.encode(), encoding)
+            with cls._lock:
+                cls._documents.setdefault(document, {})[encoding] = compressed
+        return compressed
+
+    @classmethod
+    def _compress_parts(cls, parts, encoding):
+        """Compress JSON parts, reusing the compressed documents.
+
+        Concatenated gzip members and zstd frames decompress to the
+        concatenation of their contents.
+        """
+        return b''.join(
+            cls._compress(part.encode(), encoding) if isinstance(part, str)
+            else cls._compress_document(part, encoding)
+            for part in parts if part)
+
+    @classmethod
+    def compress(cls, response, route, accept_encodings):
+        """Compress a response in place if it is worth it."""
+        if (not cls.enabled or response.status_code != 200
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = cls._encoding(accept_encodings)
+        if encoding is None or response.content_length < cls.min_size:
+            return response
+
+        # The ETags of the IPA API include the random epoch of the agent,
+        # so the cache keys are never shared by different agents.
+        etag = response.get_etag()[0]
+        key = (etag, encoding)
+        compressed = None
+        if etag:
+            with cls._lock:
+                compressed = cls._cache.get(key)
+                if compressed is not None:
+                    cls._cache.move_to_end(key)
+
+        data = response.get_data()
+        cpu_time = 0.0
+        if compressed is None:
+            parts = getattr(response, 'json_parts', None)
+            started = time.thread_time()
+            if parts and not all(isinstance(part, str) for part in parts):
+                compressed = cls._compress_parts(parts, encoding)
+            else:
+                compressed = cls._compress(data, encoding)
+            cpu_time = time.thread_time() - started
+            if etag:
+                with cls._lock:
+                    cls._cache[key] = compressed
+                    while len(cls._cache) > cls.cache_size:
+                        cls._cache.popitem(last=False)
+
+        with cls._lock:
+            stats = cls.stats[route]
+            stats[0] += 1
+            stats[1] += len(data)
+            stats[2] += len(compressed)
+            stats[3] += cpu_time
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag('%s-%s' % (etag, encoding))
+        return response
+
+    @classmethod
+    def report(cls):
+        """Compression ratio and CPU time per route."""
+        with cls._lock:
+            return {
+                route: {
+                    'responses': count,
+                    'bytes_in': bytes_in,
+                    'bytes_out': bytes_out,
+                    'ratio': round(bytes_in / bytes_out, 2)
+                    if bytes_out else None,
+                    'cpu_seconds': round(cpu, 3),
+                }
+                for route, (count, bytes_in, bytes_out, cpu)
+                in cls.stats.items()
+            }
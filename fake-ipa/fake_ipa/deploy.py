@@ -15,20 +15,10 @@
 import logging
 
 from fake_ipa import base
+from fake_ipa.steps import StepCatalog
 
 LOG = logging.getLogger(__name__)
 
-deploy_steps = {
-    "GenericHardwareManager": [
-        {
-            "step": "write_image",
-            "priority": 0,
-            "interface": "deploy",
-            "reboot_requested": False
-        }
-    ]
-}
-
 
 class DeployExtension(base.BaseAgentExtension):
     @base.sync_command('get_deploy_steps')
@@ -41,14 +31,8 @@ class DeployExtension(base.BaseAgentExtension):
         :returns: A list of deploy steps with keys step, priority, and
             reboot_requested
         """
-        LOG.debug('Getting deploy steps, called with node: %(node)s, '
-                  'ports: %(ports)s', {'node': node, 'ports': ports})
-        return {
-            'deploy_steps': deploy_steps,
-            'hardware_manager_version': {
-                "generic_hardware_manager": "1.1"
-                },
-        }
+        LOG.debug('Getting deploy steps for node %s', node.get('uuid'))
+        return StepCatalog.steps_response('deploy')
 
     @base.async_command('execute_deploy_step')
     def execute_deploy_step(self, step, node, ports, deploy_version=None,
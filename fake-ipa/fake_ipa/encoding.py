@@ -14,6 +14,8 @@
 #    under the License.
 
 import json
+import re
+import secrets
 import uuid
 
 
@@ -44,6 +46,63 @@ class SerializableComparable(Serializable):
         return self.serialize() != other.serialize()
 
 
+class PreEncoded(object):
+    """A JSON document encoded once and embedded as is by the encoder.
+
+    Use it for large documents that are returned many times unchanged.
+    """
+
+    def __init__(self, value, encoded=None):
+        """Construct an instance of PreEncoded.
+
+        :param value: the document to encode
+        :param encoded: the document already JSON encoded, if available
+        """
+        self.value = value
+        self.json = json.dumps(value) if encoded is None else encoded
+
+    def __repr__(self):
+        return '<PreEncoded %d bytes>' % len(self.json)
+
+    def chunks(self):
+        """Yield the JSON document in chunks."""
+        yield self.json
+
+
+class PreEncodedFile(PreEncoded):
+    """A JSON document encoded once to a file.
+
+    The file is read in chunks when a response is streamed, so documents
+    too large to be kept in memory are served without any copy.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, path):
+        """Construct an instance of PreEncodedFile.
+
+        :param path: path of the file holding the JSON document
+        """
+        self.value = None
+        self.path = path
+
+    @property
+    def json(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def __repr__(self):
+        return '<PreEncodedFile %s>' % self.path
+
+    def chunks(self):
+        with open(self.path) as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
 def serialize_lib_exc(exc):
     """Serialize an ironic-lib exception."""
     return {'type': exc.__class__.__name__,
@@ -61,13 +120,86 @@ class RESTJSONEncoder(json.JSONEncoder):
         Appends a newline to responses when configured to pretty-print,
         in order to make use of curl less painful from most shells.
         """
-        delimiter = ''
+        return ''.join(part if isinstance(part, str) else part.json
+                       for part in self.parts(o))
+
+    def stream(self, o):
+        """Turn an object into JSON without loading file backed documents.
+
+        :returns: the JSON document as a string, or an iterator over its
+                  chunks if it embeds a :class:`PreEncodedFile`.
+        """
+        return self.join(self.parts(o))
 
+    def parts(self, o):
+        """Turn an object into JSON split around its PreEncoded documents.
+
+        :returns: a list of JSON strings and of the embedded
+                  :class:`PreEncoded` documents, in order.
+        """
+        data, embedded, marker = self._encode(o)
+        parts = [data]
+        if embedded:
+            # Even parts are literal JSON, odd parts are document indexes
+            parts = [embedded[int(part)] if i % 2 else part
+                     for i, part in enumerate(marker.split(data))
+                     if i % 2 or part]
+        if self._delimiter:
+            parts.append(self._delimiter)
+        return parts
+
+    @staticmethod
+    def join(parts):
+        """Join the result of :meth:`parts` like :meth:`stream` does."""
+        if not any(isinstance(part, PreEncodedFile) for part in parts):
+            return ''.join(part if isinstance(part, str) else part.json
+                           for part in parts)
+        return RESTJSONEncoder._chunks(parts)
+
+    @staticmethod
+    def _chunks(parts):
+        for part in parts:
+            if isinstance(part, str):
+                yield part
+            else:
+                yield from part.chunks()
+
+    @property
+    def _delimiter(self):
         # if indent is None, newlines are still inserted, so we should too.
-        if self.indent is not None:
-            delimiter = '\n'
+        return '' if self.indent is None else '\n'
 
-        return super(RESTJSONEncoder, self).encode(o) + delimiter
+    def _encode(self, o):
+        """Encode an object, leaving markers for the pre-encoded documents.
+
+        PreEncoded documents are encoded as markers holding a random nonce
+        drawn for this call only, so no string of the document can be
+        mistaken for one. The encoder is shared between threads, hence the
+        per call state.
+
+        :returns: a tuple (JSON with markers, embedded documents, compiled
+                  marker pattern capturing the document index).
+        """
+        embedded = []
+        nonce = None
+
+        def default(obj):
+            nonlocal nonce
+            if not isinstance(obj, PreEncoded):
+                return self.default(obj)
+            if nonce is None:
+                nonce = secrets.token_hex(16)
+            embedded.append(obj)
+            return '%s:%d' % (nonce, len(embedded) - 1)
+
+        data = json.JSONEncoder(
+            skipkeys=self.skipkeys, ensure_ascii=self.ensure_ascii,
+            check_circular=self.check_circular, allow_nan=self.allow_nan,
+            sort_keys=self.sort_keys, indent=self.indent,
+            separators=(self.item_separator, self.key_separator),
+            default=default).encode(o)
+        marker = re.compile(r'"%s:(\d+)"' % nonce) if embedded else None
+        return data, embedded, marker
 
     def default(self, o):
         """Turn an object into a serializable object.
@@ -14,32 +14,55 @@
 #    under the License.
 
 import random
+import threading
 import time
 
 
 from fake_ipa import base
 from fake_ipa import error
 from fake_ipa.heartbeater import Heatbeater
-from fake_ipa import inspector
+from fake_ipa.inspector import Inspector
+from fake_ipa.interning import ParamInterner
+from fake_ipa import inventory
 from fake_ipa.ironic_api_client import APIClient
-from fake_ipa.ironic_api_client import get_ssl_client_options
+from fake_ipa.redfish import RedfishClient
+from fake_ipa.settings import SharedSettings
+from fake_ipa.steps import StepCatalog
+from fake_ipa.timing import CommandTimings
+from fake_ipa.tracing import Tracer
+from fake_ipa.transfer import ImageTransfers
 
 
 class FakeIronicPythonAgent(base.ExecuteCommandMixin):
     """Class for faking ipa functionality."""
 
     agent_token = None
+    cached_image_id = None
+    settings = SharedSettings()
 
     @classmethod
-    def initialize(cls, config, logger, api):
-        config.setdefault('FAKE_IPA_INSPECTION_CALLBACK_URL',
-                          'http://localhost:5050/v1/continue')
-        config.setdefault('FAKE_IPA_MIN_BOOT_TIME', 180)
-        config.setdefault('FAKE_IPA_MAX_BOOT_TIME', 240)
+    def initialize(cls, config, logger, api, settings):
         cls._config = config
         cls._logger = logger
         cls.api = api
-        Heatbeater.initialize(config, logger).run_heartbeater_threads(2)
+        SharedSettings.set(settings)
+        cls.inventory_profile = inventory.load_profile(config)
+        logger.info('Using inventory profile %s for inspection',
+                    cls.inventory_profile.name)
+        if settings.inspection_callback_url:
+            Inspector.initialize(config, logger, settings)
+        RedfishClient.initialize(config, logger, settings)
+        APIClient.initialize(config, logger, settings)
+        CommandTimings.initialize(config, logger)
+        StepCatalog.initialize(config, logger)
+        ParamInterner.initialize(config, logger, settings)
+        ImageTransfers.initialize(config, logger, settings)
+        Heatbeater.initialize(config, logger, settings)
+        Heatbeater.run_heartbeater_threads(settings.heartbeater_threads)
+        if config.get('FAKE_IPA_HEARTBEAT_STRESS_SCHEDULE'):
+            Heatbeater.start_stress(
+                config['FAKE_IPA_HEARTBEAT_STRESS_SCHEDULE'],
+                settings.heartbeat_stress_threads)
         return cls
 
     def __init__(self, system, api_url,
@@ -49,34 +72,30 @@ class FakeIronicPythonAgent(base.ExecuteCommandMixin):
         self.system = system
         self.api_url = api_url
         if self.api_url:
-            self.api_client = APIClient.initialize(
-                self._config, self._logger)(self.system, self.api_url)
+            self.api_client = APIClient(self.system, self.api_url)
             self.heartbeater = Heatbeater()
         self.lookup_timeout = lookup_timeout
         self.lookup_interval = lookup_interval
         self.ip_lookup_attempts = ip_lookup_attempts
         self.ip_lookup_sleep = ip_lookup_sleep
 
+    @Tracer.traced('boot', lambda self: self.system)
     def boot(self):
 
         # Waiting for ironic to unlock the node after changing the power state
-        time.sleep(random.randint(
-            self._config["FAKE_IPA_MIN_BOOT_TIME"],
-            self._config["FAKE_IPA_MAX_BOOT_TIME"]))
+        with Tracer.span('boot_wait', self.system):
+            time.sleep(random.randint(self.settings.min_boot_time,
+                                      self.settings.max_boot_time))
 
         uuid = None
-        verify, cert = get_ssl_client_options(self._config)
-        if self._config["FAKE_IPA_INSPECTION_CALLBACK_URL"]:
+        if self.settings.inspection_callback_url:
             self._logger.debug(
                 "Starting inspection node %s and sending data to %s",
                 self.system["name"],
-                self._config["FAKE_IPA_INSPECTION_CALLBACK_URL"])
+                self.settings.inspection_callback_url)
             try:
-                uuid = inspector.inspect(
-                    self.system,
-                    self._config["FAKE_IPA_INSPECTION_CALLBACK_URL"],
-                    verify, cert,
-                    self._logger)
+                uuid = Inspector.inspect(self.system,
+                                         self.inventory_profile)
             except Exception as exc:
                 self._logger.error('Failed to perform inspection: %s', exc)
             self._logger.debug("Inspection UUID %s", uuid)
@@ -89,7 +108,7 @@ class FakeIronicPythonAgent(base.ExecuteCommandMixin):
             self._logger.debug('Received lookup results: %s', content)
             self.process_lookup_data(content)
 
-        elif self._config["FAKE_IPA_INSPECTION_CALLBACK_URL"]:
+        elif self.settings.inspection_callback_url:
             self._logger.info(
                 'No FAKE_IPA_API_URL configured,'
                 'Heartbeat and lookup'
@@ -107,6 +126,19 @@ class FakeIronicPythonAgent(base.ExecuteCommandMixin):
                 'Adding Node %s to the heartbeater queue', self.system['uuid'])
             Heatbeater.add_to_q(self.system, self)
 
+    def register(self, node_uuid=None):
+        """Look up the node and start heartbeating right away.
+
+        Used for nodes that are already enrolled and inspected, it skips
+        the boot delay and inspection.
+        """
+        content = self.api_client.lookup_node(
+            timeout=self.lookup_timeout,
+            starting_interval=self.lookup_interval,
+            node_uuid=node_uuid)
+        self.process_lookup_data(content)
+        Heatbeater.add_to_q(self.system, self)
+
     def process_lookup_data(self, content):
         """Update agent configuration from lookup data."""
 
@@ -149,14 +181,49 @@ class FakeIronicPythonAgent(base.ExecuteCommandMixin):
     def force_heartbeat(self):
         self.heartbeater.force_heartbeat()
 
-    def list_command_results(self):
+    def shutdown(self):
+        """Forget the agent once its system is powered off and park it."""
+        node_uuid = getattr(self, 'node', {}).get('uuid')
+        agents = FakeIronicPythonAgent.api.agents
+        if agents.get(node_uuid) is self:
+            agents.pop(node_uuid, None)
+        with self.command_lock:
+            self.command_results.clear()
+            # Never reuse a version, clients may have cached its ETag
+            self.command_results_version += 1
+        if self.api_url:
+            # Close the pooled connections to Ironic
+            self.api_client.session.close()
+        AgentPool.park(self)
+
+    def reset(self, system, lookup_timeout=300):
+        """Prepare a parked agent for a new boot of its system."""
+        self.system = system
+        self.agent_token = None
+        self.cached_image_id = None
+        self.lookup_timeout = lookup_timeout
+        if self.api_url:
+            self.api_client.node = system
+            self.api_client.agent_token = None
+            self.heartbeater.interval = 0
+            self.heartbeater.heartbeat_forced = False
+
+    def list_command_results(self, since=None):
         """Get a list of command results.
 
+        :param since: Optional: ID of a command result, only the results
+                      of the commands executed after it are returned. All
+                      the results are returned if it is unknown.
         :returns: list of :class:`fake_ipa.extensions.base.
                   BaseCommandResult` objects.
         """
-        self.refresh_last_async_command()
-        return list(self.command_results.values())
+        with self.command_lock:
+            self.refresh_last_async_command()
+            results = list(self.command_results.values())
+            if since in self.command_results:
+                ids = list(self.command_results)
+                return results[ids.index(since) + 1:]
+        return results
 
     def get_command_result(self, result_id):
         """Get a specific command result by ID.
@@ -181,3 +248,45 @@ class FakeIronicPythonAgent(base.ExecuteCommandMixin):
                 and not self.agent_token_required):
             return True
         return self.agent_token == token
+
+
+class AgentPool:
+    """Agents of powered off systems, reused when they are powered on.
+
+    Ironic power cycles a node several times while cleaning and deploying
+    it, reusing its agent avoids building a new API client, session and
+    heartbeater every time.
+    """
+
+    # system uuid -> parked agent
+    parked = {}
+    created = 0
+    reused = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def acquire(cls, system, api_url, lookup_timeout=300):
+        """Get the parked agent of a system, or a new one."""
+        with cls._lock:
+            agent = cls.parked.pop(system['uuid'], None)
+            if agent is not None and agent.api_url != api_url:
+                agent = None
+            if agent is None:
+                cls.created += 1
+            else:
+                cls.reused += 1
+        if agent is None:
+            return FakeIronicPythonAgent(system, api_url,
+                                         lookup_timeout=lookup_timeout)
+        agent.reset(system, lookup_timeout=lookup_timeout)
+        return agent
+
+    @classmethod
+    def park(cls, agent):
+        with cls._lock:
+            cls.parked[agent.system['uuid']] = agent
+
+    @classmethod
+    def status(cls):
+        return {'parked': len(cls.parked), 'created': cls.created,
+                'reused': cls.reused}
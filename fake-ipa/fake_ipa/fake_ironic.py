@@ -0,0 +1,325 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Lightweight stand-in for the Ironic API used to benchmark FakeIPA.
+
+It implements the endpoints FakeIPA calls (version discovery, lookup,
+heartbeat, inspection callback and the Redfish reset action) and drives
+the agents through cleaning and deployment like a conductor would, by
+running commands through their /<uuid>/v1/commands API on heartbeat.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import secrets
+import sys
+import threading
+import time
+
+from flask import Flask
+from flask import jsonify
+from flask import request
+import requests
+
+from fake_ipa import metrics
+
+LOG = logging.getLogger(__name__)
+
+API_VERSION = '1.81'
+HEARTBEAT_TIMEOUT = 300
+
+
+class Node:
+    """A node enrolled in the stand-in and its provisioning state."""
+
+    def __init__(self, system):
+        self.uuid = system['uuid']
+        self.system = system
+        self.macs = [nic['mac'] for nic in system.get('nics', [])]
+        self.agent_token = secrets.token_urlsafe(32)
+        self.state = 'enroll'
+        self.enrolled = time.monotonic()
+        self.looked_up = None
+        self.finished = None
+        self.last_heartbeat = None
+        self.callback_url = None
+        self.plan = None
+        # Running command and the command before it, used as listing cursor
+        self.command_id = None
+        self.since = None
+        self.last_command_id = None
+        self.lock = threading.Lock()
+
+    def as_dict(self):
+        return {'uuid': self.uuid, 'name': self.system.get('name'),
+                'provision_state': self.state}
+
+
+class Conductor:
+    """Runs the clean and deploy commands of the nodes on heartbeat."""
+
+    def __init__(self, fake_ipa_url, workers, heartbeat_timeout,
+                 drive=True):
+        """Construct a Conductor.
+
+        :param drive: if False, heartbeats are only accounted and no
+                      command is sent, for replays driving the commands.
+        """
+        self.fake_ipa_url = fake_ipa_url
+        self.heartbeat_timeout = heartbeat_timeout
+        self.drive = drive
+        self.nodes = {}
+        self.by_mac = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix='conductor')
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.verify = False
+        self.heartbeats = 0
+        self.heartbeat_intervals = []
+        self.first_heartbeat_delays = []
+        self.provision_times = []
+        self.command_errors = 0
+        self._lock = threading.Lock()
+
+    def enroll(self, system):
+        node = Node(system)
+        self.nodes[node.uuid] = node
+        for mac in node.macs:
+            self.by_mac[mac] = node
+        return node
+
+    def find(self, node_uuid=None, addresses=()):
+        if node_uuid and node_uuid in self.nodes:
+            return self.nodes[node_uuid]
+        for mac in addresses:
+            if mac in self.by_mac:
+                return self.by_mac[mac]
+
+    def heartbeat(self, node, callback_url):
+        now = time.monotonic()
+        with self._lock:
+            self.heartbeats += 1
+            if node.last_heartbeat is None:
+                self.first_heartbeat_delays.append(
+                    now - (node.looked_up or node.enrolled))
+            else:
+                self.heartbeat_intervals.append(now - node.last_heartbeat)
+        node.last_heartbeat = now
+        node.callback_url = callback_url.rstrip('/')
+        if self.drive and node.state not in ('active', 'deploy failed'):
+            self.pool.submit(self._continue, node)
+
+    def _command(self, node, name, params):
+        resp = self.session.post(
+            '%s/v1/commands/' % node.callback_url,
+            params={'agent_token': node.agent_token},
+            json={'name': name, 'params': params})
+        resp.raise_for_status()
+        return resp.json()
+
+    def _last_result(self, node):
+        params = {'since': node.since} if node.since else {}
+        resp = self.session.get('%s/v1/commands/' % node.callback_url,
+                                params=params)
+        resp.raise_for_status()
+        for result in resp.json()['commands']:
+            if result['id'] == node.command_id:
+                return result
+
+    def _plan(self, node):
+        params = {'node': node.as_dict(), 'ports': []}
+        return [
+            ('clean.get_clean_steps', params),
+            ('deploy.get_deploy_steps', params),
+            ('deploy.execute_deploy_step',
+             dict(params, step={'step': 'write_image', 'priority': 80,
+                                'interface': 'deploy'})),
+            ('standby.prepare_image',
+             {'image_info': {'id': 'fake-image',
+                             'urls': ['http://localhost/fake-image']}}),
+            ('image.install_bootloader', {'root_uuid': node.uuid}),
+            ('standby.power_off', {}),
+        ]
+
+    def _fail(self, node, reason):
+        LOG.error('Provisioning of %s failed: %s', node.uuid, reason)
+        with self._lock:
+            self.command_errors += 1
+        node.state = 'deploy failed'
+
+    def _continue(self, node):
+        if not node.lock.acquire(blocking=False):
+            return
+        try:
+            if node.plan is None:
+                node.plan = self._plan(node)
+                node.state = 'deploying'
+            if node.command_id is not None:
+                result = self._last_result(node)
+                if result is None or result['command_status'] == 'RUNNING':
+                    return
+                if result['command_status'] != 'SUCCEEDED':
+                    return self._fail(node, result['command_error'])
+                node.command_id = None
+                self._process_result(node, result)
+            if not node.plan:
+                return
+            name, params = node.plan.pop(0)
+            result = self._command(node, name, params)
+            node.since = node.last_command_id
+            node.command_id = node.last_command_id = result['id']
+            if result['command_status'] == 'FAILED':
+                return self._fail(node, result['command_error'])
+            if result['command_status'] == 'SUCCEEDED':
+                node.command_id = None
+                self._process_result(node, result)
+        except Exception as e:
+            self._fail(node, e)
+        finally:
+            node.lock.release()
+
+    def _process_result(self, node, result):
+        if result['command_name'] == 'get_clean_steps':
+            steps = [step
+                     for manager in result['command_result'][
+                         'clean_steps'].values()
+                     for step in manager if step['priority'] > 0]
+            steps.sort(key=lambda step: step['priority'], reverse=True)
+            params = {'node': node.as_dict(), 'ports': []}
+            node.plan[0:0] = [('clean.execute_clean_step',
+                               dict(params, step=step)) for step in steps]
+
+    def power_off(self, system_uuid):
+        node = self.nodes.get(system_uuid)
+        if node is None:
+            return False
+        if node.state == 'deploying':
+            node.state = 'active'
+            node.finished = time.monotonic()
+            with self._lock:
+                self.provision_times.append(node.finished - node.enrolled)
+        if self.fake_ipa_url:
+            system = dict(node.system, pending_power={
+                'power_state': 'Off', 'apply_time': int(time.time())})
+            self.pool.submit(self.session.put, self.fake_ipa_url + '/',
+                             json=system)
+        return True
+
+    def stats(self):
+        states = {}
+        for node in list(self.nodes.values()):
+            states[node.state] = states.get(node.state, 0) + 1
+        with self._lock:
+            return {
+                'nodes': len(self.nodes),
+                'states': states,
+                'heartbeats': self.heartbeats,
+                'command_errors': self.command_errors,
+                'heartbeat_interval': metrics.percentiles(
+                    self.heartbeat_intervals),
+                'first_heartbeat_delay': metrics.percentiles(
+                    self.first_heartbeat_delays),
+                'provision_time': metrics.percentiles(self.provision_times),
+            }
+
+
+def create_app(conductor):
+    app = Flask(__name__)
+
+    @app.route('/', methods=['GET'])
+    def root():
+        return jsonify({'name': 'Fake Ironic API',
+                        'default_version': {'id': 'v1',
+                                            'version': API_VERSION,
+                                            'min_version': '1.1'}})
+
+    @app.route('/v1/lookup', methods=['GET'])
+    def lookup():
+        addresses = [a for a in request.args.get('addresses', '').split(',')
+                     if a]
+        node = conductor.find(request.args.get('node_uuid'), addresses)
+        if node is None:
+            return jsonify({'error_message': 'Node not found'}), 404
+        node.looked_up = time.monotonic()
+        return jsonify({
+            'node': node.as_dict(),
+            'config': {'heartbeat_timeout': conductor.heartbeat_timeout,
+                       'agent_token': node.agent_token,
+                       'agent_token_required': True},
+        })
+
+    @app.route('/v1/heartbeat/<node_uuid>', methods=['POST'])
+    def heartbeat(node_uuid):
+        node = conductor.nodes.get(node_uuid)
+        if node is None:
+            return jsonify({'error_message': 'Node not found'}), 404
+        body = request.get_json(force=True)
+        if body.get('agent_token') != node.agent_token:
+            return jsonify({'error_message': 'Invalid agent token'}), 401
+        conductor.heartbeat(node, body['callback_url'])
+        return '', 202
+
+    @app.route('/v1/continue_inspection', methods=['POST'])
+    @app.route('/v1/continue', methods=['POST'])
+    def continue_inspection():
+        data = request.get_json(force=True)
+        node = conductor.find(addresses=[data.get('boot_interface')])
+        if node is None:
+            return jsonify({'error_message': 'Node not found'}), 404
+        node.state = 'inspected'
+        return jsonify({'uuid': node.uuid})
+
+    @app.route('/redfish/v1/Systems/<system_uuid>/Actions/'
+               'ComputerSystem.Reset', methods=['POST'])
+    def reset(system_uuid):
+        if not conductor.power_off(system_uuid):
+            return jsonify({'error': 'System not found'}), 404
+        return '', 204
+
+    @app.route('/stats', methods=['GET'])
+    def stats():
+        return jsonify(conductor.stats())
+
+    return app
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('fake-ipa-ironic')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=6385)
+    parser.add_argument('--fake-ipa-url', default='http://localhost:9999',
+                        help='FakeIPA URL, notified when a node is powered '
+                             'off.')
+    parser.add_argument('--workers', type=int, default=32,
+                        help='Concurrent conductor operations.')
+    parser.add_argument('--heartbeat-timeout', type=int,
+                        default=HEARTBEAT_TIMEOUT)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    conductor = Conductor(args.fake_ipa_url, args.workers,
+                          args.heartbeat_timeout)
+    create_app(conductor).run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""End-to-end fleet load driver for FakeIPA.
+
+Starts the Ironic stand-in, powers on synthetic systems through FakeIPA's
+notification_handler and reports how fast they get provisioned, along with
+the CPU time and RSS of the FakeIPA process.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import requests
+from werkzeug.serving import make_server
+
+from fake_ipa import fake_ironic
+
+LOG = logging.getLogger(__name__)
+
+
+def make_system(index):
+    return {
+        'uuid': str(uuid.uuid4()),
+        'name': 'fleet-%05d' % index,
+        'power_state': 'Off',
+        'boot_device': 'Pxe',
+        'nics': [{'mac': '52:54:01:%02x:%02x:%02x' % (
+            index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff)}],
+    }
+
+
+class ProcessSampler:
+    """Sample the CPU time and RSS of a process from /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.cpu_start = self.cpu_seconds()
+        self.rss_peak = self.rss()
+
+    def cpu_seconds(self):
+        with open('/proc/%d/stat' % self.pid) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime and stime are the 14th and 15th fields of the file
+        return (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def rss(self):
+        with open('/proc/%d/status' % self.pid) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def sample(self):
+        self.rss_peak = max(self.rss_peak, self.rss())
+
+    def report(self, elapsed):
+        cpu = self.cpu_seconds() - self.cpu_start
+        return {'cpu_seconds': round(cpu, 2),
+                'cpu_percent': round(100 * cpu / elapsed, 1),
+                'rss_mb': round(self.rss() / 1024 / 1024, 1),
+                'rss_peak_mb': round(self.rss_peak / 1024 / 1024, 1)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('fake-ipa-fleet')
+    parser.add_argument('--fake-ipa-url', default='http://localhost:9999')
+    parser.add_argument('--fake-ipa-pid', type=int,
+                        help='PID of FakeIPA to report its CPU and RSS.')
+    parser.add_argument('--listen-ip', default='0.0.0.0',
+                        help='Address of the Ironic stand-in.')
+    parser.add_argument('--listen-port', type=int, default=6385)
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=10,
+                        help='Power-ons per second.')
+    parser.add_argument('--timeout', type=int, default=3600,
+                        help='Maximum duration of the run in seconds.')
+    parser.add_argument('--heartbeat-timeout', type=int, default=60)
+    parser.add_argument('--workers', type=int, default=32,
+                        help='Concurrent conductor operations.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    fake_ipa_url = args.fake_ipa_url.rstrip('/')
+    conductor = fake_ironic.Conductor(fake_ipa_url, args.workers,
+                                      args.heartbeat_timeout)
+    server = make_server(args.listen_ip, args.listen_port,
+                         fake_ironic.create_app(conductor), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sampler = ProcessSampler(args.fake_ipa_pid) if args.fake_ipa_pid else None
+
+    session = requests.Session()
+    session.verify = False
+    started = time.monotonic()
+    for index in range(args.nodes):
+        system = conductor.enroll(make_system(index)).system
+        resp = session.put(fake_ipa_url + '/', json=dict(
+            system, pending_power={'power_state': 'On',
+                                   'apply_time': int(time.time())}))
+        if resp.status_code >= 400:
+            LOG.error('Power on of %s failed: %d', system['name'],
+                      resp.status_code)
+        time.sleep(max(0, started + (index + 1) / args.rate
+                       - time.monotonic()))
+        if sampler:
+            sampler.sample()
+
+    while time.monotonic() - started < args.timeout:
+        stats = conductor.stats()
+        done = (stats['states'].get('active', 0)
+                + stats['states'].get('deploy failed', 0))
+        LOG.info('%d/%d nodes done, states: %s', done, args.nodes,
+                 stats['states'])
+        if done >= args.nodes:
+            break
+        if sampler:
+            sampler.sample()
+        time.sleep(5)
+
+    elapsed = time.monotonic() - started
+    stats = conductor.stats()
+    report = dict(stats,
+                  elapsed=round(elapsed, 1),
+                  nodes_per_minute=round(
+                      stats['states'].get('active', 0) * 60 / elapsed, 2))
+    if sampler:
+        report['fake_ipa'] = sampler.report(elapsed)
+    server.shutdown()
+    print(json.dumps(report, indent=2))
+    return 0 if stats['states'].get('active', 0) == args.nodes else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,27 +14,159 @@
 #    under the License.
 
 import collections
+import logging
 import random
+import threading
 from threading import currentThread
 from threading import Thread
 import time
 
 from fake_ipa import error
+from fake_ipa import metrics
+from fake_ipa.profiling import HotPathTimers
+from fake_ipa.settings import MAX_STRESS_THREADS
+from fake_ipa.settings import SharedSettings
+from fake_ipa.tracing import Tracer
 
 Host = collections.namedtuple('Host', ['hostname', 'port'])
 
+# Upper bound of the extra threads of a stress schedule
+
+
+class HeartbeatStress:
+    """Drive heartbeats at a target aggregate rate following a schedule.
+
+    The schedule is a list of steps ``{"rate": <heartbeats per second>,
+    "duration": <seconds>}``. Heartbeater threads take evenly spaced slots
+    at the rate of the current step and heartbeat the next agent of the
+    queue, ignoring the interval requested by Ironic.
+
+    The latency percentiles of a step are computed over a uniform sample
+    of at most reservoir_size heartbeats, so long steps at high rates use
+    bounded memory.
+    """
+
+    reservoir_size = 10000
+
+    def __init__(self, schedule, logger):
+        if not schedule:
+            raise ValueError('The stress schedule needs at least one step')
+        for step in schedule:
+            if step.get('rate', 0) <= 0 or step.get('duration', 0) <= 0:
+                raise ValueError('Invalid stress step %s, rate and duration '
+                                 'must be positive' % step)
+        self.schedule = schedule
+        self._logger = logger
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.ends = [self.started]
+        for step in schedule:
+            self.ends.append(self.ends[-1] + step['duration'])
+        self.ends = self.ends[1:]
+        self.next_slot = self.started
+        self.step = 0
+        # Reservoir samples of the latencies of each step
+        self.latencies = [[] for _ in schedule]
+        self.counts = [0] * len(schedule)
+        self.max_latencies = [None] * len(schedule)
+        self.errors = [0] * len(schedule)
+        self.finished = False
+
+    def _current_step(self, now):
+        while self.step < len(self.schedule) and now >= self.ends[self.step]:
+            self._logger.info('Heartbeat stress step %d done: %s', self.step,
+                              self._step_report(self.step))
+            self.step += 1
+        if self.step >= len(self.schedule):
+            self.finished = True
+        return self.step
+
+    def wait_for_slot(self):
+        """Sleep until the next heartbeat slot.
+
+        :returns: the step of the slot, or None when the schedule is over.
+        """
+        with self._lock:
+            now = time.monotonic()
+            step = self._current_step(max(now, self.next_slot))
+            if self.finished:
+                return None
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1.0 / self.schedule[step]['rate']
+        time.sleep(max(0, slot - time.monotonic()))
+        return step
+
+    def record(self, step, latency, success):
+        with self._lock:
+            self.counts[step] += 1
+            sample = self.latencies[step]
+            if len(sample) < self.reservoir_size:
+                sample.append(latency)
+            else:
+                index = random.randrange(self.counts[step])
+                if index < self.reservoir_size:
+                    sample[index] = latency
+            if (self.max_latencies[step] is None
+                    or latency > self.max_latencies[step]):
+                self.max_latencies[step] = latency
+            if not success:
+                self.errors[step] += 1
+
+    def _step_report(self, step):
+        latencies = sorted(self.latencies[step])
+        count = self.counts[step]
+        duration = self.schedule[step]['duration']
+        # A running step is measured over its elapsed time only
+        elapsed = min(duration, time.monotonic()
+                      - (self.ends[step] - duration))
+        return {
+            'target_rate': self.schedule[step]['rate'],
+            'achieved_rate': round(count / elapsed, 1)
+            if elapsed > 0 else None,
+            'heartbeats': count,
+            'errors': self.errors[step],
+            'error_rate': round(self.errors[step] / count, 4)
+            if count else None,
+            'p50': metrics.percentile(latencies, 50),
+            'p90': metrics.percentile(latencies, 90),
+            'p99': metrics.percentile(latencies, 99),
+            'max': self.max_latencies[step],
+        }
+
+    def report(self):
+        with self._lock:
+            return {
+                'finished': self.finished,
+                'current_step': None if self.finished else self.step,
+                'steps': [self._step_report(step)
+                          for step in range(len(self.schedule))],
+            }
+
 
 class Heatbeater:
 
     queue = collections.deque()
     remove_from_q = set()
+    # system uuid -> number of entries in the queue
+    queued = collections.Counter()
+    # Guards the queue, the removals, the counts and min_interval, their
+    # compound updates must be atomic without the GIL too
+    _lock = threading.Lock()
     interval = 0
     heartbeat_forced = False
+    stress = None
+    # Stop events of the heartbeater threads, one per running thread
+    _threads = []
+    _threads_lock = threading.Lock()
+    settings = SharedSettings()
 
     @classmethod
-    def initialize(cls, config, logger):
+    def initialize(cls, config, logger, settings):
         cls._config = config
         cls._logger = logger
+        SharedSettings.set(settings)
+        cls.advertise_address = Host(hostname=settings.advertise_ip,
+                                     port=settings.advertise_port)
         return cls
 
     # If we could wait at most N seconds between heartbeats (or in case of an
@@ -44,40 +176,93 @@ class Heatbeater:
     max_jitter_multiplier = 0.6
     min_interval = 5
 
-    def heartbeat(self):
-        while True:
+    def heartbeat(self, stress_only=False, stopped=None):
+        stopped = stopped or threading.Event()
+        while not stopped.is_set():
+            stress = Heatbeater.stress
+            step = None
+            if stress is not None and not stress.finished:
+                step = stress.wait_for_slot()
+            if step is None and stress_only:
+                # Extra stress thread, the schedule is over
+                return
+
+            if self.process_next(stress, step):
+                stopped.wait(Heatbeater.min_interval)
 
+    def process_next(self, stress=None, step=None):
+        """Heartbeat the next agent of the queue if it is due.
+
+        :param stress: the running HeartbeatStress, if any.
+        :param step: the stress step of the current slot, or None outside
+                     of a stress schedule.
+        :returns: True if the thread should sleep before the next agent.
+        """
+        with Heatbeater._lock:
             try:
                 (system, agent, previous_heartbeat) = \
                     Heatbeater.queue.popleft()
-                if system['uuid'] in Heatbeater.remove_from_q:
-                    self._logger.info(
-                        'Thread[%s] Removing.. %s ', currentThread().ident,
-                        system['name'])
-                    Heatbeater.remove_from_q.remove(system['uuid'])
-                    Heatbeater.min_interval = 5
-                    continue
             except IndexError:
-                # empty q default min interval supposing:
-                # len(thread) << len(nodes)
-                # else thread q != no node in heartbeater
-                Heatbeater.min_interval = 5
-                time.sleep(Heatbeater.min_interval)
-                continue
-
-            if self._heartbeat_expected(agent, previous_heartbeat):
+                system = None
+            else:
+                removed = system['uuid'] in Heatbeater.remove_from_q
+                last = False
+                if removed:
+                    # A node can be queued several times, all its entries
+                    # are dropped and the agent is shut down with the last
+                    Heatbeater.queued[system['uuid']] -= 1
+                    last = Heatbeater.queued[system['uuid']] <= 0
+                    if last:
+                        del Heatbeater.queued[system['uuid']]
+                        Heatbeater.remove_from_q.discard(system['uuid'])
+        if system is None:
+            # empty q default min interval supposing:
+            # len(thread) << len(nodes)
+            # else thread q != no node in heartbeater
+            Heatbeater._set_min_interval(5)
+            return step is None
+        if removed:
+            self._logger.info(
+                'Thread[%s] Removing.. %s ', currentThread().ident,
+                system['name'])
+            if last:
+                agent.shutdown()
+            Heatbeater._set_min_interval(5)
+            return False
+
+        if step is not None:
+            started = time.monotonic()
+            success = self.do_heartbeat(system, agent)
+            stress.record(step, time.monotonic() - started, success)
+            Heatbeater._requeue(system, agent, time.time())
+            return False
+
+        if self._heartbeat_expected(agent, previous_heartbeat):
+            # Rendering the queue is O(n), only do it when it is logged
+            if self._logger.isEnabledFor(logging.DEBUG):
                 self._logger.debug(
                     'Thread[%s] Currently processing %s'
                     '[%s] and  %s ',
                     currentThread().ident, system['name'],
                     system['uuid'], Heatbeater.printq())
-                self.do_heartbeat(system, agent)
-                Heatbeater.queue.append((system, agent, time.time()))
-            else:
+            self.do_heartbeat(system, agent)
+            Heatbeater._requeue(system, agent, time.time())
+        else:
 
-                Heatbeater.queue.append((system, agent, previous_heartbeat))
+            Heatbeater._requeue(system, agent, previous_heartbeat)
 
-            time.sleep(self.min_interval)
+        return True
+
+    @classmethod
+    def _requeue(cls, system, agent, previous_heartbeat):
+        """Put back an agent taken from the queue by process_next."""
+        with Heatbeater._lock:
+            Heatbeater.queue.append((system, agent, previous_heartbeat))
+
+    @classmethod
+    def _set_min_interval(cls, value):
+        with Heatbeater._lock:
+            Heatbeater.min_interval = value
 
     def _heartbeat_expected(self, agent, previous_heartbeat):
         # Normal heartbeating
@@ -89,26 +274,29 @@ class Heatbeater:
                 and time.time() > previous_heartbeat + 5):
             return True
 
+    @HotPathTimers.timed('do_heartbeat')
+    @Tracer.traced('heartbeat', lambda self, system, agent: system)
     def do_heartbeat(self, system, agent):
-        """Send a heartbeat to Ironic."""
-
-        # if tls enabled with fakeIPA use HTTPS else HTTP
-        adv_protocol="http"
-        cert = self._config.get("FAKE_IPA_CERTFILE")
-        key = self._config.get("FAKE_IPA_KEYFILE")
-        if cert is not None and key is not None :
-            adv_protocol="https"
+        """Send a heartbeat to Ironic.
+
+        :returns: True if the heartbeat was accepted.
+        """
+        success = False
+        # Cleared before sending, a command completing meanwhile forces
+        # the next heartbeat again
+        forced = agent.heartbeater.heartbeat_forced
+        agent.heartbeater.heartbeat_forced = False
+
         try:
             agent.api_client.heartbeat(
                 uuid=agent.node['uuid'],
-                advertise_address=Host(
-                    hostname=self._config['FAKE_IPA_ADVERTISE_ADDRESS_IP'],
-                    port=self._config['FAKE_IPA_ADVERTISE_ADDRESS_PORT']),
-                advertise_protocol=adv_protocol,
+                advertise_address=self.advertise_address,
+                # if tls enabled with fakeIPA use HTTPS else HTTP
+                advertise_protocol=self.settings.advertise_protocol,
                 generated_cert=None,
             )
             self._logger.info('heartbeat successful')
-            agent.heartbeater.heartbeat_forced = False
+            success = True
             self.previous_heartbeat = time.time()
         except error.HeartbeatConflictError:
             self._logger.warning('conflict error sending heartbeat to %s',
@@ -123,17 +311,20 @@ class Heatbeater:
             self._logger.exception(
                 'error sending heartbeat to %s', agent.api_url)
         finally:
+            if forced and not success:
+                agent.heartbeater.heartbeat_forced = True
             interval_multiplier = random.uniform(
                 agent.heartbeater.min_jitter_multiplier,
                 agent.heartbeater.max_jitter_multiplier)
             agent.heartbeater.interval = \
                 agent.heartbeat_timeout * interval_multiplier
-            Heatbeater.min_interval = min(agent.heartbeater.interval, 5)
+            min_interval = min(agent.heartbeater.interval, 5)
+            Heatbeater._set_min_interval(min_interval)
             self._logger.info(
                 'sleeping before next heartbeat, interval: %s'
                 '(min interval %s)',
-                agent.heartbeater.interval,
-                Heatbeater.min_interval)
+                agent.heartbeater.interval, min_interval)
+        return success
 
     def force_heartbeat(self):
         self.heartbeat_forced = True
@@ -143,35 +334,77 @@ class Heatbeater:
         # to avoid conflicts with threads only the threads heartbeating
         # the node can remove it in this method we create a temporary list
         # for the nodes to be removed
-        # TODO(Mohammed) add expire time so if node left out in this list
-        # we clean them periodically
+        # Nodes which are not in the queue are not added, their entry would
+        # never be consumed
+        with Heatbeater._lock:
+            queued = uuid in Heatbeater.queued
+            if queued:
+                Heatbeater.remove_from_q.add(uuid)
+        if not queued:
+            Heatbeater._logger.info("%s is not in the heartbeater q", uuid)
+            return
         Heatbeater._logger.info("Added to remove list %s", uuid)
-        Heatbeater.remove_from_q.add(uuid)
 
     @classmethod
     def printq(cls):
+        with Heatbeater._lock:
+            queue = list(Heatbeater.queue)
+            remove_from_q = set(Heatbeater.remove_from_q)
         _l = []
-        for _q in Heatbeater.queue:
+        for _q in queue:
             node_name = _q[0]['name']
             time_left = _q[2] + \
                 _q[1].heartbeater.interval - time.time()
-            if _q[0]['uuid'] in Heatbeater.remove_from_q:
+            if _q[0]['uuid'] in remove_from_q:
                 node_name = "X" + node_name + "X"
             _l.append("{0} <- {1:.0f}s".format(node_name, time_left))
-        return {"Q": _l, "To be removed": Heatbeater.remove_from_q}
+        return {"Q": _l, "To be removed": remove_from_q}
 
     @classmethod
     def add_to_q(cls, system, agent):
         # when we inspect an on node it will be added to removing list before
         #  turning off
-        if system['uuid'] in Heatbeater.remove_from_q:
-            Heatbeater.remove_from_q.remove(system['uuid'])
-        Heatbeater.queue.append((system, agent, time.time()))
+        with Heatbeater._lock:
+            Heatbeater.remove_from_q.discard(system['uuid'])
+            Heatbeater.queued[system['uuid']] += 1
+            Heatbeater.queue.append((system, agent, time.time()))
+
+    @classmethod
+    def start_stress(cls, schedule, nb_threads):
+        """Start a heartbeat stress schedule with extra threads.
+
+        :raises: ValueError if the schedule or the number of threads is
+                 invalid.
+        """
+        if (isinstance(nb_threads, bool) or not isinstance(nb_threads, int)
+                or not 0 <= nb_threads <= MAX_STRESS_THREADS):
+            raise ValueError('The number of stress threads must be an '
+                             'integer between 0 and %d, got %r'
+                             % (MAX_STRESS_THREADS, nb_threads))
+        cls.stress = HeartbeatStress(schedule, cls._logger)
+        cls._logger.info('Starting heartbeat stress with %d extra threads: '
+                         '%s', nb_threads, schedule)
+        for _ in range(nb_threads):
+            Thread(target=Heatbeater().heartbeat, kwargs={'stress_only': True},
+                   daemon=True).start()
+        return cls.stress
 
     @classmethod
     def run_heartbeater_threads(cls, nb_threads):
-        # Setup the heartbeater threads
-        threads = [Thread(target=Heatbeater().heartbeat, daemon=True)
-                   for _ in range(nb_threads)]
-        for t in threads:
-            t.start()
+        """Start or stop heartbeater threads to run nb_threads of them.
+
+        A stopped thread finishes the heartbeat it is sending, the agents
+        stay in the queue for the other threads.
+        """
+        with cls._threads_lock:
+            while len(cls._threads) < nb_threads:
+                stopped = threading.Event()
+                Thread(target=Heatbeater().heartbeat,
+                       kwargs={'stopped': stopped}, daemon=True).start()
+                cls._threads.append(stopped)
+            while len(cls._threads) > nb_threads:
+                cls._threads.pop().set()
+
+    @classmethod
+    def nb_threads(cls):
+        return len(cls._threads)
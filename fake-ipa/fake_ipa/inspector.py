@@ -13,56 +13,140 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
 import requests
 import tenacity
 
+from fake_ipa.capture import TrafficCapture
+from fake_ipa import metrics
+from fake_ipa.tracing import Tracer
+
 _RETRY_WAIT = 5
 _RETRY_ATTEMPTS = 5
 
-# FIXME fix passing the logger as parameter
-
-
-def inspect(system, inspection_callback_url, verify, cert, logger):
-
-    data = {
-        "boot_interface": system.get("nics")[0]["mac"],
-        "inventory": {
-            "interfaces": [
-                {
-                    "lldp": None,
-                    "product": "0x0001",
-                    "vendor": "0x1af4",
-                    "name": nic.get("name", f"enp{i+1}s0"),
-                    "has_carrier": True,
-                    "ipv4_address": nic.get("ip"),
-                    "client_id": None,
-                    "mac_address": nic.get("mac"),
-                }
-                for i, nic in enumerate(system.get("nics"))
-            ],
-            "cpu": {
-                "count": 2,
-                "frequency": "2100.084",
-                "flags": ["fpu", "mmx", "fxsr", "sse", "sse2"],
-                "architecture": "x86_64",
-            },
-        },
-    }
 
+class Inspector:
+    """Submit inspection data through a bounded pool of workers.
+
+    All the workers share a single session, so connections to the
+    inspection callback URL are kept alive and reused between nodes.
+    The queue wait and POST time of the last inspections are reported by
+    /debug/inspection.
+    """
+
+    # system uuid -> timings of its last inspection, oldest first
+    timings = collections.OrderedDict()
+    timings_size = 1000
+    _timings_lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._config = config
+        cls._logger = logger
+        cls.callback_url = settings.inspection_callback_url
+        cls.verify, cls.cert = settings.verify, settings.cert
+        cls.timeout = (settings.inspection_connect_timeout,
+                       settings.inspection_read_timeout)
+        workers = settings.inspection_workers
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=workers)
+        cls.session = requests.Session()
+        cls.session.mount(cls.callback_url, adapter)
+        TrafficCapture.attach(cls.session, 'inspector')
+        cls.pool = ThreadPoolExecutor(max_workers=workers,
+                                      thread_name_prefix='inspector')
+        return cls
+
+    @classmethod
+    def warm_up(cls):
+        """Open a pooled connection to the inspector ahead of time."""
+        try:
+            cls.session.head(cls.callback_url, verify=cls.verify,
+                             cert=cls.cert, timeout=5)
+        except requests.exceptions.RequestException as exc:
+            cls._logger.warning('Inspector %s is not reachable yet: %s',
+                                cls.callback_url, exc)
+
+    @classmethod
+    @Tracer.traced('inspect', lambda cls, system, profile: system)
+    def inspect(cls, system, profile):
+        """Send the inspection data of a system and wait for the reply.
+
+        :returns: the node UUID returned by the inspector, or None.
+        """
+        submitted = time.monotonic()
+        future = cls.pool.submit(cls._inspect, system, profile, submitted)
+        return future.result()
+
+    @classmethod
     @tenacity.retry(
         retry=tenacity.retry_if_exception_type(
             requests.exceptions.ConnectionError),
         stop=tenacity.stop_after_attempt(_RETRY_ATTEMPTS),
         wait=tenacity.wait_fixed(_RETRY_WAIT),
         reraise=True)
-    def _post_to_inspector():
-        return requests.post(inspection_callback_url, verify=verify, cert=cert, json=data)
+    def _post_to_inspector(cls, data, attempts):
+        """POST the inspection data, appending the time of each attempt."""
+        started = time.monotonic()
+        try:
+            return cls.session.post(
+                cls.callback_url, verify=cls.verify, cert=cls.cert,
+                data=data, headers={'Content-Type': 'application/json'},
+                timeout=cls.timeout)
+        finally:
+            attempts.append(time.monotonic() - started)
+
+    @classmethod
+    def _record(cls, uuid, timings):
+        with cls._timings_lock:
+            cls.timings.pop(uuid, None)
+            cls.timings[uuid] = timings
+            while len(cls.timings) > cls.timings_size:
+                cls.timings.popitem(last=False)
+
+    @classmethod
+    def _inspect(cls, system, profile, submitted):
+        started = time.monotonic()
+        data = profile.render(system)
+        attempts = []
+        try:
+            resp = cls._post_to_inspector(data, attempts)
+        finally:
+            # The POST time is the last attempt, without the retry waits
+            timings = {'queue_wait': started - submitted,
+                       'post': attempts[-1] if attempts else None,
+                       'attempts': len(attempts)}
+            cls._record(system['uuid'], timings)
+            cls._logger.info(
+                'Inspection of %s: queue wait %.3fs, POST %.3fs, '
+                '%d attempt(s)', system['name'], timings['queue_wait'],
+                timings['post'] or 0, len(attempts))
+
+        if resp.status_code >= 400:
+            cls._logger.error(
+                'inspector %s error %d: %s, proceeding with lookup',
+                cls.callback_url,
+                resp.status_code, resp.content.decode('utf-8'))
+            return
 
-    resp = _post_to_inspector()
-    if resp.status_code >= 400:
-        logger.error('inspector %s error %d: %s, proceeding with lookup',
-                     inspection_callback_url,
-                     resp.status_code, resp.content.decode('utf-8'))
-        return
+        return resp.json().get('uuid')
 
-    return resp.json().get('uuid')
+    @classmethod
+    def report(cls):
+        """Queue wait and POST time of the last inspections, in seconds."""
+        with cls._timings_lock:
+            timings = dict(cls.timings)
+        values = list(timings.values())
+        return {
+            'inspections': len(values),
+            'retried': sum(1 for t in values if t['attempts'] > 1),
+            'queue_wait': metrics.percentiles(t['queue_wait']
+                                              for t in values),
+            'post': metrics.percentiles(t['post'] for t in values
+                                        if t['post'] is not None),
+            'nodes': timings,
+        }
@@ -0,0 +1,104 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import collections
+import hashlib
+import json
+import threading
+
+
+class ParamInterner:
+    """Content based deduplication of the command parameters.
+
+    Ironic sends the whole node and its ports with every clean and deploy
+    command. Equal documents, and equal parts of them like the node
+    properties or driver info, are stored once and shared by the commands
+    of all the agents. Interned documents must never be modified.
+    """
+
+    enabled = True
+    max_size = 10000
+    # digest of the JSON encoded document -> shared document
+    documents = collections.OrderedDict()
+    hits = 0
+    misses = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._logger = logger
+        cls.enabled = settings.dedup_command_params
+        cls.max_size = settings.dedup_cache_size
+        with cls._lock:
+            cls.documents = collections.OrderedDict()
+        return cls
+
+    @classmethod
+    def intern(cls, value, depth=2, shared=True):
+        """Get the shared copy of a document.
+
+        :param value: the document, only dicts and lists are interned.
+        :param depth: levels of nested dicts and lists interned separately.
+        :param shared: if False, only the nested documents are interned,
+                       for documents unlikely to be seen twice.
+        :returns: an equal document, shared if it was seen before.
+        """
+        if isinstance(value, dict):
+            if depth > 1:
+                value = {key: cls.intern(item, depth - 1)
+                         for key, item in value.items()}
+        elif isinstance(value, list):
+            if depth > 1:
+                value = [cls.intern(item, depth - 1) for item in value]
+        else:
+            return value
+        if not shared:
+            return value
+        try:
+            digest = hashlib.blake2b(
+                json.dumps(value, sort_keys=True,
+                           separators=(',', ':')).encode(),
+                digest_size=16).digest()
+        except (TypeError, ValueError):
+            return value
+        with cls._lock:
+            shared = cls.documents.get(digest)
+            if shared is None:
+                cls.misses += 1
+                cls.documents[digest] = value
+                if len(cls.documents) > cls.max_size:
+                    cls.documents.popitem(last=False)
+                return value
+            cls.hits += 1
+            cls.documents.move_to_end(digest)
+            return shared
+
+    @classmethod
+    def intern_params(cls, params, transient=()):
+        """Intern the dict and list values of command parameters.
+
+        :param transient: names of the parameters only kept while the
+                          command runs, only their nested documents are
+                          shared.
+        """
+        if not cls.enabled:
+            return params
+        return {name: cls.intern(value, shared=name not in transient)
+                for name, value in params.items()}
+
+    @classmethod
+    def status(cls):
+        return {'enabled': cls.enabled, 'documents': len(cls.documents),
+                'hits': cls.hits, 'misses': cls.misses}
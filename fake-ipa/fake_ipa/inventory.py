@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import json
+import re
+import secrets
+
+# Placeholders are encoded as JSON strings, e.g. "@@<nonce>:mac@@", and
+# replaced by pre-encoded JSON fragments when a payload is rendered for a
+# node. The random nonce keeps strings coming from profiles or node data
+# from ever being mistaken for a placeholder.
+_NONCE = secrets.token_hex(16)
+_PLACEHOLDER = '@@' + _NONCE + ':%s@@'
+_PLACEHOLDER_RE = re.compile(r'"@@' + _NONCE + r':(\w+)@@"')
+
+DEFAULT_PROFILE = 'minimal'
+
+PROFILES = {
+    # The inventory that used to be hard-coded in inspector.inspect
+    'minimal': {
+        'cpu_count': 2,
+        'cpu_frequency': '2100.084',
+        'cpu_flags': ['fpu', 'mmx', 'fxsr', 'sse', 'sse2'],
+        'memory_mb': 0,
+        'disk_count': 0,
+        'nic_count': 0,
+        'numa_nodes': 0,
+        'lldp_tlvs': 0,
+        'system_vendor': False,
+    },
+    'large': {
+        'cpu_count': 128,
+        'cpu_frequency': '2600.000',
+        'cpu_flags': ['fpu', 'vme', 'de', 'pse', 'tsc', 'msr', 'pae', 'mce',
+                      'cx8', 'apic', 'sep', 'mtrr', 'pge', 'mca', 'cmov',
+                      'pat', 'pse36', 'clflush', 'mmx', 'fxsr', 'sse', 'sse2',
+                      'ht', 'syscall', 'nx', 'lm', 'avx', 'avx2', 'vmx'],
+        'memory_mb': 1048576,
+        'disk_count': 24,
+        'disk_size_gb': 1920,
+        'nic_count': 8,
+        'numa_nodes': 2,
+        'lldp_tlvs': 16,
+        'system_vendor': True,
+    },
+}
+
+
+class PayloadTemplate:
+    """A JSON document encoded once with placeholders for variable fields.
+
+    Values passed to :meth:`render` must already be JSON encoded, which
+    allows pre-rendered sub-documents to be spliced in as they are.
+    """
+
+    def __init__(self, document):
+        parts = _PLACEHOLDER_RE.split(json.dumps(document))
+        # Even items are literal JSON, odd items are placeholder names
+        self._literals = parts[0::2]
+        self._fields = parts[1::2]
+
+    def render(self, **values):
+        chunks = [self._literals[0]]
+        for field, literal in zip(self._fields, self._literals[1:]):
+            chunks.append(values[field])
+            chunks.append(literal)
+        return ''.join(chunks)
+
+
+class InventoryProfile:
+    """Inspection payload generator for one inventory profile."""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = dict(PROFILES[DEFAULT_PROFILE], **spec)
+        self._payload = PayloadTemplate(self._build_payload())
+        self._interface = PayloadTemplate(self._build_interface())
+        self._numa_nic = PayloadTemplate({'name': _PLACEHOLDER % 'name',
+                                          'numa_node': _PLACEHOLDER % 'numa'})
+
+    def _build_interface(self):
+        lldp = None
+        if self.spec['lldp_tlvs']:
+            # Chassis ID, port ID, TTL followed by organizationally
+            # specific TLVs padded with system description data.
+            lldp = [[1, '04' + '52540000aa01'], [2, '05' + '65746830'],
+                    [3, '0078']]
+            lldp += [[127, '0080c2' + '%02x' % i + 'a5' * 60]
+                     for i in range(self.spec['lldp_tlvs'])]
+        return {
+            'lldp': lldp,
+            'product': '0x0001',
+            'vendor': '0x1af4',
+            'name': _PLACEHOLDER % 'name',
+            'has_carrier': True,
+            'ipv4_address': _PLACEHOLDER % 'ip',
+            'client_id': None,
+            'mac_address': _PLACEHOLDER % 'mac',
+        }
+
+    def _build_payload(self):
+        spec = self.spec
+        inventory = {
+            'interfaces': _PLACEHOLDER % 'interfaces',
+            'cpu': {
+                'count': spec['cpu_count'],
+                'frequency': spec['cpu_frequency'],
+                'flags': spec['cpu_flags'],
+                'architecture': 'x86_64',
+            },
+        }
+        if spec['memory_mb']:
+            inventory['memory'] = {
+                'total': spec['memory_mb'] * 1024 * 1024,
+                'physical_mb': spec['memory_mb'],
+            }
+        if spec['disk_count']:
+            size = spec.get('disk_size_gb', 100) * 1024 ** 3
+            inventory['disks'] = [
+                {
+                    'name': '/dev/sd%s' % _disk_suffix(i),
+                    'model': 'FAKE SSD',
+                    'size': size,
+                    'rotational': False,
+                    'wwn': '0x5000c500%08x' % i,
+                    'serial': 'FAKE%08d' % i,
+                    'vendor': 'FAKE',
+                    'hctl': '%d:0:0:0' % i,
+                    'by_path': '/dev/disk/by-path/pci-0000:00:1f.2-ata-%d'
+                               % (i + 1),
+                }
+                for i in range(spec['disk_count'])
+            ]
+        if spec['system_vendor']:
+            inventory['system_vendor'] = {
+                'product_name': 'Fake System',
+                'serial_number': _PLACEHOLDER % 'serial',
+                'manufacturer': 'Metal3',
+            }
+            inventory['hostname'] = _PLACEHOLDER % 'hostname'
+        data = {
+            'boot_interface': _PLACEHOLDER % 'boot_interface',
+            'inventory': inventory,
+        }
+        if spec['numa_nodes']:
+            nodes = spec['numa_nodes']
+            per_node = max(spec['cpu_count'] // nodes, 1)
+            data['numa_topology'] = {
+                'ram': [{'numa_node': n,
+                         'size_kb': spec['memory_mb'] * 1024 // nodes}
+                        for n in range(nodes)],
+                'cpus': [{'cpu': c, 'numa_node': min(c // per_node, nodes - 1),
+                          'thread_siblings': [c - c % 2, c - c % 2 + 1]}
+                         for c in range(spec['cpu_count'])],
+                'nics': _PLACEHOLDER % 'numa_nics',
+            }
+        return data
+
+    def _nics(self, system):
+        nics = [(nic.get('name', f'enp{i+1}s0'), nic.get('mac'), nic.get('ip'))
+                for i, nic in enumerate(system.get('nics'))]
+        # Pad with synthetic NICs whose MACs are stable for a given system
+        digest = hashlib.blake2b(system['uuid'].encode(),
+                                 digest_size=3).hexdigest()
+        for i in range(len(nics), self.spec['nic_count']):
+            mac = '52:54:%s:%s:%s:%02x' % (digest[0:2], digest[2:4],
+                                           digest[4:6], i)
+            nics.append((f'enp{i+1}s0', mac, None))
+        return nics
+
+    def render(self, system):
+        """Return the JSON encoded inspection data for a system."""
+
+        nics = self._nics(system)
+        interfaces = ', '.join(
+            self._interface.render(name=json.dumps(name),
+                                   mac=json.dumps(mac),
+                                   ip=json.dumps(ip))
+            for name, mac, ip in nics)
+        numa_nics = ''
+        if self.spec['numa_nodes']:
+            numa_nics = ', '.join(
+                self._numa_nic.render(
+                    name=json.dumps(name),
+                    numa=str(i % self.spec['numa_nodes']))
+                for i, (name, _mac, _ip) in enumerate(nics))
+        return self._payload.render(
+            interfaces='[%s]' % interfaces,
+            numa_nics='[%s]' % numa_nics,
+            boot_interface=json.dumps(system.get('nics')[0]['mac']),
+            hostname=json.dumps(system.get('name')),
+            serial=json.dumps(system.get('uuid')))
+
+
+def _disk_suffix(index):
+    suffix = ''
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        suffix = chr(ord('a') + rem) + suffix
+    return suffix
+
+
+def load_profile(config):
+    """Build the inventory profile selected in the configuration.
+
+    Custom profiles can be defined in a JSON file mapping profile names to
+    specs, set with FAKE_IPA_INVENTORY_PROFILES_FILE. Custom specs override
+    the defaults of the minimal profile.
+    """
+    profiles = dict(PROFILES)
+    path = config.get('FAKE_IPA_INVENTORY_PROFILES_FILE')
+    if path:
+        with open(path) as f:
+            profiles.update(json.load(f))
+    name = config.get('FAKE_IPA_INVENTORY_PROFILE', DEFAULT_PROFILE)
+    if name not in profiles:
+        raise ValueError('Unknown inventory profile %s, available '
+                         'profiles: %s' % (name, ', '.join(sorted(profiles))))
+    return InventoryProfile(name, profiles[name])
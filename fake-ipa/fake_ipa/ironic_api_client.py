@@ -18,8 +18,12 @@ import json
 import requests
 import tenacity
 
+from fake_ipa.capture import TrafficCapture
 from fake_ipa import encoding
 from fake_ipa import error
+from fake_ipa.profiling import HotPathTimers
+from fake_ipa.settings import SharedSettings
+from fake_ipa.tracing import Tracer
 
 MIN_IRONIC_VERSION = (1, 31)
 AGENT_VERSION_IRONIC_VERSION = (1, 36)
@@ -38,11 +42,13 @@ class APIClient():
     heartbeat_api = '/%s/heartbeat/{uuid}' % api_version
     _ironic_api_version = None
     agent_token = None
+    settings = SharedSettings()
 
     @classmethod
-    def initialize(cls, config, logger):
+    def initialize(cls, config, logger, settings):
         cls._logger = logger
         cls._config = config
+        SharedSettings.set(settings)
         return cls
 
     def __init__(self, node, api_url):
@@ -56,6 +62,7 @@ class APIClient():
                                                 pool_maxsize=2)
         self.session = requests.Session()
         self.session.mount(self.api_url, adapter)
+        TrafficCapture.attach(self.session, 'ironic')
 
         self.encoder = encoding.RESTJSONEncoder()
 
@@ -65,8 +72,6 @@ class APIClient():
         if data is not None:
             data = self.encoder.encode(data)
 
-        verify, cert = get_ssl_client_options(self._config)
-
         headers.update({
             'Content-Type': 'application/json',
             'Accept': 'application/json',
@@ -76,8 +81,8 @@ class APIClient():
                                     request_url,
                                     headers=headers,
                                     data=data,
-                                    verify=verify,
-                                    cert=cert,
+                                    verify=self.settings.verify,
+                                    cert=self.settings.cert,
                                     **kwargs)
 
     def _get_ironic_api_version_header(self, version=None):
@@ -86,6 +91,18 @@ class APIClient():
             version = min(ironic_version, AGENT_TOKEN_IRONIC_VERSION)
         return {'X-OpenStack-Ironic-API-Version': '%d.%d' % version}
 
+    @classmethod
+    def discover_version(cls, api_url):
+        """Discover the Ironic API version once for all the clients.
+
+        :returns: the version, MIN_IRONIC_VERSION if Ironic is unreachable.
+        """
+        client = cls({'uuid': None}, api_url)
+        version = client._get_ironic_api_version()
+        if client._ironic_api_version:
+            cls._ironic_api_version = client._ironic_api_version
+        return version
+
     def _get_ironic_api_version(self):
         if self._ironic_api_version:
             return self._ironic_api_version
@@ -123,6 +140,8 @@ class APIClient():
 
         return 'Error %d: %s' % (response.status_code, text)
 
+    @HotPathTimers.timed('lookup_node')
+    @Tracer.traced('lookup', lambda self, *args, **kwargs: self.node)
     def lookup_node(self, timeout, starting_interval,
                     node_uuid=None, max_interval=30):
         retry = tenacity.retry(
@@ -139,15 +158,15 @@ class APIClient():
 
     def _do_lookup(self, node_uuid):
         """The actual call to lookup a node."""
-        params = {
-            'addresses': self.node.get('nics')[0]['mac']
-        }
+        params = {}
+        if self.node.get('nics'):
+            params['addresses'] = self.node['nics'][0]['mac']
         if node_uuid:
             params['node_uuid'] = node_uuid
 
         self._logger.debug(
             'Looking up node with addresses %r and UUID %s at %s',
-            params['addresses'], node_uuid, self.api_url)
+            params.get('addresses'), node_uuid, self.api_url)
 
         try:
             response = self._request(
@@ -166,7 +185,8 @@ class APIClient():
             return False
         except Exception as err:
             msg = ('Unhandled error looking up node with addresses {} at '
-                   '{}: {}'.format(params['addresses'], self.api_url, err))
+                   '{}: {}'.format(params.get('addresses'), self.api_url,
+                                   err))
             self._logger.exception(msg)
             return False
 
@@ -174,7 +194,7 @@ class APIClient():
             self._logger.warning(
                 'Failed looking up node with addresses %r at %s. '
                 '%s. Check if inspection has completed.',
-                params['addresses'], self.api_url,
+                params.get('addresses'), self.api_url,
                 self._error_from_response(response)
             )
             return False
@@ -190,7 +210,7 @@ class APIClient():
             self._logger.warning(
                 'Got invalid node data in response to query for node '
                 'with addresses %r from %s: %s',
-                params['addresses'], self.api_url, content,
+                params.get('addresses'), self.api_url, content,
             )
             return False
 
@@ -256,16 +276,3 @@ class APIClient():
         return '{}://{}:{}/{}'.format(advertise_protocol,
                                       advertise_address[0],
                                       advertise_address[1], uuid)
-
-def get_ssl_client_options(conf):
-
-    if conf.get('FAKE_IPA_INSECURE'):
-        verify = False
-    else:
-        verify = conf.get("FAKE_IPA_CAFILE") or True
-    if conf.get("FAKE_IPA_CERTFILE") and conf.get("FAKE_IPA_KEYFILE"):
-        cert = (conf.get("FAKE_IPA_CERTFILE"), conf.get("FAKE_IPA_KEYFILE"))
-    else:
-        cert = None
-
-    return verify, cert
@@ -0,0 +1,227 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Synthetic power notification load generator for FakeIPA.
+
+Sends the power state notifications sushy-tools sends on power actions,
+for synthetic systems, to measure how fast FakeIPA's notification_handler
+absorbs power-on storms without an emulator deployment. Phases run in
+order, a burst sends all its notifications at once, a rate phase sends
+them evenly spaced. Every notification toggles the power of the next
+system, powered off systems are powered on and the other way around.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+from fake_ipa.fleet import ProcessSampler
+from fake_ipa import metrics
+
+LOG = logging.getLogger(__name__)
+
+
+def make_system(index, boot_device='Pxe', nb_nics=2, rng=random):
+    """System as sent by the sushy-tools fake driver notifications."""
+    nics = []
+    for nic in range(nb_nics):
+        number = index * nb_nics + nic
+        nics.append({
+            'mac': '52:54:03:%02x:%02x:%02x' % (
+                number >> 16 & 0xff, number >> 8 & 0xff, number & 0xff),
+            'ip': '10.%d.%d.%d' % (nic, index >> 8 & 0xff, index & 0xff),
+        })
+    return {
+        'uuid': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        'name': 'loadgen-%05d' % index,
+        'power_state': 'Off',
+        'boot_device': boot_device,
+        'boot_mode': 'UEFI',
+        'nics': nics,
+    }
+
+
+def parse_phase(value):
+    """Parse `burst:<count>` or `rate:<per second>:<seconds>`."""
+    kind, _, spec = value.partition(':')
+    try:
+        if kind == 'burst':
+            phase = {'kind': kind, 'count': int(spec)}
+            if phase['count'] > 0:
+                return phase
+        elif kind == 'rate':
+            rate, duration = spec.split(':')
+            phase = {'kind': kind, 'rate': float(rate),
+                     'duration': float(duration)}
+            if phase['rate'] > 0 and phase['duration'] > 0:
+                return phase
+    except ValueError:
+        pass
+    raise argparse.ArgumentTypeError(
+        'Invalid phase %s, expected burst:<count> or '
+        'rate:<per second>:<seconds>' % value)
+
+
+class NotificationGenerator:
+    """Send power notifications of synthetic systems over pooled
+    connections.
+    """
+
+    def __init__(self, fake_ipa_url, systems, concurrency=64):
+        self.url = fake_ipa_url.rstrip('/') + '/'
+        self.systems = systems
+        self.next = 0
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.verify = False
+        self.pool = ThreadPoolExecutor(max_workers=concurrency,
+                                       thread_name_prefix='loadgen')
+        self._lock = threading.Lock()
+
+    def transition(self):
+        """Notification toggling the power of the next system."""
+        system = self.systems[self.next % len(self.systems)]
+        self.next += 1
+        power_state = 'Off' if system['power_state'] == 'On' else 'On'
+        notification = dict(system, pending_power={
+            'power_state': power_state, 'apply_time': int(time.time())})
+        system['power_state'] = power_state
+        return notification
+
+    def _send(self, notification, samples):
+        started = time.perf_counter()
+        try:
+            status = self.session.put(self.url, json=notification,
+                                      timeout=60).status_code
+        except requests.exceptions.RequestException as exc:
+            LOG.debug('Notification of %s failed: %s', notification['name'],
+                      exc)
+            status = None
+        latency = time.perf_counter() - started
+        with self._lock:
+            samples.append((status, latency))
+
+    def run_phase(self, phase):
+        samples = []
+        futures = []
+        started = time.monotonic()
+        if phase['kind'] == 'burst':
+            for _ in range(phase['count']):
+                futures.append(self.pool.submit(self._send, self.transition(),
+                                                samples))
+        else:
+            for index in range(int(phase['rate'] * phase['duration'])):
+                time.sleep(max(0, started + index / phase['rate']
+                               - time.monotonic()))
+                futures.append(self.pool.submit(self._send, self.transition(),
+                                                samples))
+        wait(futures)
+        elapsed = time.monotonic() - started
+        accepted = [latency for status, latency in samples
+                    if status is not None and status < 300]
+        report = dict(phase,
+                      sent=len(samples),
+                      accepted=len(accepted),
+                      errors=len(samples) - len(accepted),
+                      elapsed=round(elapsed, 3),
+                      accepted_per_second=round(len(accepted) / elapsed, 1),
+                      latency_ms=metrics.percentiles(
+                          [latency * 1000 for _, latency in samples]))
+        LOG.info('%s: %d/%d accepted, %.1f/s, p90 %sms', phase['kind'],
+                 report['accepted'], report['sent'],
+                 report['accepted_per_second'],
+                 report['latency_ms'].get('p90'))
+        return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('fake-ipa-loadgen')
+    parser.add_argument('--fake-ipa-url', default='http://localhost:9999')
+    parser.add_argument('--fake-ipa-pid', type=int,
+                        help='PID of FakeIPA to report its CPU and RSS.')
+    parser.add_argument('--phase', '-p', type=parse_phase, action='append',
+                        help='burst:<count> or rate:<per second>:<seconds>, '
+                             'can be repeated, default burst:100.')
+    parser.add_argument('--systems', type=int, default=1000,
+                        help='Synthetic systems the notifications cycle '
+                             'through.')
+    parser.add_argument('--nics', type=int, default=2,
+                        help='NICs per system.')
+    parser.add_argument('--boot-device', default='Pxe',
+                        help='Boot device of the systems, FakeIPA does not '
+                             'boot agents for Hdd.')
+    parser.add_argument('--concurrency', type=int, default=64,
+                        help='Concurrent notifications and pooled '
+                             'connections.')
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the system UUIDs, for repeatable '
+                             'runs.')
+    parser.add_argument('--output', '-o',
+                        help='Report file, stdout if not set.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    rng = random.Random(args.seed)
+    systems = [make_system(index, args.boot_device, args.nics, rng)
+               for index in range(args.systems)]
+    generator = NotificationGenerator(args.fake_ipa_url, systems,
+                                      args.concurrency)
+    sampler = ProcessSampler(args.fake_ipa_pid) if args.fake_ipa_pid else None
+
+    started = time.monotonic()
+    phases = []
+    for phase in args.phase or [parse_phase('burst:100')]:
+        phases.append(generator.run_phase(phase))
+        if sampler:
+            sampler.sample()
+    elapsed = time.monotonic() - started
+    sent = sum(phase['sent'] for phase in phases)
+    accepted = sum(phase['accepted'] for phase in phases)
+    report = {
+        'phases': phases,
+        'sent': sent,
+        'accepted': accepted,
+        'errors': sent - accepted,
+        'elapsed': round(elapsed, 3),
+        'accepted_per_second': round(accepted / elapsed, 1),
+    }
+    if sampler:
+        report['fake_ipa'] = sampler.report(elapsed)
+    generator.pool.shutdown()
+    data = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    return 0 if report['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -14,9 +14,40 @@
 #    under the License.
 
 import base64
+import hashlib
 import io
+import json
+import logging
+import os
+import random
+import tarfile
+import tempfile
+import threading
+import time
 
 from fake_ipa import base
+from fake_ipa import encoding
+
+LOG = logging.getLogger(__name__)
+
+# Relative share of each file in the generated archives, loosely based on
+# what the real agent collects.
+DEFAULT_FILE_MIX = {
+    'journal': 70,
+    'dmesg': 10,
+    'ps': 5,
+    'df': 2,
+    'ip_addr': 3,
+    'lsblk': 5,
+    'lshw': 5,
+}
+
+_CHUNK_SIZE = 1024 * 1024
+# key -> PreEncodedFile of the cached archive
+_archives = {}
+# key -> lock held while the archive is generated
+_archive_locks = {}
+_archives_lock = threading.Lock()
 
 
 class LogExtension(base.BaseAgentExtension):
@@ -32,7 +63,13 @@ class LogExtension(base.BaseAgentExtension):
                   of a gzipped and base64 encoded string of the file with
                   the logs.
         """
-        logs = collect_system_logs()
+        settings = self.agent.settings if self.agent else None
+        if settings is None:
+            return {'system_logs': collect_system_logs()}
+        logs = collect_system_logs(
+            size_mb=settings.system_logs_size_mb,
+            file_mix=settings.system_logs_file_mix,
+            cache_dir=settings.system_logs_cache_dir)
         return {'system_logs': logs}
 
 
@@ -43,13 +80,111 @@ def _encode_as_text(s):
     return s.decode('ascii')
 
 
-def collect_system_logs(journald_max_lines=None):
+class _Base64Writer:
+    """File-like object base64 encoding everything written to it."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.written = 0
+        self._pending = b''
+
+    def write(self, data):
+        size = len(data)
+        self.written += size
+        data = self._pending + data
+        # base64 works on 3 bytes groups, keep the rest for the next write
+        cut = len(data) - len(data) % 3
+        self._pending = data[cut:]
+        self.fileobj.write(base64.b64encode(data[:cut]))
+        return size
+
+    def flush(self):
+        self.fileobj.write(base64.b64encode(self._pending))
+        self._pending = b''
+
+
+def _log_chunk(name, rng, size):
+    """Generate size bytes of log-like text."""
+    lines = []
+    total = 0
+    while total < size:
+        line = '%s fake-ipa %s[%d]: %032x\n' % (
+            time.strftime('%b %d %H:%M:%S'), name, rng.randint(1, 65535),
+            rng.getrandbits(128))
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines).encode()[:size]
+
+
+def _build_archive(path, size, file_mix):
+    """Write a gzipped tar of about size bytes to path as a JSON string."""
+    rng = random.Random(size)
+    total_weight = sum(file_mix.values())
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        # Quote the base64 text so the file content is a JSON string
+        f.write(b'"')
+        writer = _Base64Writer(f)
+        with tarfile.open(fileobj=writer, mode='w|gz') as tar:
+            part = 0
+            while writer.written < size:
+                for name, weight in file_mix.items():
+                    data = _log_chunk(name, rng,
+                                      _CHUNK_SIZE * weight // total_weight)
+                    info = tarfile.TarInfo(
+                        '%s.%d' % (name, part) if part else name)
+                    info.size = len(data)
+                    info.mtime = time.time()
+                    tar.addfile(info, io.BytesIO(data))
+                part += 1
+        writer.flush()
+        f.write(b'"')
+    os.rename(tmp_path, path)
+
+
+def collect_system_logs(journald_max_lines=None, size_mb=0, file_mix=None,
+                        cache_dir=None):
     """Collect system logs.
 
+    Archives bigger than zero are generated once per size and file mix,
+    streamed to a cache file and shared by all the agents. The responses
+    embedding them read the cache file in chunks.
+
     :param journald_max_lines: Maximum number of lines to retrieve from
                                the journald. if None, return everything.
+    :param size_mb: Approximate size of the compressed archive in MiB.
+    :param file_mix: Dict of file names to their relative size.
+    :param cache_dir: Directory of the cached archives, defaults to the
+                      system temporary directory.
     :returns: A tar, gzip base64 encoded string with the logs.
     """
 
-    with io.BytesIO() as fp:
-        return _encode_as_text(fp.getvalue())
+    if not size_mb:
+        with io.BytesIO() as fp:
+            return _encode_as_text(fp.getvalue())
+
+    file_mix = file_mix or DEFAULT_FILE_MIX
+    key = '%s-%s' % (size_mb, hashlib.blake2b(
+        json.dumps(file_mix, sort_keys=True).encode(),
+        digest_size=4).hexdigest())
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is not None:
+            return archive
+        lock = _archive_locks.setdefault(key, threading.Lock())
+
+    # Only the agents asking for the same archive wait for its generation
+    with lock:
+        with _archives_lock:
+            archive = _archives.get(key)
+        if archive is None:
+            path = os.path.join(cache_dir or tempfile.gettempdir(),
+                                'fake-ipa-system-logs-%s.json' % key)
+            if not os.path.exists(path):
+                LOG.info('Generating %s MiB system logs archive %s',
+                         size_mb, path)
+                _build_archive(path, int(size_mb * 1024 * 1024), file_mix)
+            archive = encoding.PreEncodedFile(path)
+            with _archives_lock:
+                _archives[key] = archive
+    return archive
@@ -13,29 +13,59 @@
 #    under the License.
 
 import argparse
+import hmac
 import logging
 import sys
+import threading
 from threading import Thread
+import time
 
 from flask import Flask
+from flask import g
 from flask import json
 from flask import request
+from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import Conflict
+from werkzeug.exceptions import Forbidden
 from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import NotFound
 from werkzeug.exceptions import Unauthorized
 from werkzeug import Response
+from werkzeug.serving import is_running_from_reloader
 
 
+from fake_ipa import base
+from fake_ipa.capture import TrafficCapture
+from fake_ipa.compression import ResponseCompressor
 from fake_ipa import encoding
+from fake_ipa.fake_agent import AgentPool
 from fake_ipa.fake_agent import FakeIronicPythonAgent
 from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.inspector import Inspector
+from fake_ipa.ironic_api_client import APIClient
+from fake_ipa.memory import MemoryMonitor
+from fake_ipa.profiling import HotPathTimers
+from fake_ipa.profiling import SamplingProfiler
+from fake_ipa.redfish import RedfishClient
+from fake_ipa.registration import BulkRegistrar
+from fake_ipa.settings import Settings
+from fake_ipa.settings import SharedSettings
+from fake_ipa.tracing import Tracer
+from fake_ipa.tuning import RuntimeTuning
 
 
 class Application(Flask):
     agents = {}
     booted_q = set()
+    # Guards the check and update of booted_q, notifications and bulk
+    # registrations of the same system may be handled concurrently
+    booted_lock = threading.Lock()
+    settings = SharedSettings()
 
 
 app = Application(__name__)
+_runtime_lock = threading.Lock()
+_runtime_ready = False
 app.logger.setLevel(logging.DEBUG)
 
 @app.errorhandler(HTTPException)
@@ -54,6 +84,132 @@ def handle_exception(e):
     return response
 
 
+@app.before_request
+def start_timer():
+    g.request_started = time.time()
+
+
+# Flask runs the after_request functions in the reverse order of their
+# registration: the responses are captured before being compressed.
+@app.after_request
+def compress_response(response):
+    """Compress the large responses of the IPA API routes."""
+    if request.endpoint and request.endpoint.startswith('api_'):
+        ResponseCompressor.compress(response, request.endpoint,
+                                    request.accept_encodings)
+    return response
+
+
+@app.after_request
+def capture_request(response):
+    """Capture the notifications and command API calls.
+
+    Their handling time is returned in the Server-Timing header, so replays
+    measure the same latency as the capture.
+    """
+    if request.endpoint in TrafficCapture.inbound_endpoints:
+        response.headers['Server-Timing'] = 'app;dur=%.3f' % (
+            (time.time() - g.request_started) * 1000)
+        if TrafficCapture.enabled:
+            TrafficCapture.inbound(request, response, g.request_started)
+    return response
+
+
+@app.route('/debug/compression', methods=['GET'])
+def debug_compression():
+    check_admin_token()
+    return jsonify(ResponseCompressor.report())
+
+
+@app.route('/debug/timers', methods=['GET'])
+def debug_timers():
+    check_admin_token()
+    return jsonify(HotPathTimers.report())
+
+
+@app.route('/debug/memory', methods=['GET'])
+def debug_memory():
+    check_admin_token()
+    return jsonify(MemoryMonitor.report())
+
+
+@app.route('/debug/memory/snapshot', methods=['POST'])
+def debug_memory_snapshot():
+    """Take a tracemalloc snapshot and diff it with the previous one."""
+    check_admin_token()
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        raise BadRequest('limit must be an integer')
+    return jsonify(MemoryMonitor.snapshot(limit))
+
+
+@app.route('/debug/memory/snapshot', methods=['DELETE'])
+def debug_memory_stop_tracing():
+    """Stop tracemalloc, started by the first snapshot."""
+    check_admin_token()
+    return jsonify({'was_tracing': MemoryMonitor.stop_tracing()})
+
+
+@app.route('/debug/traces', methods=['GET'])
+def debug_traces():
+    """Export the recorded spans as JSON lines or OTLP/JSON."""
+    check_admin_token()
+    node = request.args.get('node')
+    fmt = request.args.get('format', 'jsonl')
+    if fmt == 'jsonl':
+        data = Tracer.export_jsonl(node)
+        mimetype = 'application/jsonl'
+    elif fmt == 'otlp':
+        data = json.dumps(Tracer.export_otlp(node))
+        mimetype = 'application/json'
+    else:
+        raise BadRequest('format must be jsonl or otlp')
+    return Response(data, mimetype=mimetype, headers={
+        'Content-Disposition': 'attachment; filename=fake-ipa-traces-%d.%s'
+                               % (time.time(), 'jsonl' if fmt == 'jsonl'
+                                  else 'json')})
+
+
+@app.route('/debug/traces/phases', methods=['GET'])
+def debug_trace_phases():
+    check_admin_token()
+    return jsonify(Tracer.phases())
+
+
+@app.route('/debug/inspection', methods=['GET'])
+def debug_inspection():
+    check_admin_token()
+    return jsonify(Inspector.report())
+
+
+@app.route('/debug/redfish', methods=['GET'])
+def debug_redfish():
+    check_admin_token()
+    return jsonify(RedfishClient.report())
+
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Profile all the threads and return their collapsed stacks."""
+    check_admin_token()
+    if not SamplingProfiler.enabled:
+        raise NotFound('Profiling is disabled, set FAKE_IPA_PROFILING.')
+    try:
+        seconds = float(request.args.get('seconds', 10))
+    except ValueError:
+        raise BadRequest('seconds must be a number')
+    if not 0 < seconds <= SamplingProfiler.max_seconds:
+        raise BadRequest('seconds must be between 0 and %s'
+                         % SamplingProfiler.max_seconds)
+    stacks = SamplingProfiler.profile(seconds)
+    if stacks is None:
+        raise Conflict('A profile is already running.')
+    return Response(stacks, mimetype='text/plain', headers={
+        'Content-Disposition':
+            'attachment; filename=fake-ipa-%d.collapsed' % time.time()})
+
+
 @app.route('/', methods=['PUT'])
 def notification_handler():
     """
@@ -104,38 +260,194 @@ def notification_handler():
     if pending_power_state == 'On':
         app.logger.info("Pending power state is 'On' for system: %s", system_name)
         # If the system is not already booted and the boot device is not 'Hdd', initiate boot process
-        if not is_booted(system) and system['boot_device'] != 'Hdd':
+        with app.booted_lock:
+            booting = (not is_booted(system)
+                       and system['boot_device'] != 'Hdd')
+            if booting:
+                app.booted_q.add(system['uuid'])
+        if booting:
             app.logger.info("Boot IPA for System %s.", system_name)
-            app.booted_q.add(system['uuid'])
             boot(system)
         else:
             app.logger.info("System %s is already booted or boot device is 'Hdd'. No boot action taken.", system_name)
     else:
         app.logger.info("Pending power state is 'Off' or other state for system: %s", system_name)
         # If the system is currently booted, initiate destruction process
-        if is_booted(system):
+        with app.booted_lock:
+            booted = is_booted(system)
+            if booted:
+                app.booted_q.remove(system['uuid'])
+        if booted:
             app.logger.info("Shutdown IPA for System %s", system_name)
-            app.booted_q.remove(system['uuid'])
             remove_from_heartbeater(system['uuid'])
     return '', 204
 
 def is_booted(system):
     return system['uuid'] in app.booted_q
 
+def ensure_runtime():
+    """Initialize the agent runtime once.
+
+    main() does it at startup, this is a fallback when the app is served
+    by something else.
+    """
+    global _runtime_ready
+    if _runtime_ready:
+        return
+    with _runtime_lock:
+        if not _runtime_ready:
+            if app.settings is None:
+                app.settings = Settings.from_config(app.config)
+            FakeIronicPythonAgent.initialize(app.config, app.logger, app,
+                                             app.settings)
+            BulkRegistrar.initialize(app.config, app.logger, app)
+            RuntimeTuning.initialize(app.config, app.logger, app)
+            _runtime_ready = True
+
+
+def warm_up():
+    """Get everything ready before the first power-on.
+
+    The runtime is initialized, the extensions imported, the Ironic API
+    version discovered and the pooled inspector and Redfish connections
+    opened.
+    """
+    started = time.monotonic()
+    ensure_runtime()
+    base.preload_extensions()
+    if app.settings.api_url:
+        version = APIClient.discover_version(app.settings.api_url)
+        app.logger.info('Ironic API version: %d.%d', *version)
+    if app.settings.inspection_callback_url:
+        Inspector.warm_up()
+    RedfishClient.warm_up()
+    app.logger.info('Runtime warm-up done in %.3fs',
+                    time.monotonic() - started)
+
+
 def boot(system):
-    # init agent if not already done
-    if not hasattr(FakeIronicPythonAgent, 'api'):
-        FakeIronicPythonAgent.initialize(app.config, app.logger, app)
-    ipa = FakeIronicPythonAgent(system, app.config.get(
-        'FAKE_IPA_API_URL', 'http://localhost:6385'))
+    ensure_runtime()
+    ipa = AgentPool.acquire(system, app.settings.api_url)
     thread = Thread(target=ipa.boot, daemon=True)
     thread.start()
 
 
+def check_admin_token():
+    """Refuse admin requests without the admin token.
+
+    The admin and debug endpoints are disabled unless FAKE_IPA_ADMIN_TOKEN
+    is set.
+    """
+    token = app.settings.admin_token if app.settings else app.config.get(
+        'FAKE_IPA_ADMIN_TOKEN')
+    if not token:
+        raise Forbidden('Admin endpoints are disabled, '
+                        'FAKE_IPA_ADMIN_TOKEN is not set.')
+    given = request.headers.get('X-Admin-Token', '')
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        raise Unauthorized('Admin token invalid.')
+
+
+def admin_actor():
+    """Who made an admin request, for the audit logs.
+
+    The token is shared, so the user is the one declared by the client in
+    the X-Admin-User header.
+    """
+    return '%s (%s)' % (request.headers.get('X-Admin-User', 'unknown'),
+                        request.remote_addr)
+
+
+@app.route('/admin/agents', methods=['POST'])
+def admin_register_agents():
+    """Register agents of already enrolled nodes in bulk.
+
+    Expects {"nodes": [...]} where each node is either an Ironic node UUID
+    or a system dict as received by notification_handler, optionally with
+    the Ironic "node_uuid".
+    """
+    check_admin_token()
+    body = request.get_json(force=True)
+    if not isinstance(body, dict) or not isinstance(body.get('nodes'), list):
+        raise BadRequest('Expected a list of nodes')
+    ensure_runtime()
+    try:
+        queued = BulkRegistrar.register(body['nodes'])
+    except ValueError as e:
+        raise BadRequest(str(e))
+    app.logger.info('Queued %d agents for registration', queued)
+    return jsonify(dict(BulkRegistrar.status(), queued=queued), status=202)
+
+
+@app.route('/admin/agents', methods=['GET'])
+def admin_registration_status():
+    check_admin_token()
+    if not _runtime_ready:
+        return jsonify({'pending': 0, 'registered': 0, 'failed': 0})
+    return jsonify(BulkRegistrar.status())
+
+
+@app.route('/admin/heartbeat/stress', methods=['POST'])
+def admin_start_heartbeat_stress():
+    """Start a heartbeat stress schedule.
+
+    Expects {"schedule": [{"rate": 100, "duration": 60}, ...]} and
+    optionally the number of extra heartbeater "threads".
+    """
+    check_admin_token()
+    body = request.get_json(force=True)
+    if not isinstance(body, dict) or not isinstance(body.get('schedule'),
+                                                    list):
+        raise BadRequest('Expected a stress schedule')
+    ensure_runtime()
+    if Heatbeater.stress is not None and not Heatbeater.stress.finished:
+        raise Conflict('A heartbeat stress schedule is already running')
+    try:
+        stress = Heatbeater.start_stress(
+            body['schedule'],
+            body.get('threads', app.settings.heartbeat_stress_threads))
+    except (AttributeError, TypeError, ValueError) as e:
+        raise BadRequest(str(e))
+    return jsonify(stress.report(), status=202)
+
+
+@app.route('/admin/heartbeat/stress', methods=['GET'])
+def admin_heartbeat_stress_report():
+    check_admin_token()
+    if Heatbeater.stress is None:
+        raise NotFound('No heartbeat stress schedule was started')
+    return jsonify(Heatbeater.stress.report())
+
+
+@app.route('/admin/tuning', methods=['GET'])
+def admin_tuning():
+    check_admin_token()
+    ensure_runtime()
+    return jsonify({'parameters': RuntimeTuning.get(),
+                    'audit': list(RuntimeTuning.audit)})
+
+
+@app.route('/admin/tuning', methods=['PATCH'])
+def admin_update_tuning():
+    """Update tuning parameters live.
+
+    Expects a dict of parameter name to new value, e.g.
+    {"heartbeater_threads": 8, "log_level": "INFO"}.
+    """
+    check_admin_token()
+    body = request.get_json(force=True)
+    if not isinstance(body, dict) or not body:
+        raise BadRequest('Expected a dict of tuning parameters')
+    ensure_runtime()
+    try:
+        parameters = RuntimeTuning.update(body, actor=admin_actor())
+    except ValueError as e:
+        raise BadRequest(str(e))
+    return jsonify({'parameters': parameters})
+
+
 def remove_from_heartbeater(uuid):
-    # init agent if not already done
-    if not hasattr(FakeIronicPythonAgent, 'api'):
-        FakeIronicPythonAgent.initialize(app.config, app.logger, app)
+    ensure_runtime()
     Heatbeater.remove_from_heartbeater_q(uuid)
 
 
@@ -147,9 +459,12 @@ _CUSTOM_MEDIA_TYPE = 'application/vnd.openstack.ironic-python-agent.v1+json'
 def jsonify(value, status=200):
     """Convert value to a JSON response using the custom encoder."""
 
-    encoder = encoding.RESTJSONEncoder()
-    data = encoder.encode(value)
-    return Response(data, status=status, mimetype='application/json')
+    parts = encoding.RESTJSONEncoder().parts(value)
+    response = Response(encoding.RESTJSONEncoder.join(parts), status=status,
+                        mimetype='application/json')
+    # The compression reuses the compressed bytes of the documents
+    response.json_parts = parts
+    return response
 
 
 def make_link(url, rel_name, resource='', resource_args='',
@@ -219,11 +534,31 @@ def api_v1(uuid):
 
 @app.route('/<uuid>/v1/commands/', methods=['GET'])
 def api_list_commands(uuid):
+    """List the command results of an agent.
+
+    Supports conditional requests: the ETag changes with the agent command
+    results version, so unchanged histories get a 304. The `since` query
+    parameter only returns the results of the commands after the given
+    command ID.
+    """
     try:
-        results = app.agents[uuid].list_command_results()
+        agent = app.agents[uuid]
     except KeyError:
-        pass
-    return jsonify({'commands': results})
+        raise NotFound('Agent %s not found' % uuid)
+    since = request.args.get('since')
+    agent.refresh_last_async_command()
+    etag = '%s-%s-%d-%s' % (uuid, agent.command_results_epoch,
+                            agent.command_results_version, since or '')
+    matched = ResponseCompressor.match(etag, request.if_none_match)
+    if matched:
+        response = Response(status=304)
+        response.set_etag(matched)
+        return response
+
+    results = agent.list_command_results(since=since)
+    response = jsonify({'commands': results})
+    response.set_etag(etag)
+    return response
 
 
 @app.route('/<uuid>/v1/commands/<cmd>', methods=['GET'])
@@ -232,7 +567,7 @@ def api_get_command(uuid, cmd):
     wait = request.args.get('wait')
 
     if wait and wait.lower() == 'true':
-        result.join()
+        result.join(timeout=app.settings.command_wait_timeout)
 
     return jsonify(result)
 
@@ -252,7 +587,7 @@ def api_run_command(uuid):
         body['name'], **body['params'])
     wait = request.args.get('wait')
     if wait and wait.lower() == 'true':
-        result.join()
+        result.join(timeout=app.settings.command_wait_timeout)
     return jsonify(result)
 
 
@@ -279,28 +614,30 @@ def parse_args():
 def main():
     args = parse_args()
     app.config.from_pyfile(args.config)
-    DEFAULT_PORT = 9999
-    if not app.config.get('FAKE_IPA_ADVERTISE_ADDRESS_IP'):
-        app.logger.error(
-            'Please set FAKE_IPA_ADVERTISE_ADDRESS_IP in config file'
-            )
+    try:
+        app.settings = Settings.from_config(app.config)
+    except ValueError as e:
+        app.logger.error('Invalid configuration: %s', e)
         return 1
-    if not app.config.get('FAKE_IPA_ADVERTISE_ADDRESS_PORT'):
-        app.config.setdefault('FAKE_IPA_ADVERTISE_ADDRESS_PORT', DEFAULT_PORT)
 
     app.logger.info(
-        'FAKE_IPA_ADVERTISE_ADDRESS_IP: %s',
-        app.config.get('FAKE_IPA_ADVERTISE_ADDRESS_IP')
-        )
-    cert = app.config.get("FAKE_IPA_CERTFILE")
-    key = app.config.get("FAKE_IPA_KEYFILE")
-    if  cert is not None and key is not None:
-        ssl = (cert, key)
+        'FAKE_IPA_ADVERTISE_ADDRESS_IP: %s', app.settings.advertise_ip)
+    ResponseCompressor.initialize(app.config, app.logger, app.settings)
+    TrafficCapture.initialize(app.config, app.logger, app.settings)
+    SamplingProfiler.initialize(app.config, app.logger, app.settings)
+    MemoryMonitor.initialize(app.config, app.logger, app)
+    Tracer.initialize(app.config, app.logger, app.settings)
+    # With debug, the reloader serves the app from a child process and the
+    # first process only watches the files
+    if is_running_from_reloader():
+        warm_up()
+    if app.settings.certfile:
+        ssl = (app.settings.certfile, app.settings.keyfile)
     else:
         ssl = None
     app.run(ssl_context=ssl,
-            host=app.config.get('SUSHY_FAKE_IPA_LISTEN_IP', '0.0.0.0'),
-            port=app.config.get('SUSHY_FAKE_IPA_LISTEN_PORT', DEFAULT_PORT),
+            host=app.settings.listen_ip,
+            port=app.settings.listen_port,
             debug=True)
 
     return 0
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import threading
+import time
+import tracemalloc
+
+from fake_ipa.fake_agent import AgentPool
+from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.interning import ParamInterner
+
+
+def rss():
+    """Resident set size of the process in bytes, None if unknown."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+class MemoryMonitor:
+    """Memory accounting of the long lived FakeIPA structures.
+
+    Gauges report the size of the structures growing with the number of
+    nodes. In soak mode the gauges are sampled periodically, and a gauge
+    growing per simulated node over the whole window is reported as a
+    probable leak.
+    """
+
+    history = collections.deque()
+    leaks = {}
+    _snapshot = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, api):
+        cls._logger = logger
+        cls.api = api
+        cls.frames = api.settings.tracemalloc_frames
+        if api.settings.tracemalloc:
+            tracemalloc.start(cls.frames)
+        cls.soak_interval = api.settings.soak_interval
+        cls.soak_window = api.settings.soak_window
+        cls.history = collections.deque(maxlen=cls.soak_window)
+        if cls.soak_interval:
+            logger.info('Soak mode: sampling memory gauges every %ss',
+                        cls.soak_interval)
+            threading.Thread(target=cls._soak, daemon=True).start()
+        return cls
+
+    @classmethod
+    def gauges(cls):
+        agents = list(cls.api.agents.values())
+        return {
+            'rss': rss(),
+            'nodes': len(cls.api.booted_q),
+            'agents': len(agents),
+            'command_results': sum(len(agent.command_results)
+                                   for agent in agents),
+            'parked_agents': len(AgentPool.parked),
+            'heartbeater_queue': len(Heatbeater.queue),
+            'heartbeater_removals': len(Heatbeater.remove_from_q),
+        }
+
+    @classmethod
+    def _soak(cls):
+        while True:
+            time.sleep(cls.soak_interval)
+            try:
+                cls.sample()
+            except Exception:
+                cls._logger.exception('Failed to sample memory gauges')
+
+    @classmethod
+    def sample(cls):
+        """Record the gauges and report those growing per node."""
+        gauges = cls.gauges()
+        with cls._lock:
+            cls.history.append(gauges)
+            if len(cls.history) < cls.history.maxlen:
+                return
+            per_node = [{name: value / max(sample['nodes'], 1)
+                         for name, value in sample.items()
+                         if name != 'nodes' and value is not None}
+                        for sample in cls.history]
+            leaks = {}
+            for name in per_node[-1]:
+                values = [sample.get(name) for sample in per_node]
+                if None in values:
+                    continue
+                if all(b > a for a, b in zip(values, values[1:])):
+                    leaks[name] = {'first': round(values[0], 3),
+                                   'last': round(values[-1], 3)}
+            for name in leaks.keys() - cls.leaks.keys():
+                cls._logger.warning(
+                    'Soak: %s per node grew over the last %d samples: '
+                    '%s -> %s', name, len(per_node), leaks[name]['first'],
+                    leaks[name]['last'])
+            cls.leaks = leaks
+
+    @classmethod
+    def report(cls):
+        with cls._lock:
+            return {
+                'gauges': cls.gauges(),
+                'agent_pool': AgentPool.status(),
+                'command_params': ParamInterner.status(),
+                'tracemalloc': tracemalloc.is_tracing(),
+                'soak': {
+                    'interval': cls.soak_interval,
+                    'samples': list(cls.history),
+                    'growing_per_node': cls.leaks,
+                },
+            }
+
+    @classmethod
+    def snapshot(cls, limit=20):
+        """Take a tracemalloc snapshot and diff it with the previous one.
+
+        Tracing is started on the first call if it is not running yet.
+
+        :param limit: number of allocation sites returned.
+        :returns: the top allocation sites, by size difference with the
+                  previous snapshot if any.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(cls.frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+        with cls._lock:
+            previous, cls._snapshot = cls._snapshot, snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        result = {'traced': current, 'peak': peak,
+                  'compared_to_previous': previous is not None}
+        if previous is None:
+            result['top'] = [{'where': str(stat.traceback),
+                              'size': stat.size, 'count': stat.count}
+                             for stat in snapshot.statistics('lineno')[:limit]]
+        else:
+            result['top'] = [{'where': str(stat.traceback),
+                              'size': stat.size, 'size_diff': stat.size_diff,
+                              'count': stat.count,
+                              'count_diff': stat.count_diff}
+                             for stat in snapshot.compare_to(
+                                 previous, 'lineno')[:limit]]
+        return result
+
+    @classmethod
+    def stop_tracing(cls):
+        """Stop tracemalloc and forget the previous snapshot.
+
+        :returns: True if tracing was running.
+        """
+        with cls._lock:
+            cls._snapshot = None
+        tracing = tracemalloc.is_tracing()
+        tracemalloc.stop()
+        return tracing
@@ -0,0 +1,33 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+def percentile(values, percent):
+    """Nearest rank percentile of sorted values, None if there is none."""
+    if not values:
+        return None
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+
+def percentiles(values, digits=3):
+    """The p50, p90, p99 and max of values, empty if there is none."""
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        'p50': round(percentile(values, 50), digits),
+        'p90': round(percentile(values, 90), digits),
+        'p99': round(percentile(values, 99), digits),
+        'max': round(values[-1], digits),
+    }
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import functools
+import os
+import re
+import sys
+import threading
+import time
+
+
+def thread_group(name):
+    """Name of a thread without its number, e.g. `Thread (heartbeat)`."""
+    return re.sub(r'-\d+', '', name)
+
+
+class HotPathTimers:
+    """Always-on cumulative timers of the hot paths.
+
+    Wall and CPU time are accumulated per timer and per thread group, a
+    wall time much larger than the CPU time means the thread waited on the
+    network, a lock or the GIL.
+    """
+
+    # (timer, thread group) -> [calls, wall seconds, cpu seconds, max wall]
+    timers = collections.defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    _lock = threading.Lock()
+
+    @classmethod
+    def timed(cls, name):
+        """Decorator accumulating the time spent in a function."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                wall = time.perf_counter()
+                cpu = time.thread_time()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    cpu = time.thread_time() - cpu
+                    wall = time.perf_counter() - wall
+                    group = thread_group(threading.current_thread().name)
+                    with cls._lock:
+                        timer = cls.timers[(name, group)]
+                        timer[0] += 1
+                        timer[1] += wall
+                        timer[2] += cpu
+                        timer[3] = max(timer[3], wall)
+            return wrapper
+        return decorator
+
+    @classmethod
+    def report(cls):
+        with cls._lock:
+            timers = dict(cls.timers)
+        report = {}
+        for (name, group), (calls, wall, cpu, max_wall) in sorted(
+                timers.items()):
+            report.setdefault(name, {})[group] = {
+                'calls': calls,
+                'wall_seconds': round(wall, 6),
+                'cpu_seconds': round(cpu, 6),
+                'mean_ms': round(wall / calls * 1000, 3),
+                'max_ms': round(max_wall * 1000, 3),
+            }
+        return report
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of all the threads.
+
+    The output is in the collapsed stack format, one line per distinct
+    stack, which flamegraph.pl and speedscope read directly.
+    """
+
+    enabled = False
+    interval = 0.01
+    max_seconds = 120
+    _running = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._logger = logger
+        cls.enabled = settings.profiling
+        cls.interval = settings.profiling_interval
+        cls.max_seconds = settings.profiling_max_seconds
+        return cls
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return '%s (%s:%d)' % (code.co_name,
+                               os.path.basename(code.co_filename),
+                               code.co_firstlineno)
+
+    @classmethod
+    def profile(cls, seconds):
+        """Sample the stacks of all the threads for some seconds.
+
+        :returns: the collapsed stacks as a string, or None if a profile is
+                  already running.
+        """
+        if not cls._running.acquire(blocking=False):
+            return None
+        try:
+            own = threading.get_ident()
+            stacks = collections.Counter()
+            samples = 0
+            names = {}
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: thread_group(t.name)
+                         for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(cls._frame_name(frame))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, 'unknown'))
+                    stacks[';'.join(reversed(stack))] += 1
+                samples += 1
+                time.sleep(cls.interval)
+        finally:
+            cls._running.release()
+        cls._logger.info('Profiled %d threads for %ss, %d samples',
+                         len(names), seconds, samples)
+        return ''.join('%s %d\n' % item for item in stacks.most_common())
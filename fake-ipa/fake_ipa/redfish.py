@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import requests
+import tenacity
+
+from fake_ipa.capture import TrafficCapture
+from fake_ipa import metrics
+
+_RETRY_WAIT = 2
+_RETRY_ATTEMPTS = 5
+
+
+class RedfishError(Exception):
+    """Error raised when the Redfish emulator rejects a power action."""
+
+
+class RedfishClient:
+    """Shared client sending power actions to the Redfish emulator.
+
+    Actions are sent by a bounded pool of workers over a single pooled
+    session, so callers never block on the emulator. When a coalescing
+    window is configured, actions requested for the same system within the
+    window are merged and only the latest one is sent.
+    """
+
+    reset_path = '/redfish/v1/Systems/{uuid}/Actions/ComputerSystem.Reset'
+    # Latencies of the last power actions, reported by /debug/redfish
+    latencies = collections.deque(maxlen=1000)
+    _latencies_lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._config = config
+        cls._logger = logger
+        cls.url = settings.redfish_url
+        workers = settings.redfish_workers
+        cls.coalesce_window = settings.redfish_coalesce_window
+        cls.session = requests.Session()
+        cls.session.auth = requests.auth.HTTPBasicAuth(
+            settings.redfish_user, settings.redfish_password)
+        cls.session.verify = False
+        cls.session.headers['Content-type'] = 'application/json'
+        TrafficCapture.attach(cls.session, 'redfish')
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=workers)
+        if cls.url:
+            cls.session.mount(cls.url, adapter)
+        else:
+            logger.warning('FAKE_IPA_REDFISH_URL is not set, systems will '
+                           'not be powered off')
+        cls.pool = ThreadPoolExecutor(max_workers=workers,
+                                      thread_name_prefix='redfish')
+        cls._pending = {}
+        cls._pending_lock = threading.Lock()
+        cls._flush_timer = None
+        return cls
+
+    @classmethod
+    def warm_up(cls):
+        """Open a pooled connection to the Redfish emulator ahead of time."""
+        if not cls.url:
+            return
+        try:
+            cls.session.get(cls.url + '/redfish/v1/', timeout=5)
+        except requests.exceptions.RequestException as exc:
+            cls._logger.warning('Redfish emulator %s is not reachable yet: '
+                                '%s', cls.url, exc)
+
+    @classmethod
+    def reset(cls, uuid, reset_type):
+        """Queue a ComputerSystem.Reset action for a system."""
+        if not cls.url:
+            return
+        requested = time.monotonic()
+        if not cls.coalesce_window:
+            cls.pool.submit(cls._send_reset, uuid, reset_type, requested)
+            return
+
+        with cls._pending_lock:
+            if uuid in cls._pending:
+                cls._logger.debug('Coalescing %s with pending %s for %s',
+                                  reset_type, cls._pending[uuid][0], uuid)
+                requested = cls._pending[uuid][1]
+            cls._pending[uuid] = (reset_type, requested)
+            if cls._flush_timer is None:
+                cls._flush_timer = threading.Timer(cls.coalesce_window,
+                                                   cls._flush)
+                cls._flush_timer.daemon = True
+                cls._flush_timer.start()
+
+    @classmethod
+    def _flush(cls):
+        with cls._pending_lock:
+            pending, cls._pending = cls._pending, {}
+            cls._flush_timer = None
+        cls._logger.debug('Sending %d coalesced power actions', len(pending))
+        for uuid, (reset_type, requested) in pending.items():
+            cls.pool.submit(cls._send_reset, uuid, reset_type, requested)
+
+    @classmethod
+    @tenacity.retry(
+        retry=tenacity.retry_if_exception_type(
+            (requests.exceptions.ConnectionError, RedfishError)),
+        stop=tenacity.stop_after_attempt(_RETRY_ATTEMPTS),
+        wait=tenacity.wait_fixed(_RETRY_WAIT),
+        reraise=True)
+    def _post_reset(cls, uuid, reset_type):
+        resp = cls.session.post(
+            cls.url + cls.reset_path.format(uuid=uuid),
+            json={'Action': 'Reset', 'ResetType': reset_type})
+        if resp.status_code >= 500:
+            raise RedfishError('Error %d from Redfish emulator: %s'
+                               % (resp.status_code, resp.text))
+        return resp
+
+    @classmethod
+    def _send_reset(cls, uuid, reset_type, requested):
+        try:
+            resp = cls._post_reset(uuid, reset_type)
+        except Exception:
+            cls._logger.exception('Failed to send %s to system %s',
+                                  reset_type, uuid)
+            return
+        latency = time.monotonic() - requested
+        with cls._latencies_lock:
+            cls.latencies.append(latency)
+        if resp.status_code >= 400:
+            cls._logger.error('Redfish %s for system %s failed with %d: %s',
+                              reset_type, uuid, resp.status_code, resp.text)
+        else:
+            cls._logger.info('Redfish %s for system %s done in %.3fs',
+                             reset_type, uuid, latency)
+
+    @classmethod
+    def report(cls):
+        """Latency percentiles of the last power actions, in seconds."""
+        with cls._latencies_lock:
+            latencies = list(cls.latencies)
+        return dict(metrics.percentiles(latencies), count=len(latencies))
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from fake_ipa.fake_agent import AgentPool
+
+
+class BulkRegistrar:
+    """Register agents of already enrolled nodes directly for heartbeating.
+
+    Registered agents skip the boot delay and inspection: they are looked
+    up and added to the heartbeater queue. Lookups are sent in batches of
+    at most FAKE_IPA_REGISTRATION_RATE per second.
+    """
+
+    pending = collections.deque()
+    registered = 0
+    failed = 0
+
+    @classmethod
+    def initialize(cls, config, logger, api):
+        cls._config = config
+        cls._logger = logger
+        cls.api = api
+        cls.rate = api.settings.registration_rate
+        cls.lookup_timeout = api.settings.registration_lookup_timeout
+        cls.pool = ThreadPoolExecutor(
+            max_workers=api.settings.registration_workers,
+            thread_name_prefix='registration')
+        cls._wakeup = threading.Event()
+        cls._lock = threading.Lock()
+        threading.Thread(target=cls._run, daemon=True).start()
+        return cls
+
+    @classmethod
+    def register(cls, nodes):
+        """Queue nodes for registration.
+
+        :param nodes: list of node UUIDs or of system dicts with at least
+                      a `uuid` and optionally `name`, `nics` and
+                      `node_uuid` (the Ironic node UUID, when it differs).
+        :returns: the number of queued nodes.
+        """
+        systems = []
+        for node in nodes:
+            if isinstance(node, str):
+                node = {'uuid': node, 'node_uuid': node}
+            if not isinstance(node, dict) or not node.get('uuid'):
+                raise ValueError('Invalid node %s, expected a UUID or a '
+                                 'system with a uuid' % node)
+            node.setdefault('name', node['uuid'])
+            node.setdefault('nics', [])
+            systems.append(node)
+        cls.pending.extend(systems)
+        cls._wakeup.set()
+        return len(systems)
+
+    @classmethod
+    def status(cls):
+        return {'pending': len(cls.pending),
+                'registered': cls.registered,
+                'failed': cls.failed}
+
+    @classmethod
+    def _run(cls):
+        while True:
+            if not cls.pending:
+                cls._wakeup.wait()
+                cls._wakeup.clear()
+                continue
+            started = time.monotonic()
+            for _ in range(min(cls.rate, len(cls.pending))):
+                cls.pool.submit(cls._register_one, cls.pending.popleft())
+            time.sleep(max(0, 1 - (time.monotonic() - started)))
+
+    @classmethod
+    def _register_one(cls, system):
+        with cls.api.booted_lock:
+            running = system['uuid'] in cls.api.booted_q
+            # Claimed now so a power on meanwhile does not boot another agent
+            cls.api.booted_q.add(system['uuid'])
+        if running:
+            cls._logger.info('Agent of %s is already running',
+                             system['name'])
+            return
+        try:
+            agent = AgentPool.acquire(system, cls.api.settings.api_url,
+                                      lookup_timeout=cls.lookup_timeout)
+            agent.register(node_uuid=system.get('node_uuid'))
+        except Exception as exc:
+            cls._logger.error('Failed to register agent of %s: %s',
+                              system['name'], exc)
+            with cls.api.booted_lock:
+                cls.api.booted_q.discard(system['uuid'])
+            with cls._lock:
+                cls.failed += 1
+            return
+        with cls._lock:
+            cls.registered += 1
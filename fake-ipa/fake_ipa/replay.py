@@ -0,0 +1,363 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Replay of a FakeIPA traffic capture.
+
+`fake-ipa-replay run` re-sends the power notifications and command API
+calls of a capture made with FAKE_IPA_CAPTURE_FILE, at the captured pace
+or faster, and reports the latency per route and the throughput next to
+the captured ones. Like in the capture, the latency is the handling time
+of FakeIPA, read from its Server-Timing header, the round-trip time is
+reported apart. Unless disabled, it serves a passive Ironic stand-in
+answering the lookups, heartbeats, inspections and Redfish resets of
+FakeIPA for the captured systems, the commands only come from the
+capture. `fake-ipa-replay compare` compares two reports and exits with an
+error when the replay got slower than the threshold.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import platform
+import re
+import sys
+import threading
+import time
+import urllib.parse
+
+import requests
+from werkzeug.serving import make_server
+
+from fake_ipa import fake_ironic
+from fake_ipa import metrics
+
+LOG = logging.getLogger(__name__)
+_SERVER_TIMING_RE = re.compile(r'(?:^|,)\s*app;dur=([0-9.]+)')
+
+
+def load(path):
+    """Read the records of a capture file.
+
+    :raises: ValueError if a line is not a JSON record.
+    """
+    records = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError('%s:%d is not a capture record'
+                                 % (path, number))
+            if record.get('type') in ('in', 'out'):
+                records.append(record)
+    return records
+
+
+def summarize(samples):
+    """Latency in milliseconds and errors per route.
+
+    :param samples: iterable of (route, status, latency in seconds), a
+                    None status is a request which got no response, a None
+                    latency is not counted in the percentiles.
+    """
+    routes = {}
+    for route, status, latency in samples:
+        routes.setdefault(route, []).append((status, latency))
+    return {
+        route: dict(metrics.percentiles([latency * 1000
+                                         for _, latency in values
+                                         if latency is not None]),
+                    count=len(values),
+                    errors=sum(1 for status, _ in values
+                               if status is None or status >= 400))
+        for route, values in sorted(routes.items())
+    }
+
+
+def captured_report(records):
+    inbound = [record for record in records if record['type'] == 'in']
+    outbound = {}
+    for record in records:
+        if record['type'] == 'out':
+            outbound.setdefault(record['target'], []).append(record)
+    duration = (max(r['t'] for r in inbound) - min(r['t'] for r in inbound)
+                if inbound else 0)
+    return {
+        'requests': len(inbound),
+        'duration': round(duration, 3),
+        'throughput': round(len(inbound) / duration, 2) if duration else None,
+        'routes': summarize(('%s %s' % (r['method'], r['route']),
+                             r['status'], r['latency']) for r in inbound),
+        'outbound': {
+            target: summarize(('%s %s' % (r['method'], r['route']),
+                               r['status'], r['latency']) for r in values)
+            for target, values in sorted(outbound.items())
+        },
+    }
+
+
+def server_latency(response):
+    """Handling time of a FakeIPA response in seconds, None if unknown."""
+    match = _SERVER_TIMING_RE.search(
+        response.headers.get('Server-Timing', ''))
+    return float(match.group(1)) / 1000 if match else None
+
+
+def _node_of(record):
+    if record['route'] == '/':
+        return (record.get('body') or {}).get('uuid')
+    return record['path'].strip('/').split('/')[0]
+
+
+class Replayer:
+    """Re-send the inbound requests of a capture to FakeIPA.
+
+    The requests of a node are sent in their captured order, the IDs of
+    the captured commands are mapped to the IDs of the replayed ones.
+    The latency samples are the handling times reported by FakeIPA,
+    comparable with the captured ones, the round trips are kept apart.
+    """
+
+    def __init__(self, fake_ipa_url, speed=1.0, workers=32):
+        self.fake_ipa_url = fake_ipa_url.rstrip('/')
+        self.speed = speed
+        self.workers = workers
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.verify = False
+        # captured command ID -> replayed command ID
+        self.ids = {}
+        self.samples = []
+        self.round_trips = []
+        self.lags = []
+        self._lock = threading.Lock()
+
+    def _map_ids(self, record):
+        path = record['path']
+        if record['route'] == '/<uuid>/v1/commands/<cmd>':
+            head, cmd = path.rsplit('/', 1)
+            path = '%s/%s' % (head, self.ids.get(cmd, cmd))
+        query = [(key, self.ids.get(value, value) if key == 'since'
+                  else value)
+                 for key, value in urllib.parse.parse_qsl(
+                     record.get('query', ''), keep_blank_values=True)]
+        return path, query
+
+    def _send(self, record, due, previous):
+        if previous is not None:
+            # Wait for the previous request of the same node
+            previous.exception()
+        lag = max(0, time.monotonic() - due)
+        path, query = self._map_ids(record)
+        started = time.monotonic()
+        try:
+            resp = self.session.request(record['method'],
+                                        self.fake_ipa_url + path,
+                                        params=query, json=record.get('body'))
+            status, latency = resp.status_code, server_latency(resp)
+        except requests.exceptions.RequestException as exc:
+            LOG.warning('%s %s failed: %s', record['method'], path, exc)
+            resp, status, latency = None, None, None
+        round_trip = time.monotonic() - started
+        route = '%s %s' % (record['method'], record['route'])
+        if record.get('result_id') and resp is not None and resp.ok:
+            with self._lock:
+                self.ids[record['result_id']] = resp.json().get('id')
+        with self._lock:
+            self.samples.append((route, status, latency))
+            self.round_trips.append((route, status, round_trip))
+            self.lags.append(lag)
+
+    def run(self, records):
+        inbound = sorted((record for record in records
+                          if record['type'] == 'in'),
+                         key=lambda record: record['t'])
+        if not inbound:
+            raise ValueError('The capture has no inbound request')
+        first = inbound[0]['t']
+        last_of_node = {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='replay') as pool:
+            for record in inbound:
+                due = started + (record['t'] - first) / self.speed
+                time.sleep(max(0, due - time.monotonic()))
+                node = _node_of(record)
+                # Futures run in submission order, the previous request of
+                # the node is already running or done when this one starts
+                last_of_node[node] = pool.submit(
+                    self._send, record, due, last_of_node.get(node))
+        duration = time.monotonic() - started
+        return {
+            'requests': len(self.samples),
+            'errors': sum(1 for _, status, _ in self.samples
+                          if status is None or status >= 400),
+            'duration': round(duration, 3),
+            'throughput': round(len(self.samples) / duration, 2),
+            'lag': metrics.percentiles([lag * 1000
+                                        for lag in self.lags]),
+            'routes': summarize(self.samples),
+            'round_trip': summarize(self.round_trips),
+        }
+
+
+def stand_in(records, args):
+    """Serve a passive Ironic stand-in knowing the captured systems."""
+    conductor = fake_ironic.Conductor(None, args.workers,
+                                      args.heartbeat_timeout, drive=False)
+    for record in records:
+        if record['type'] == 'in' and record['route'] == '/':
+            system = dict(record.get('body') or {})
+            system.pop('pending_power', None)
+            if system.get('uuid') and system['uuid'] not in conductor.nodes:
+                conductor.enroll(system)
+    for record in records:
+        if record['type'] == 'in' and record['method'] == 'POST':
+            token = dict(urllib.parse.parse_qsl(
+                record.get('query', ''))).get('agent_token')
+            node = conductor.nodes.get(_node_of(record))
+            if token and node is not None:
+                # Agents get the captured token, the commands carry it
+                node.agent_token = token
+    server = make_server(args.listen_ip, args.listen_port,
+                         fake_ironic.create_app(conductor), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    LOG.info('Ironic stand-in serving %d systems on %s:%d',
+             len(conductor.nodes), args.listen_ip, args.listen_port)
+    return server
+
+
+def run(args):
+    records = load(args.capture)
+    server = None if args.no_stand_in else stand_in(records, args)
+    try:
+        replay = Replayer(args.fake_ipa_url, args.speed,
+                          args.workers).run(records)
+    finally:
+        if server is not None:
+            server.shutdown()
+    report = {
+        'meta': {
+            'capture': args.capture,
+            'speed': args.speed,
+            'python': platform.python_version(),
+            'timestamp': int(time.time()),
+        },
+        'replay': replay,
+        'captured': captured_report(records),
+    }
+    data = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        print(data)
+    return 0
+
+
+def compare(args):
+    with open(args.old) as f:
+        old_report = json.load(f)
+    with open(args.new) as f:
+        new_report = json.load(f)
+    if old_report['meta']['speed'] != new_report['meta']['speed']:
+        LOG.warning('The replays ran at different speeds, %sx and %sx',
+                    old_report['meta']['speed'], new_report['meta']['speed'])
+    old = old_report['replay']
+    new = new_report['replay']
+
+    regressions = 0
+    print('%-50s %12s %12s %8s' % ('route (p90 ms)', 'old', 'new', 'ratio'))
+    for route in sorted(set(old['routes']) | set(new['routes'])):
+        if route not in old['routes'] or route not in new['routes']:
+            print('%-50s %s' % (route, 'only in %s' % (
+                args.old if route in old['routes'] else args.new)))
+            continue
+        before = old['routes'][route].get('p90')
+        after = new['routes'][route].get('p90')
+        if before is None or after is None:
+            # Only failed requests, or a FakeIPA without Server-Timing
+            print('%-50s %s' % (route, 'no latency'))
+            continue
+        ratio = after / before if before else 1.0
+        if ratio > 1 + args.threshold:
+            verdict = 'slower'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            verdict = 'faster'
+        else:
+            verdict = ''
+        print('%-50s %12.3f %12.3f %7.2fx %s' % (route, before, after,
+                                                  ratio, verdict))
+    ratio = new['throughput'] / old['throughput']
+    if ratio < 1 - args.threshold:
+        regressions += 1
+    print('%-50s %12.2f %12.2f %7.2fx' % ('throughput (requests/s)',
+                                          old['throughput'],
+                                          new['throughput'], ratio))
+    print('%-50s %12d %12d' % ('errors', old['errors'], new['errors']))
+    return 1 if regressions else 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser('fake-ipa-replay')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Replay a capture.')
+    run_parser.add_argument('capture', help='Capture file.')
+    run_parser.add_argument('--fake-ipa-url', default='http://localhost:9999')
+    run_parser.add_argument('--speed', type=float, default=1.0,
+                            help='Replay speed, 10 replays ten times '
+                                 'faster than captured.')
+    run_parser.add_argument('--workers', type=int, default=32,
+                            help='Concurrent requests.')
+    run_parser.add_argument('--output', '-o',
+                            help='Report file, stdout if not set.')
+    run_parser.add_argument('--no-stand-in', action='store_true',
+                            help='Do not serve the Ironic stand-in.')
+    run_parser.add_argument('--listen-ip', default='0.0.0.0',
+                            help='Address of the Ironic stand-in.')
+    run_parser.add_argument('--listen-port', type=int, default=6385)
+    run_parser.add_argument('--heartbeat-timeout', type=int,
+                            default=fake_ironic.HEARTBEAT_TIMEOUT)
+    run_parser.set_defaults(func=run)
+    compare_parser = subparsers.add_parser(
+        'compare', help='Compare two replay reports.')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Relative slowdown reported as a '
+                                     'regression.')
+    compare_parser.set_defaults(func=compare)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    if args.command == 'run' and args.speed <= 0:
+        LOG.error('The replay speed must be positive')
+        return 2
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        LOG.error('%s', e)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
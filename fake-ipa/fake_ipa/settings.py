@@ -0,0 +1,321 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import dataclasses
+import typing
+
+DEFAULT_PORT = 9999
+MAX_HEARTBEATER_THREADS = 256
+MAX_STRESS_THREADS = 256
+_MB = 1024 * 1024
+
+
+def get_ssl_client_options(conf):
+
+    if conf.get('FAKE_IPA_INSECURE'):
+        verify = False
+    else:
+        verify = conf.get("FAKE_IPA_CAFILE") or True
+    if conf.get("FAKE_IPA_CERTFILE") and conf.get("FAKE_IPA_KEYFILE"):
+        cert = (conf.get("FAKE_IPA_CERTFILE"), conf.get("FAKE_IPA_KEYFILE"))
+    else:
+        cert = None
+
+    return verify, cert
+
+
+def _int(config, key, default, minimum=0, maximum=None):
+    value = config.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError('%s must be an integer, got %r' % (key, value))
+    if value < minimum:
+        raise ValueError('%s must be at least %d, got %d'
+                         % (key, minimum, value))
+    if maximum is not None and value > maximum:
+        raise ValueError('%s must be at most %d, got %d'
+                         % (key, maximum, value))
+    return value
+
+
+def _number(config, key, default, minimum=0, positive=False):
+    value = config.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError('%s must be a number, got %r' % (key, value))
+    if positive and value <= 0:
+        raise ValueError('%s must be positive, got %r' % (key, value))
+    if value < minimum:
+        raise ValueError('%s must be at least %s, got %r'
+                         % (key, minimum, value))
+    return value
+
+
+def _bool(config, key, default):
+    value = config.get(key, default)
+    if not isinstance(value, bool):
+        raise ValueError('%s must be True or False, got %r' % (key, value))
+    return value
+
+
+def _file_mix(config, key):
+    value = config.get(key)
+    if value is None:
+        return None
+    if (not isinstance(value, dict) or not value
+            or not all(isinstance(name, str) for name in value)
+            or not all(isinstance(size, (int, float))
+                       and not isinstance(size, bool) and size > 0
+                       for size in value.values())):
+        raise ValueError('%s must be a dict of file names to positive '
+                         'relative sizes, got %r' % (key, value))
+    return value
+
+
+def _url(config, key, default=None):
+    value = config.get(key, default)
+    if not value:
+        return None
+    if not isinstance(value, str) or not value.startswith(('http://',
+                                                           'https://')):
+        raise ValueError('%s must be an http(s) URL, got %r' % (key, value))
+    return value.rstrip('/')
+
+
+class SharedSettings:
+    """Class attribute giving every component the same Settings.
+
+    Settings are frozen and runtime tuning replaces them: the components
+    reading them through this descriptor all see the replacement at once,
+    instead of each keeping its own copy.
+    """
+
+    _current = None
+
+    def __get__(self, obj, objtype=None):
+        return SharedSettings._current
+
+    def __set__(self, obj, value):
+        SharedSettings._current = value
+
+    @classmethod
+    def set(cls, settings):
+        """Share new settings, from a class attribute assignment too."""
+        cls._current = settings
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Settings:
+    """FakeIPA settings, parsed and validated once at startup.
+
+    Hot paths read these attributes instead of looking up the Flask config
+    by key. New tuning knobs go here, with their validation in
+    from_config().
+    """
+
+    advertise_ip: str
+    advertise_port: int = DEFAULT_PORT
+    listen_ip: str = '0.0.0.0'
+    listen_port: int = DEFAULT_PORT
+    api_url: typing.Optional[str] = 'http://localhost:6385'
+    inspection_callback_url: typing.Optional[str] = (
+        'http://localhost:5050/v1/continue')
+    min_boot_time: int = 180
+    max_boot_time: int = 240
+    heartbeater_threads: int = 2
+    # seconds a ?wait=true command request blocks at most
+    command_wait_timeout: int = 300
+    certfile: typing.Optional[str] = None
+    keyfile: typing.Optional[str] = None
+    # verify and cert arguments of the requests to Ironic and the inspector
+    verify: typing.Union[bool, str] = True
+    cert: typing.Optional[typing.Tuple[str, str]] = None
+    redfish_url: typing.Optional[str] = None
+    redfish_user: str = 'admin'
+    redfish_password: str = dataclasses.field(default='password',
+                                              repr=False)
+    admin_token: typing.Optional[str] = dataclasses.field(default=None,
+                                                          repr=False)
+    inspection_workers: int = 10
+    inspection_connect_timeout: float = 10
+    inspection_read_timeout: float = 60
+    redfish_workers: int = 10
+    redfish_coalesce_window: float = 0
+    registration_rate: int = 100
+    registration_workers: int = 20
+    registration_lookup_timeout: int = 30
+    heartbeat_stress_threads: int = 16
+    image_download: bool = False
+    image_download_workers: int = 10
+    image_download_chunk_size: int = _MB
+    image_download_per_node: int = 1
+    image_download_connect_timeout: float = 10
+    image_download_read_timeout: float = 60
+    image_size_mb: float = 2048
+    image_node_bandwidth_mbit: float = 1000
+    image_total_bandwidth_mbit: float = 10000
+    dedup_command_params: bool = True
+    dedup_cache_size: int = 10000
+    system_logs_size_mb: float = 0
+    system_logs_file_mix: typing.Optional[dict] = None
+    system_logs_cache_dir: typing.Optional[str] = None
+    capture_file: typing.Optional[str] = None
+    tuning_audit_size: int = 1000
+    compression: bool = True
+    compression_min_size: int = 65536
+    compression_level: int = 1
+    compression_cache_size: int = 128
+    tracemalloc: bool = False
+    tracemalloc_frames: int = 1
+    soak_interval: float = 0
+    soak_window: int = 6
+    profiling: bool = False
+    profiling_interval: float = 0.01
+    profiling_max_seconds: float = 120
+    tracing: bool = True
+    trace_buffer_size: int = 100000
+
+    @property
+    def advertise_protocol(self):
+        return 'https' if self.certfile else 'http'
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the settings from the Flask config.
+
+        :raises: ValueError if a setting is missing or invalid.
+        """
+        advertise_ip = config.get('FAKE_IPA_ADVERTISE_ADDRESS_IP')
+        if not advertise_ip:
+            raise ValueError('Please set FAKE_IPA_ADVERTISE_ADDRESS_IP in '
+                             'config file')
+        min_boot_time = _int(config, 'FAKE_IPA_MIN_BOOT_TIME', 180)
+        max_boot_time = _int(config, 'FAKE_IPA_MAX_BOOT_TIME', 240)
+        if min_boot_time > max_boot_time:
+            raise ValueError('FAKE_IPA_MIN_BOOT_TIME is greater than '
+                             'FAKE_IPA_MAX_BOOT_TIME')
+        certfile = config.get('FAKE_IPA_CERTFILE')
+        keyfile = config.get('FAKE_IPA_KEYFILE')
+        if bool(certfile) != bool(keyfile):
+            raise ValueError('FAKE_IPA_CERTFILE and FAKE_IPA_KEYFILE must be '
+                             'set together')
+        verify, cert = get_ssl_client_options(config)
+        return cls(
+            advertise_ip=advertise_ip,
+            # An unset port in the config file is falsy, not missing
+            advertise_port=_int(
+                config, 'FAKE_IPA_ADVERTISE_ADDRESS_PORT', DEFAULT_PORT,
+                minimum=1, maximum=65535)
+            if config.get('FAKE_IPA_ADVERTISE_ADDRESS_PORT')
+            else DEFAULT_PORT,
+            listen_ip=config.get('SUSHY_FAKE_IPA_LISTEN_IP', '0.0.0.0'),
+            listen_port=_int(config, 'SUSHY_FAKE_IPA_LISTEN_PORT',
+                             DEFAULT_PORT, minimum=1, maximum=65535),
+            api_url=_url(config, 'FAKE_IPA_API_URL',
+                         'http://localhost:6385'),
+            inspection_callback_url=_url(
+                config, 'FAKE_IPA_INSPECTION_CALLBACK_URL',
+                'http://localhost:5050/v1/continue'),
+            min_boot_time=min_boot_time,
+            max_boot_time=max_boot_time,
+            heartbeater_threads=_int(config, 'FAKE_IPA_HEARTBEATER_THREADS',
+                                     2, minimum=1,
+                                     maximum=MAX_HEARTBEATER_THREADS),
+            command_wait_timeout=_int(config, 'FAKE_IPA_COMMAND_WAIT_TIMEOUT',
+                                      300, minimum=1),
+            certfile=certfile or None,
+            keyfile=keyfile or None,
+            verify=verify,
+            cert=cert,
+            redfish_url=_url(config, 'FAKE_IPA_REDFISH_URL'),
+            redfish_user=config.get('FAKE_IPA_REDFISH_USER', 'admin'),
+            redfish_password=config.get('FAKE_IPA_REDFISH_PASSWORD',
+                                        'password'),
+            admin_token=config.get('FAKE_IPA_ADMIN_TOKEN') or None,
+            inspection_workers=_int(config, 'FAKE_IPA_INSPECTION_WORKERS',
+                                    10, minimum=1),
+            inspection_connect_timeout=_number(
+                config, 'FAKE_IPA_INSPECTION_CONNECT_TIMEOUT', 10,
+                positive=True),
+            inspection_read_timeout=_number(
+                config, 'FAKE_IPA_INSPECTION_READ_TIMEOUT', 60,
+                positive=True),
+            redfish_workers=_int(config, 'FAKE_IPA_REDFISH_WORKERS', 10,
+                                 minimum=1),
+            redfish_coalesce_window=_number(
+                config, 'FAKE_IPA_REDFISH_COALESCE_WINDOW', 0),
+            registration_rate=_int(config, 'FAKE_IPA_REGISTRATION_RATE',
+                                   100, minimum=1),
+            registration_workers=_int(config,
+                                      'FAKE_IPA_REGISTRATION_WORKERS', 20,
+                                      minimum=1),
+            registration_lookup_timeout=_int(
+                config, 'FAKE_IPA_REGISTRATION_LOOKUP_TIMEOUT', 30,
+                minimum=1),
+            heartbeat_stress_threads=_int(
+                config, 'FAKE_IPA_HEARTBEAT_STRESS_THREADS', 16,
+                maximum=MAX_STRESS_THREADS),
+            image_download=_bool(config, 'FAKE_IPA_IMAGE_DOWNLOAD', False),
+            image_download_workers=_int(
+                config, 'FAKE_IPA_IMAGE_DOWNLOAD_WORKERS', 10, minimum=1),
+            image_download_chunk_size=_int(
+                config, 'FAKE_IPA_IMAGE_DOWNLOAD_CHUNK_SIZE', _MB,
+                minimum=1),
+            image_download_per_node=_int(
+                config, 'FAKE_IPA_IMAGE_DOWNLOAD_PER_NODE', 1, minimum=1),
+            image_download_connect_timeout=_number(
+                config, 'FAKE_IPA_IMAGE_DOWNLOAD_CONNECT_TIMEOUT', 10,
+                positive=True),
+            image_download_read_timeout=_number(
+                config, 'FAKE_IPA_IMAGE_DOWNLOAD_READ_TIMEOUT', 60,
+                positive=True),
+            image_size_mb=_number(config, 'FAKE_IPA_IMAGE_SIZE_MB', 2048),
+            image_node_bandwidth_mbit=_number(
+                config, 'FAKE_IPA_IMAGE_NODE_BANDWIDTH_MBIT', 1000,
+                positive=True),
+            image_total_bandwidth_mbit=_number(
+                config, 'FAKE_IPA_IMAGE_TOTAL_BANDWIDTH_MBIT', 10000),
+            dedup_command_params=_bool(
+                config, 'FAKE_IPA_DEDUP_COMMAND_PARAMS', True),
+            dedup_cache_size=_int(config, 'FAKE_IPA_DEDUP_CACHE_SIZE',
+                                  10000),
+            system_logs_size_mb=_number(
+                config, 'FAKE_IPA_SYSTEM_LOGS_SIZE_MB', 0),
+            system_logs_file_mix=_file_mix(
+                config, 'FAKE_IPA_SYSTEM_LOGS_FILE_MIX'),
+            system_logs_cache_dir=config.get(
+                'FAKE_IPA_SYSTEM_LOGS_CACHE_DIR') or None,
+            capture_file=config.get('FAKE_IPA_CAPTURE_FILE') or None,
+            tuning_audit_size=_int(config, 'FAKE_IPA_TUNING_AUDIT_SIZE',
+                                   1000, minimum=1),
+            compression=_bool(config, 'FAKE_IPA_COMPRESSION', True),
+            compression_min_size=_int(
+                config, 'FAKE_IPA_COMPRESSION_MIN_SIZE', 65536),
+            compression_level=_int(config, 'FAKE_IPA_COMPRESSION_LEVEL', 1,
+                                   minimum=1, maximum=9),
+            compression_cache_size=_int(
+                config, 'FAKE_IPA_COMPRESSION_CACHE_SIZE', 128),
+            tracemalloc=_bool(config, 'FAKE_IPA_TRACEMALLOC', False),
+            tracemalloc_frames=_int(config, 'FAKE_IPA_TRACEMALLOC_FRAMES',
+                                    1, minimum=1),
+            soak_interval=_number(config, 'FAKE_IPA_SOAK_INTERVAL', 0),
+            soak_window=_int(config, 'FAKE_IPA_SOAK_WINDOW', 6, minimum=2),
+            profiling=_bool(config, 'FAKE_IPA_PROFILING', False),
+            profiling_interval=_number(
+                config, 'FAKE_IPA_PROFILING_INTERVAL', 0.01, positive=True),
+            profiling_max_seconds=_number(
+                config, 'FAKE_IPA_PROFILING_MAX_SECONDS', 120,
+                positive=True),
+            tracing=_bool(config, 'FAKE_IPA_TRACING', True),
+            trace_buffer_size=_int(config, 'FAKE_IPA_TRACE_BUFFER_SIZE',
+                                   100000, minimum=1),
+        )
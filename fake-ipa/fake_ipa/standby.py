@@ -15,14 +15,60 @@
 
 import logging
 
-import requests
-
 from fake_ipa import base
+from fake_ipa import error
+from fake_ipa.redfish import RedfishClient
+from fake_ipa.transfer import ImageTransfers
 
 LOG = logging.getLogger(__name__)
 
 
+def _validate_image_info(ext, image_info=None, **kwargs):
+    """Validate the image_info of the image commands."""
+    if not isinstance(image_info, dict) or not image_info.get('id'):
+        raise error.InvalidCommandParamsError(
+            'image_info is missing or has no id: {}'.format(image_info))
+
+
+def _download_image(ext, image_info, force=False, **kwargs):
+    """Start the download of an image unless it is already cached."""
+    if not force and ext.agent.cached_image_id == image_info['id']:
+        LOG.info('Image %s already cached, skipping download',
+                 image_info['id'])
+        return None
+    return ImageTransfers.start(image_info, ext.agent.system['uuid'])
+
+
 class StandbyExtension(base.BaseAgentExtension):
+    @base.async_command('cache_image', _validate_image_info,
+                        tracker=_download_image)
+    def cache_image(self, image_info, force=False):
+        """Asynchronously caches specified image to the local OS device.
+
+        :param image_info: Image information dictionary.
+        :param force: Optional. If True forces cache_image to download and
+                      cache image, even if the same image already exists on
+                      the local OS install device. Defaults to False.
+        """
+        self.agent.cached_image_id = image_info['id']
+        return 'image ({}) cached to device'.format(image_info['id'])
+
+    @base.async_command('prepare_image', _validate_image_info,
+                        tracker=_download_image)
+    def prepare_image(self, image_info, configdrive=None):
+        """Asynchronously prepares specified image on local OS install device.
+
+        The image download is simulated, its progress is reported in the
+        command result while the command is running.
+
+        :param image_info: Image information dictionary.
+        :param configdrive: A string containing the location of the config
+                            drive as a URL OR the contents (as gzip/base64)
+                            of the configdrive. Optional, defaults to None.
+        """
+        self.agent.cached_image_id = image_info['id']
+        return 'image ({}) written to device'.format(image_info['id'])
+
     @base.async_command('power_off')
     def power_off(self):
         """Powers off the agent's system.
@@ -31,21 +77,7 @@ class StandbyExtension(base.BaseAgentExtension):
         by calling the redfish system.
         """
         LOG.info('Powering off system')
-        sushytools_url = \
-            '{}/redfish/v1/Systems/{}/Actions/ComputerSystem.Reset'.format(
-                self.agent._config.get('FAKE_IPA_REDFISH_URL'),
-                self.agent.system['uuid'])
-        data = {
-            "Action": "Reset",
-            "ResetType": "ForceOff"
-        }
-        auth = requests.auth.HTTPBasicAuth(
-            self.agent._config.get('FAKE_IPA_REDFISH_USER',
-                                   'admin'),
-            self.agent._config.get('FAKE_IPA_REDFISH_PASSWORD',
-                                   'password'))
-        requests.post(sushytools_url, json=data, verify=False, auth=auth,
-                      headers={'Content-type': 'application/json'})
+        RedfishClient.reset(self.agent.system['uuid'], 'ForceOff')
 
     @base.sync_command('get_partition_uuids')
     def get_partition_uuids(self):
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import logging
+
+from fake_ipa import encoding
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CATALOG = {
+    'clean_steps': {
+        'GenericHardwareManager': [
+            {
+                'step': 'erase_devices',
+                'priority': 10,
+                'interface': 'deploy',
+                'reboot_requested': False,
+                'abortable': True
+            },
+            {
+                'step': 'erase_devices_metadata',
+                'priority': 99,
+                'interface': 'deploy',
+                'reboot_requested': False,
+                'abortable': True
+            }
+        ]
+    },
+    'deploy_steps': {
+        'GenericHardwareManager': [
+            {
+                'step': 'write_image',
+                'priority': 0,
+                'interface': 'deploy',
+                'reboot_requested': False
+            }
+        ]
+    },
+    'clean_hardware_manager_version': {'fake_hardware_manager': '1.1'},
+    'deploy_hardware_manager_version': {'generic_hardware_manager': '1.1'},
+}
+
+STEP_INTERFACES = ('deploy', 'raid', 'bios', 'management', 'firmware',
+                   'power')
+
+
+def _validate_steps(kind, steps):
+    if not isinstance(steps, dict):
+        raise ValueError('%s must map hardware managers to step lists'
+                         % kind)
+    for manager, manager_steps in steps.items():
+        if not isinstance(manager_steps, list):
+            raise ValueError('%s of %s must be a list' % (kind, manager))
+        for step in manager_steps:
+            if not isinstance(step, dict):
+                raise ValueError('%s of %s must be dicts' % (kind, manager))
+            where = '%s step %s of %s' % (kind, step.get('step'), manager)
+            if not isinstance(step.get('step'), str):
+                raise ValueError('%s has no "step" name' % where)
+            if not isinstance(step.get('priority'), int):
+                raise ValueError('%s needs an integer priority' % where)
+            if step.get('interface') not in STEP_INTERFACES:
+                raise ValueError('%s has an invalid interface %s'
+                                 % (where, step.get('interface')))
+            if not isinstance(step.get('reboot_requested', False), bool):
+                raise ValueError('%s reboot_requested must be a boolean'
+                                 % where)
+
+
+def _count(config, key, default, minimum):
+    value = config.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int) \
+            or value < minimum:
+        raise ValueError('%s must be an integer of at least %d, got %r'
+                         % (key, minimum, value))
+    return value
+
+
+def _synthetic_steps(kind, managers, count):
+    """Spread count disabled steps over a number of hardware managers."""
+    steps = {}
+    for i in range(count):
+        manager = 'FakeHardwareManager%d' % (i % managers)
+        steps.setdefault(manager, []).append({
+            'step': 'fake_%s_%d' % (kind, i),
+            'priority': 0,
+            'interface': 'deploy',
+            'reboot_requested': False,
+            'abortable': True,
+        })
+    return steps
+
+
+class StepCatalog:
+    """Clean and deploy steps advertised by the agents.
+
+    The get_*_steps responses never change for a catalog, so they are built
+    and JSON encoded once when the catalog is loaded.
+    """
+
+    @classmethod
+    def initialize(cls, config, logger):
+        catalog = dict(DEFAULT_CATALOG)
+        path = config.get('FAKE_IPA_STEP_CATALOG_FILE')
+        if path:
+            with open(path) as f:
+                catalog.update(json.load(f))
+
+        managers = _count(config, 'FAKE_IPA_SYNTHETIC_HARDWARE_MANAGERS', 1,
+                          minimum=1)
+        count = _count(config, 'FAKE_IPA_SYNTHETIC_STEPS', 0, minimum=0)
+        for kind in ('clean', 'deploy'):
+            _validate_steps('%s_steps' % kind, catalog['%s_steps' % kind])
+            steps = dict(catalog['%s_steps' % kind])
+            if count:
+                for manager, extra in _synthetic_steps(
+                        kind, managers, count).items():
+                    steps[manager] = steps.get(manager, []) + extra
+            response = encoding.PreEncoded({
+                '%s_steps' % kind: steps,
+                'hardware_manager_version':
+                    catalog['%s_hardware_manager_version' % kind],
+            })
+            setattr(cls, '%s_steps' % kind, steps)
+            setattr(cls, '%s_steps_response' % kind, response)
+            logger.info('Loaded %d %s steps from %d hardware managers',
+                        sum(len(s) for s in steps.values()), kind,
+                        len(steps))
+        return cls
+
+    @classmethod
+    def steps_response(cls, kind):
+        """Return the pre-encoded get_<kind>_steps response.
+
+        The default catalog is loaded if the agent was not initialized.
+        """
+        response = getattr(cls, '%s_steps_response' % kind, None)
+        if response is None:
+            cls.initialize({}, LOG)
+            response = getattr(cls, '%s_steps_response' % kind)
+        return response
@@ -0,0 +1,71 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+import unittest
+from unittest import mock
+
+from fake_ipa import base
+from fake_ipa.timing import CommandProfile
+from fake_ipa.timing import CommandTimings
+
+
+def _profile(**kwargs):
+    return {'default': CommandProfile(**kwargs)}
+
+
+class TestAsyncCommandResultJoin(unittest.TestCase):
+
+    def _result(self, tracker=None):
+        return base.AsyncCommandResult('power_off', {}, lambda: None,
+                                       tracker=tracker)
+
+    def test_hanging_without_timeout_returns_at_once(self):
+        with mock.patch.object(CommandTimings, 'profiles', _profile(
+                latency={'type': 'fixed', 'value': 0},
+                timeout_probability=1)):
+            result = self._result()
+        started = time.monotonic()
+        self.assertIs(result, result.join())
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(base.AgentCommandStatus.RUNNING,
+                         result.command_status)
+
+    def test_hanging_with_timeout(self):
+        with mock.patch.object(CommandTimings, 'profiles', _profile(
+                latency={'type': 'fixed', 'value': 0},
+                timeout_probability=1)):
+            result = self._result()
+        with mock.patch.object(base.time, 'sleep') as sleep:
+            self.assertIs(result, result.join(timeout=5))
+        sleep.assert_not_called()
+        self.assertEqual(base.AgentCommandStatus.RUNNING,
+                         result.command_status)
+
+    def test_delay_is_bounded_by_timeout(self):
+        with mock.patch.object(CommandTimings, 'profiles', _profile(
+                latency={'type': 'fixed', 'value': 3600})):
+            result = self._result()
+        with mock.patch.object(base.time, 'sleep') as sleep:
+            result.join(timeout=2)
+        sleep.assert_called_once_with(2)
+
+    def test_tracker_is_bounded_by_timeout(self):
+        tracker = mock.Mock()
+        tracker.is_done.return_value = False
+        with mock.patch.object(CommandTimings, 'profiles', _profile(
+                latency={'type': 'fixed', 'value': 0})):
+            result = self._result(tracker=tracker)
+        started = time.monotonic()
+        result.join(timeout=0.1)
+        self.assertLess(time.monotonic() - started, 2)
@@ -0,0 +1,123 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from flask import jsonify
+
+from fake_ipa import capture
+from fake_ipa.capture import TrafficCapture
+from fake_ipa.compression import ResponseCompressor
+from fake_ipa import main
+from fake_ipa import replay
+from fake_ipa.settings import Settings
+from fake_ipa.tests.test_main import APITestCase
+
+
+class CaptureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'capture.jsonl')
+        for attribute in ('enabled', '_file'):
+            patcher = mock.patch.object(TrafficCapture, attribute)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        TrafficCapture.initialize({}, mock.Mock(), Settings(
+            advertise_ip='192.0.2.1', capture_file=self.path))
+        self.addCleanup(TrafficCapture._file.close)
+
+    def records(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+
+class TestTrafficCapture(CaptureTestCase):
+
+    def test_start(self):
+        record, = self.records()
+        self.assertEqual('start', record['type'])
+        self.assertEqual(capture.CAPTURE_VERSION, record['version'])
+
+    def test_run_command(self):
+        path = '/1be26c0b-03f2-4d2e-ae87-c02d7f33c123/v1/commands/'
+        with main.app.test_request_context(
+                path, method='POST', query_string={'agent_token': 't'},
+                json={'name': 'clean.get_clean_steps', 'params': {}}):
+            main.app.preprocess_request()
+            response = jsonify({'id': 'cmd-1'})
+            TrafficCapture.inbound(main.request, response,
+                                   time.time() - 0.5)
+        record = self.records()[1]
+        self.assertEqual('in', record['type'])
+        self.assertEqual('POST', record['method'])
+        self.assertEqual(path, record['path'])
+        self.assertEqual('/<uuid>/v1/commands/', record['route'])
+        self.assertEqual(200, record['status'])
+        self.assertEqual('agent_token=t', record['query'])
+        self.assertEqual({'name': 'clean.get_clean_steps', 'params': {}},
+                         record['body'])
+        self.assertEqual('cmd-1', record['result_id'])
+        self.assertGreaterEqual(record['latency'], 0.5)
+
+    @mock.patch.object(ResponseCompressor, 'enabled', True)
+    @mock.patch.object(ResponseCompressor, 'min_size', 1024)
+    def test_run_command_compressed(self):
+        path = '/1be26c0b-03f2-4d2e-ae87-c02d7f33c123/v1/commands/'
+        with main.app.test_request_context(
+                path, method='POST', headers={'Accept-Encoding': 'gzip'},
+                json={'name': 'clean.get_clean_steps', 'params': {}}):
+            main.app.preprocess_request()
+            response = main.app.process_response(
+                jsonify({'id': 'cmd-1', 'command_result': 'x' * 100000}))
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual('cmd-1', self.records()[1]['result_id'])
+
+    def test_outbound(self):
+        uuid = '1be26c0b-03f2-4d2e-ae87-c02d7f33c123'
+        response = mock.Mock(status_code=202,
+                             elapsed=datetime.timedelta(milliseconds=20))
+        response.request.method = 'POST'
+        response.request.url = ('http://ironic:6385/v1/heartbeat/%s?x=1'
+                                % uuid)
+        TrafficCapture._outbound('ironic', response)
+        record = self.records()[1]
+        self.assertEqual({'type': 'out', 'latency': 0.02,
+                          'target': 'ironic', 'method': 'POST',
+                          'path': '/v1/heartbeat/%s' % uuid,
+                          'route': '/v1/heartbeat/<uuid>', 'status': 202},
+                         {k: v for k, v in record.items() if k != 't'})
+
+
+class TestCapturedRequests(CaptureTestCase, APITestCase):
+
+    def test_list_commands(self):
+        resp = self.client.get('/%s/v1/commands/?since=cmd-1' % self.uuid)
+        self.assertEqual(200, resp.status_code)
+        record = self.records()[1]
+        self.assertEqual('/<uuid>/v1/commands/', record['route'])
+        self.assertEqual('since=cmd-1', record['query'])
+        self.assertNotIn('body', record)
+        self.assertNotIn('result_id', record)
+        # Replays read the same handling time from the response
+        self.assertIsNotNone(replay.server_latency(resp))
+        self.assertLessEqual(replay.server_latency(resp),
+                             record['latency'] + 0.001)
@@ -0,0 +1,64 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import unittest
+import uuid
+
+from fake_ipa import encoding
+
+
+class Thing(encoding.Serializable):
+    serializable_fields = ('name', 'value')
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+
+class TestRESTJSONEncoder(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = encoding.RESTJSONEncoder()
+
+    def test_serializable(self):
+        node = uuid.UUID('27946b59-9e44-4fa7-8e91-f3527a1ef094')
+        self.assertEqual(
+            {'name': str(node), 'value': [1]},
+            json.loads(self.encoder.encode(Thing(node, [1]))))
+
+    def test_pre_encoded(self):
+        steps = encoding.PreEncoded({'steps': ['a', 'b']})
+        data = self.encoder.encode(
+            {'first': steps, 'nested': [Thing('x', steps)]})
+        self.assertEqual(
+            {'first': {'steps': ['a', 'b']},
+             'nested': [{'name': 'x', 'value': {'steps': ['a', 'b']}}]},
+            json.loads(data))
+
+    def test_pre_encoded_as_is(self):
+        raw = encoding.PreEncoded(None, encoded='{"a":  1}')
+        self.assertEqual('[{"a":  1}]', self.encoder.encode([raw]))
+
+    def test_strings_looking_like_markers(self):
+        document = ['@@pre-encoded:1@@', '"@@pre-encoded:2@@"', '0:0',
+                    encoding.PreEncoded(1)]
+        self.assertEqual(['@@pre-encoded:1@@', '"@@pre-encoded:2@@"', '0:0',
+                          1],
+                         json.loads(self.encoder.encode(document)))
+
+    def test_indent(self):
+        encoder = encoding.RESTJSONEncoder(indent=2)
+        self.assertEqual('{\n  "a": [1]\n}\n',
+                         encoder.encode({'a': encoding.PreEncoded([1])}))
+
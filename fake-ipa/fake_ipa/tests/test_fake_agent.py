@@ -0,0 +1,88 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import types
+import unittest
+from unittest import mock
+
+from fake_ipa.fake_agent import AgentPool
+from fake_ipa.fake_agent import FakeIronicPythonAgent
+
+
+def make_system(index=0):
+    return {'uuid': 'uuid-%d' % index, 'name': 'node-%d' % index,
+            'nics': [{'mac': '52:54:00:00:00:%02x' % index}]}
+
+
+class TestAgentPool(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(AgentPool, parked={}, created=0,
+                                      reused=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(FakeIronicPythonAgent, 'api',
+                                    types.SimpleNamespace(agents={}),
+                                    create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_new_agent(self):
+        agent = AgentPool.acquire(make_system(), None, lookup_timeout=30)
+        self.assertIsInstance(agent, FakeIronicPythonAgent)
+        self.assertEqual(30, agent.lookup_timeout)
+        self.assertEqual({'parked': 0, 'created': 1, 'reused': 0},
+                         AgentPool.status())
+
+    def test_reuse_after_shutdown(self):
+        agent = AgentPool.acquire(make_system(), None)
+        agent.node = {'uuid': 'node-uuid'}
+        agent.agent_token = 'token'
+        agent.cached_image_id = 'image'
+        FakeIronicPythonAgent.api.agents['node-uuid'] = agent
+        agent.execute_command('clean.get_clean_steps', node=agent.node,
+                              ports=[])
+        version = agent.command_results_version
+        agent.shutdown()
+        self.assertEqual({}, FakeIronicPythonAgent.api.agents)
+        self.assertEqual({}, agent.command_results)
+        self.assertGreater(agent.command_results_version, version)
+        self.assertEqual(1, AgentPool.status()['parked'])
+
+        system = dict(make_system(), name='renamed')
+        again = AgentPool.acquire(system, None, lookup_timeout=10)
+        self.assertIs(agent, again)
+        self.assertIs(system, again.system)
+        self.assertIsNone(again.agent_token)
+        self.assertIsNone(again.cached_image_id)
+        self.assertEqual(10, again.lookup_timeout)
+        self.assertEqual({'parked': 0, 'created': 1, 'reused': 1},
+                         AgentPool.status())
+
+    def test_no_reuse_for_other_api(self):
+        agent = AgentPool.acquire(make_system(), None)
+        AgentPool.park(agent)
+        with mock.patch('fake_ipa.fake_agent.APIClient') as client, \
+                mock.patch('fake_ipa.fake_agent.Heatbeater'):
+            other = AgentPool.acquire(make_system(), 'http://192.0.2.1:6385')
+        self.assertIsNot(agent, other)
+        client.assert_called_once_with(make_system(),
+                                       'http://192.0.2.1:6385')
+        self.assertEqual(2, AgentPool.status()['created'])
+
+    def test_other_system(self):
+        AgentPool.park(AgentPool.acquire(make_system(0), None))
+        agent = AgentPool.acquire(make_system(1), None)
+        self.assertEqual('uuid-1', agent.system['uuid'])
+        self.assertEqual({'parked': 1, 'created': 2, 'reused': 0},
+                         AgentPool.status())
@@ -0,0 +1,141 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import itertools
+import unittest
+from unittest import mock
+
+from fake_ipa import fake_ironic
+
+SYSTEM = {'uuid': '1be26c0b-03f2-4d2e-ae87-c02d7f33c123', 'name': 'node-0',
+          'nics': [{'mac': '52:54:00:00:00:01'}]}
+CALLBACK_URL = 'http://192.0.2.1:9999/%s' % SYSTEM['uuid']
+CLEAN_STEPS = {'GenericHardwareManager': [
+    {'step': 'erase_devices', 'priority': 10, 'interface': 'deploy'},
+    {'step': 'erase_devices_metadata', 'priority': 99,
+     'interface': 'deploy'},
+    {'step': 'burnin_cpu', 'priority': 0, 'interface': 'deploy'}]}
+
+
+class FakeAgent:
+    """Answers the commands of the conductor like FakeIPA."""
+
+    def __init__(self, status='SUCCEEDED'):
+        self.status = status
+        self.commands = []
+        self.ids = itertools.count()
+
+    def post(self, url, params, json):
+        self.commands.append((json['name'], json['params']))
+        name = json['name'].split('.')[1]
+        result = ({'clean_steps': CLEAN_STEPS}
+                  if name == 'get_clean_steps' else None)
+        self.last = {'id': 'cmd-%d' % next(self.ids), 'command_name': name,
+                     'command_status': self.status, 'command_error': None,
+                     'command_result': result}
+        return mock.Mock(json=mock.Mock(return_value=self.last))
+
+    def get(self, url, params):
+        return mock.Mock(json=mock.Mock(return_value={
+            'commands': [dict(self.last, command_status=self.status)]}))
+
+
+class TestConductor(unittest.TestCase):
+
+    def setUp(self):
+        self.conductor = fake_ironic.Conductor(None, 1, 60)
+        self.addCleanup(self.conductor.pool.shutdown)
+        # Run the conductor operations in the request
+        self.conductor.pool = mock.Mock()
+        self.conductor.pool.submit.side_effect = (
+            lambda fn, *args, **kwargs: fn(*args, **kwargs))
+        self.agent = FakeAgent()
+        self.conductor.session = self.agent
+        self.node = self.conductor.enroll(dict(SYSTEM))
+        self.client = fake_ironic.create_app(self.conductor).test_client()
+
+    def lookup(self):
+        resp = self.client.get('/v1/lookup?addresses=52:54:00:00:00:01')
+        self.assertEqual(200, resp.status_code)
+        return resp.get_json()['config']['agent_token']
+
+    def heartbeat(self, token=None):
+        return self.client.post('/v1/heartbeat/%s' % SYSTEM['uuid'], json={
+            'agent_token': token or self.node.agent_token,
+            'callback_url': CALLBACK_URL + '/'})
+
+    def test_provision(self):
+        token = self.lookup()
+        self.assertEqual(401, self.heartbeat('wrong').status_code)
+        while self.node.plan != []:
+            self.assertEqual(202, self.heartbeat(token).status_code)
+        self.assertEqual('deploying', self.node.state)
+        self.assertEqual(
+            ['clean.get_clean_steps', 'clean.execute_clean_step',
+             'clean.execute_clean_step', 'deploy.get_deploy_steps',
+             'deploy.execute_deploy_step', 'standby.prepare_image',
+             'image.install_bootloader', 'standby.power_off'],
+            [name for name, _ in self.agent.commands])
+        # Clean steps by priority, disabled ones skipped
+        self.assertEqual(['erase_devices_metadata', 'erase_devices'],
+                         [params['step']['step']
+                          for name, params in self.agent.commands
+                          if name == 'clean.execute_clean_step'])
+
+        resp = self.client.post('/redfish/v1/Systems/%s/Actions/'
+                                'ComputerSystem.Reset' % SYSTEM['uuid'],
+                                json={'ResetType': 'ForceOff'})
+        self.assertEqual(204, resp.status_code)
+        self.assertEqual('active', self.node.state)
+        self.heartbeat(token)
+        self.assertEqual(8, len(self.agent.commands))
+
+        stats = self.client.get('/stats').get_json()
+        self.assertEqual({'active': 1}, stats['states'])
+        self.assertEqual(9, stats['heartbeats'])
+        self.assertEqual(0, stats['command_errors'])
+        self.assertIn('p90', stats['provision_time'])
+
+    def test_running_command(self):
+        self.agent.status = 'RUNNING'
+        self.heartbeat()
+        self.assertEqual('cmd-0', self.node.command_id)
+        self.heartbeat()
+        self.assertEqual(1, len(self.agent.commands))
+        self.agent.status = 'SUCCEEDED'
+        self.heartbeat()
+        self.assertEqual(['clean.get_clean_steps',
+                          'clean.execute_clean_step'],
+                         [name for name, _ in self.agent.commands])
+        self.assertEqual('cmd-0', self.node.since)
+
+    def test_failed_command(self):
+        self.agent.status = 'FAILED'
+        self.heartbeat()
+        self.assertEqual('deploy failed', self.node.state)
+        self.heartbeat()
+        self.assertEqual(1, len(self.agent.commands))
+        self.assertEqual(1, self.conductor.stats()['command_errors'])
+
+    def test_not_found(self):
+        self.assertEqual(404, self.client.get(
+            '/v1/lookup?addresses=52:54:00:00:00:02').status_code)
+        self.assertEqual(404, self.client.post(
+            '/redfish/v1/Systems/unknown/Actions/ComputerSystem.Reset',
+            json={}).status_code)
+
+    def test_passive(self):
+        self.conductor.drive = False
+        self.heartbeat()
+        self.assertEqual([], self.agent.commands)
+        self.assertEqual(1, self.conductor.stats()['heartbeats'])
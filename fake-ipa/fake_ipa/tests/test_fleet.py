@@ -0,0 +1,37 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import unittest
+
+from fake_ipa import fleet
+
+
+class TestFleet(unittest.TestCase):
+
+    def test_make_system(self):
+        systems = [fleet.make_system(index) for index in (0, 1, 0x10203)]
+        self.assertEqual(['52:54:01:00:00:00', '52:54:01:00:00:01',
+                          '52:54:01:01:02:03'],
+                         [system['nics'][0]['mac'] for system in systems])
+        self.assertEqual('fleet-00001', systems[1]['name'])
+        self.assertEqual(3, len({system['uuid'] for system in systems}))
+
+    @unittest.skipUnless(os.path.exists('/proc/self/stat'), 'needs /proc')
+    def test_process_sampler(self):
+        sampler = fleet.ProcessSampler(os.getpid())
+        self.assertGreater(sampler.rss(), 0)
+        sampler.sample()
+        report = sampler.report(1.0)
+        self.assertGreaterEqual(report['cpu_seconds'], 0)
+        self.assertGreaterEqual(report['rss_peak_mb'], report['rss_mb'] / 2)
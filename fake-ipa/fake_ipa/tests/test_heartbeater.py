@@ -0,0 +1,158 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import logging
+import unittest
+from unittest import mock
+
+from fake_ipa import heartbeater
+from fake_ipa.heartbeater import HeartbeatStress
+from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.settings import Settings
+
+LOG = logging.getLogger(__name__)
+
+
+class TestHeartbeatStress(unittest.TestCase):
+
+    def _stress(self, schedule, now=100.0):
+        with mock.patch.object(heartbeater.time, 'monotonic',
+                               return_value=now):
+            return HeartbeatStress(schedule, LOG)
+
+    def _report(self, stress, now):
+        with mock.patch.object(heartbeater.time, 'monotonic',
+                               return_value=now):
+            return stress.report()
+
+    def test_invalid_schedule(self):
+        self.assertRaises(ValueError, HeartbeatStress, [], LOG)
+        self.assertRaises(ValueError, HeartbeatStress,
+                          [{'rate': 10, 'duration': 0}], LOG)
+
+    def test_achieved_rate_of_running_step(self):
+        stress = self._stress([{'rate': 10, 'duration': 60},
+                               {'rate': 20, 'duration': 60}])
+        for _ in range(100):
+            stress.record(0, 0.01, True)
+        steps = self._report(stress, 110.0)['steps']
+        self.assertEqual(10.0, steps[0]['achieved_rate'])
+        self.assertIsNone(steps[1]['achieved_rate'])
+        steps = self._report(stress, 200.0)['steps']
+        self.assertEqual(round(100 / 60, 1), steps[0]['achieved_rate'])
+
+    def test_latency_reservoir(self):
+        stress = self._stress([{'rate': 10, 'duration': 60}])
+        stress.reservoir_size = 100
+        for i in range(1000):
+            stress.record(0, i / 1000, i % 10 != 0)
+        self.assertEqual(100, len(stress.latencies[0]))
+        step = self._report(stress, 110.0)['steps'][0]
+        self.assertEqual(1000, step['heartbeats'])
+        self.assertEqual(100, step['errors'])
+        self.assertEqual(0.999, step['max'])
+        self.assertLess(step['p50'], step['p99'])
+
+
+class TestStartStress(unittest.TestCase):
+
+    def setUp(self):
+        Heatbeater.initialize({}, LOG, Settings(advertise_ip='192.0.2.1'))
+        self.addCleanup(setattr, Heatbeater, 'stress', None)
+
+    def test_threads_validation(self):
+        schedule = [{'rate': 10, 'duration': 1}]
+        for threads in (-1, heartbeater.MAX_STRESS_THREADS + 1, '4', 2.0,
+                        True, None):
+            self.assertRaises(ValueError, Heatbeater.start_stress, schedule,
+                              threads)
+        self.assertIsNone(Heatbeater.stress)
+        with mock.patch.object(heartbeater, 'Thread') as thread:
+            Heatbeater.start_stress(schedule, 3)
+        self.assertEqual(3, thread.call_count)
+        self.assertIsNotNone(Heatbeater.stress)
+
+
+class TestProcessNext(unittest.TestCase):
+
+    def setUp(self):
+        Heatbeater.initialize({}, LOG, Settings(advertise_ip='192.0.2.1'))
+        patcher = mock.patch.multiple(
+            Heatbeater, queue=collections.deque(), remove_from_q=set(),
+            queued=collections.Counter(), min_interval=5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.heartbeater = Heatbeater()
+        self.agent = mock.Mock()
+        self.agent.heartbeater.interval = 100
+        self.agent.heartbeater.heartbeat_forced = False
+        self.system = {'uuid': 'uuid-1', 'name': 'node-1'}
+
+    def test_empty_queue(self):
+        Heatbeater.min_interval = 1
+        self.assertTrue(self.heartbeater.process_next())
+        self.assertEqual(5, Heatbeater.min_interval)
+
+    def test_not_due(self):
+        Heatbeater.add_to_q(self.system, self.agent)
+        with mock.patch.object(self.heartbeater, 'do_heartbeat') as beat:
+            self.assertTrue(self.heartbeater.process_next())
+        beat.assert_not_called()
+        self.assertEqual(1, len(Heatbeater.queue))
+
+    def test_due(self):
+        Heatbeater.queue.append((self.system, self.agent, 0))
+        Heatbeater.queued['uuid-1'] += 1
+        with mock.patch.object(self.heartbeater, 'do_heartbeat') as beat:
+            self.assertTrue(self.heartbeater.process_next())
+        beat.assert_called_once_with(self.system, self.agent)
+        self.assertGreater(Heatbeater.queue[0][2], 0)
+
+    def test_removed(self):
+        Heatbeater.add_to_q(self.system, self.agent)
+        Heatbeater.remove_from_heartbeater_q('uuid-1')
+        self.assertFalse(self.heartbeater.process_next())
+        self.agent.shutdown.assert_called_once_with()
+        self.assertEqual(0, len(Heatbeater.queue))
+        self.assertEqual({}, dict(Heatbeater.queued))
+        self.assertEqual(set(), Heatbeater.remove_from_q)
+
+    def test_removed_queued_twice(self):
+        Heatbeater.add_to_q(self.system, self.agent)
+        Heatbeater.add_to_q(self.system, self.agent)
+        Heatbeater.remove_from_heartbeater_q('uuid-1')
+        with mock.patch.object(self.heartbeater, 'do_heartbeat') as beat:
+            self.assertFalse(self.heartbeater.process_next())
+            self.agent.shutdown.assert_not_called()
+            self.assertEqual({'uuid-1'}, Heatbeater.remove_from_q)
+            self.assertFalse(self.heartbeater.process_next())
+        beat.assert_not_called()
+        self.agent.shutdown.assert_called_once_with()
+        self.assertEqual(0, len(Heatbeater.queue))
+        self.assertEqual({}, dict(Heatbeater.queued))
+        self.assertEqual(set(), Heatbeater.remove_from_q)
+
+    def test_remove_unknown(self):
+        Heatbeater.remove_from_heartbeater_q('uuid-1')
+        self.assertEqual(set(), Heatbeater.remove_from_q)
+
+    def test_stress_slot(self):
+        Heatbeater.add_to_q(self.system, self.agent)
+        stress = mock.Mock()
+        with mock.patch.object(self.heartbeater, 'do_heartbeat',
+                               return_value=True) as beat:
+            self.assertFalse(self.heartbeater.process_next(stress, 0))
+        beat.assert_called_once_with(self.system, self.agent)
+        stress.record.assert_called_once_with(0, mock.ANY, True)
+        self.assertEqual(1, len(Heatbeater.queue))
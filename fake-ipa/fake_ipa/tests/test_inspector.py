@@ -0,0 +1,87 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import logging
+import unittest
+from unittest import mock
+
+import requests
+import tenacity
+
+from fake_ipa.inspector import Inspector
+from fake_ipa.settings import Settings
+
+LOG = logging.getLogger(__name__)
+SYSTEM = {'uuid': '1be26c0b-03f2-4d2e-ae87-c02d7f33c123', 'name': 'node-0'}
+URL = 'http://192.0.2.2:5050/v1/continue'
+
+
+class TestInspector(unittest.TestCase):
+
+    def setUp(self):
+        Inspector.initialize({}, LOG, Settings(
+            advertise_ip='192.0.2.1', inspection_callback_url=URL,
+            inspection_workers=3, inspection_read_timeout=5))
+        self.addCleanup(Inspector.pool.shutdown)
+        patcher = mock.patch.object(Inspector, 'timings',
+                                    collections.OrderedDict())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.profile = mock.Mock()
+        self.profile.render.return_value = '{}'
+        self.post = mock.patch.object(Inspector.session, 'post',
+                                      autospec=True).start()
+        self.addCleanup(mock.patch.stopall)
+        self.post.return_value.status_code = 200
+        self.post.return_value.json.return_value = {'uuid': 'node'}
+
+    def test_pool_and_session(self):
+        self.assertEqual(3, Inspector.pool._max_workers)
+        adapter = Inspector.session.get_adapter(URL)
+        self.assertEqual(3, adapter._pool_maxsize)
+
+    def test_inspect(self):
+        self.assertEqual('node', Inspector.inspect(SYSTEM, self.profile))
+        self.post.assert_called_once_with(
+            URL, verify=True, cert=None, data='{}',
+            headers={'Content-Type': 'application/json'}, timeout=(10, 5))
+        timings = Inspector.timings[SYSTEM['uuid']]
+        self.assertEqual(1, timings['attempts'])
+        self.assertGreaterEqual(timings['queue_wait'], 0)
+        report = Inspector.report()
+        self.assertEqual(1, report['inspections'])
+        self.assertEqual(0, report['retried'])
+        self.assertIn('p90', report['post'])
+
+    def test_error(self):
+        self.post.return_value.status_code = 500
+        self.post.return_value.content = b'boom'
+        self.assertIsNone(Inspector.inspect(SYSTEM, self.profile))
+
+    @mock.patch.object(Inspector._post_to_inspector.retry, 'wait',
+                       tenacity.wait_none())
+    def test_retried(self):
+        self.post.side_effect = [requests.exceptions.ConnectionError(),
+                                 self.post.return_value]
+        self.assertEqual('node', Inspector.inspect(SYSTEM, self.profile))
+        self.assertEqual(2, Inspector.timings[SYSTEM['uuid']]['attempts'])
+        self.assertEqual(1, Inspector.report()['retried'])
+
+    def test_timings_bounded(self):
+        with mock.patch.object(Inspector, 'timings_size', 2):
+            for index in range(4):
+                Inspector.inspect(dict(SYSTEM, uuid=str(index)),
+                                  self.profile)
+            Inspector.inspect(dict(SYSTEM, uuid='2'), self.profile)
+        self.assertEqual(['3', '2'], list(Inspector.timings))
@@ -0,0 +1,103 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import dataclasses
+import unittest
+from unittest import mock
+
+from fake_ipa import base
+from fake_ipa.interning import ParamInterner
+from fake_ipa.settings import Settings
+
+SETTINGS = Settings(advertise_ip='192.0.2.1')
+
+
+def make_node(uuid):
+    return {'uuid': uuid, 'provision_state': 'cleaning',
+            'properties': {'cpus': 2, 'memory_mb': 4096},
+            'driver_info': {'redfish_address': 'http://192.0.2.1:8000'}}
+
+
+class TestParamInterner(unittest.TestCase):
+
+    def setUp(self):
+        ParamInterner.initialize({}, mock.Mock(), SETTINGS)
+        patcher = mock.patch.multiple(ParamInterner, hits=0, misses=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_intern(self):
+        first = ParamInterner.intern(make_node('a'))
+        second = ParamInterner.intern(make_node('a'))
+        self.assertIs(first, second)
+        self.assertEqual(make_node('a'), second)
+
+    def test_nested_documents_are_shared(self):
+        first = ParamInterner.intern(make_node('a'))
+        second = ParamInterner.intern(make_node('b'))
+        self.assertIsNot(first, second)
+        self.assertIs(first['properties'], second['properties'])
+        self.assertIs(first['driver_info'], second['driver_info'])
+
+    def test_scalars_and_unencodable(self):
+        self.assertEqual(1, ParamInterner.intern(1))
+        value = {'a': object()}
+        self.assertEqual(value, ParamInterner.intern(value))
+        self.assertEqual(0, ParamInterner.status()['documents'])
+
+    def test_intern_params_transient(self):
+        params = ParamInterner.intern_params(
+            {'node': make_node('a'), 'ports': [{'address': 'm'}]},
+            transient=('node',))
+        again = ParamInterner.intern_params(
+            {'node': make_node('a'), 'ports': [{'address': 'm'}]},
+            transient=('node',))
+        # Transient documents are not kept, their nested documents are
+        self.assertIsNot(params['node'], again['node'])
+        self.assertIs(params['node']['properties'],
+                      again['node']['properties'])
+        self.assertIs(params['ports'], again['ports'])
+
+    def test_disabled(self):
+        ParamInterner.initialize({}, mock.Mock(), dataclasses.replace(
+            SETTINGS, dedup_command_params=False))
+        self.addCleanup(ParamInterner.initialize, {}, mock.Mock(), SETTINGS)
+        params = {'node': make_node('a')}
+        self.assertIs(params, ParamInterner.intern_params(params))
+
+    def test_max_size(self):
+        ParamInterner.initialize({}, mock.Mock(), dataclasses.replace(
+            SETTINGS, dedup_cache_size=2))
+        self.addCleanup(ParamInterner.initialize, {}, mock.Mock(), SETTINGS)
+        for i in range(5):
+            ParamInterner.intern([i])
+        self.assertEqual(2, ParamInterner.status()['documents'])
+        self.assertEqual(5, ParamInterner.status()['misses'])
+
+
+class TestReleasedParams(unittest.TestCase):
+
+    def test_sync_result(self):
+        result = base.SyncCommandResult(
+            'clean.get_clean_steps', {'node': make_node('a'), 'ports': [],
+                                      'other': 1}, True, {})
+        self.assertEqual({'other': 1}, result.command_params)
+
+    def test_async_result(self):
+        result = base.AsyncCommandResult(
+            'power_off', {'node': make_node('a'), 'ports': []},
+            lambda: None)
+        self.assertIn('node', result.command_params)
+        result.release_params()
+        self.assertNotIn('node', result.command_params)
+        self.assertIsNone(result.execute_method)
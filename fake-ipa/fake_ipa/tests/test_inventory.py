@@ -0,0 +1,75 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import unittest
+
+from fake_ipa import inventory
+
+
+SYSTEM = {
+    'uuid': '27946b59-9e44-4fa7-8e91-f3527a1ef094',
+    'name': 'fake-node-1',
+    'nics': [{'name': 'eth0', 'mac': '52:54:00:00:00:01', 'ip': '192.0.2.1'}],
+}
+
+
+class TestPayloadTemplate(unittest.TestCase):
+
+    def test_render(self):
+        template = inventory.PayloadTemplate(
+            {'a': inventory._PLACEHOLDER % 'a', 'b': [1, 2]})
+        self.assertEqual({'a': {'x': 1}, 'b': [1, 2]},
+                         json.loads(template.render(a='{"x": 1}')))
+
+    def test_user_string_is_not_a_placeholder(self):
+        template = inventory.PayloadTemplate(
+            {'a': '@@a@@', 'b': '@@b@@', 'c': inventory._PLACEHOLDER % 'a'})
+        self.assertEqual({'a': '@@a@@', 'b': '@@b@@', 'c': 1},
+                         json.loads(template.render(a='1')))
+
+
+class TestInventoryProfile(unittest.TestCase):
+
+    def test_minimal(self):
+        profile = inventory.load_profile({})
+        data = json.loads(profile.render(SYSTEM))
+        self.assertEqual('52:54:00:00:00:01', data['boot_interface'])
+        self.assertEqual(
+            [('eth0', '52:54:00:00:00:01', '192.0.2.1')],
+            [(i['name'], i['mac_address'], i['ipv4_address'])
+             for i in data['inventory']['interfaces']])
+        self.assertNotIn('numa_topology', data)
+
+    def test_large(self):
+        data = json.loads(inventory.load_profile(
+            {'FAKE_IPA_INVENTORY_PROFILE': 'large'}).render(SYSTEM))
+        self.assertEqual(8, len(data['inventory']['interfaces']))
+        self.assertEqual(24, len(data['inventory']['disks']))
+        self.assertEqual('fake-node-1', data['inventory']['hostname'])
+        self.assertEqual(SYSTEM['uuid'],
+                         data['inventory']['system_vendor']['serial_number'])
+        self.assertEqual(8, len(data['numa_topology']['nics']))
+
+    def test_profile_strings_are_kept(self):
+        profile = inventory.InventoryProfile(
+            'custom', {'cpu_frequency': '@@mac@@',
+                       'cpu_flags': ['@@interfaces@@']})
+        data = json.loads(profile.render(SYSTEM))
+        self.assertEqual('@@mac@@', data['inventory']['cpu']['frequency'])
+        self.assertEqual(['@@interfaces@@'],
+                         data['inventory']['cpu']['flags'])
+
+    def test_unknown_profile(self):
+        self.assertRaises(ValueError, inventory.load_profile,
+                          {'FAKE_IPA_INVENTORY_PROFILE': 'missing'})
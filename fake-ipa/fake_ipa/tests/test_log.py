@@ -0,0 +1,79 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import base64
+import io
+import json
+import tarfile
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+from fake_ipa import encoding
+from fake_ipa import log
+from fake_ipa.settings import Settings
+
+
+class TestCollectSystemLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        patcher = mock.patch.multiple(log, _archives={}, _archive_locks={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # A small archive made of a few small chunks
+        patcher = mock.patch.object(log, '_CHUNK_SIZE', 4096)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_empty(self):
+        self.assertEqual('', log.collect_system_logs())
+
+    def test_archive(self):
+        archive = log.collect_system_logs(size_mb=0.01,
+                                          cache_dir=self.cache_dir.name)
+        self.assertIsInstance(archive, encoding.PreEncodedFile)
+        data = base64.b64decode(json.loads(archive.json))
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+            names = tar.getnames()
+        self.assertIn('journal', names)
+        self.assertIn('dmesg', names)
+
+    def test_archive_is_cached(self):
+        first = log.collect_system_logs(size_mb=0.01,
+                                        cache_dir=self.cache_dir.name)
+        with mock.patch.object(log, '_build_archive') as build:
+            second = log.collect_system_logs(size_mb=0.01,
+                                             cache_dir=self.cache_dir.name)
+            other = log.collect_system_logs(size_mb=0.01,
+                                            file_mix={'journal': 1},
+                                            cache_dir=self.cache_dir.name)
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        build.assert_called_once()
+
+    def test_streamed(self):
+        archive = log.collect_system_logs(size_mb=0.01,
+                                          cache_dir=self.cache_dir.name)
+        extension = log.LogExtension(agent=types.SimpleNamespace(
+            settings=Settings(advertise_ip='192.0.2.1',
+                              system_logs_size_mb=0.01,
+                              system_logs_cache_dir=self.cache_dir.name)))
+        with mock.patch.object(encoding.PreEncodedFile, 'chunk_size', 1000):
+            chunks = list(encoding.RESTJSONEncoder().stream(
+                extension.collect_system_logs()))
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual({'system_logs': json.loads(archive.json)},
+                         json.loads(''.join(chunks))['command_result'])
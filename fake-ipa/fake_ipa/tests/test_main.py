@@ -0,0 +1,341 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import gzip
+import json
+import threading
+import tracemalloc
+import unittest
+from unittest import mock
+import uuid
+
+from fake_ipa.compression import ResponseCompressor
+from fake_ipa.fake_agent import FakeIronicPythonAgent
+from fake_ipa import main
+from fake_ipa.memory import MemoryMonitor
+from fake_ipa.settings import Settings
+from fake_ipa.settings import SharedSettings
+
+
+def make_agent():
+    system = {'uuid': str(uuid.uuid4()), 'name': 'node-0',
+              'nics': [{'mac': '52:54:00:00:00:01'}]}
+    agent = FakeIronicPythonAgent(system, None)
+    agent.node = {'uuid': system['uuid']}
+    return agent
+
+
+class APITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = main.app.test_client()
+        self.agent = make_agent()
+        self.uuid = self.agent.system['uuid']
+        patcher = mock.patch.dict(main.app.agents, {self.uuid: self.agent})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_command(self, agent=None):
+        agent = agent or self.agent
+        agent.execute_command('clean.get_clean_steps',
+                              node=agent.node, ports=[])
+
+
+class TestListCommands(APITestCase):
+
+    def test_not_modified(self):
+        self.run_command()
+        resp = self.client.get('/%s/v1/commands/' % self.uuid)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(1, len(resp.get_json()['commands']))
+        etag = resp.get_etag()[0]
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'If-None-Match': '"%s"' % etag})
+        self.assertEqual(304, resp.status_code)
+        self.assertEqual(etag, resp.get_etag()[0])
+
+    def test_etag_changes_with_results(self):
+        resp = self.client.get('/%s/v1/commands/' % self.uuid)
+        etag = resp.get_etag()[0]
+        self.run_command()
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'If-None-Match': '"%s"' % etag})
+        self.assertEqual(200, resp.status_code)
+        self.assertNotEqual(etag, resp.get_etag()[0])
+
+    def test_etag_not_reused_by_new_agent(self):
+        resp = self.client.get('/%s/v1/commands/' % self.uuid)
+        etag = resp.get_etag()[0]
+        agent = make_agent()
+        agent.system = self.agent.system
+        agent.node = self.agent.node
+        self.run_command(agent)
+        main.app.agents[self.uuid] = agent
+        # Same node, same version, different agent object
+        agent.command_results_version = self.agent.command_results_version
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'If-None-Match': '"%s"' % etag})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(1, len(resp.get_json()['commands']))
+
+    def test_since(self):
+        self.run_command()
+        first = next(iter(self.agent.command_results))
+        self.run_command()
+        resp = self.client.get('/%s/v1/commands/?since=%s'
+                               % (self.uuid, first))
+        self.assertEqual(1, len(resp.get_json()['commands']))
+        self.assertNotEqual(
+            resp.get_etag()[0],
+            self.client.get('/%s/v1/commands/' % self.uuid).get_etag()[0])
+
+    def test_unknown_agent(self):
+        resp = self.client.get('/%s/v1/commands/' % uuid.uuid4())
+        self.assertEqual(404, resp.status_code)
+
+
+class TestCompression(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        ResponseCompressor.initialize({}, mock.Mock(), Settings(
+            advertise_ip='192.0.2.1', compression_min_size=10))
+        self.addCleanup(ResponseCompressor.initialize, {}, mock.Mock(),
+                        Settings(advertise_ip='192.0.2.1',
+                                 compression=False))
+        self.run_command()
+
+    def test_compressed(self):
+        identity = self.client.get('/%s/v1/commands/' % self.uuid)
+        self.assertNotIn('Content-Encoding', identity.headers)
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual('gzip', resp.headers['Content-Encoding'])
+        self.assertEqual(identity.get_data(),
+                         gzip.decompress(resp.get_data()))
+        self.assertEqual(identity.get_etag()[0] + '-gzip',
+                         resp.get_etag()[0])
+
+    def test_not_modified(self):
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'Accept-Encoding': 'gzip'})
+        etag = resp.get_etag()[0]
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'Accept-Encoding': 'gzip',
+                                        'If-None-Match': '"%s"' % etag})
+        self.assertEqual(304, resp.status_code)
+        self.assertEqual(etag, resp.get_etag()[0])
+
+    def test_documents_compressed_once(self):
+        command_id = list(self.agent.command_results)[0]
+        path = '/%s/v1/commands/%s' % (self.uuid, command_id)
+        identity = self.client.get(path)
+        ResponseCompressor._documents.clear()
+        with mock.patch.object(ResponseCompressor, '_compress',
+                               wraps=ResponseCompressor._compress) as comp:
+            for _ in range(2):
+                resp = self.client.get(path,
+                                       headers={'Accept-Encoding': 'gzip'})
+                self.assertEqual('gzip', resp.headers['Content-Encoding'])
+                self.assertEqual(identity.get_json(),
+                                 json.loads(gzip.decompress(resp.get_data())))
+        steps = [call.args[0] for call in comp.call_args_list
+                 if call.args[0].startswith(b'{"clean_steps"')]
+        # The steps document is compressed by the first response only
+        self.assertEqual(1, len(steps))
+        self.assertEqual(5, len(comp.call_args_list))
+
+    def test_cache_not_shared_between_agents(self):
+        resp = self.client.get('/%s/v1/commands/' % self.uuid,
+                               headers={'Accept-Encoding': 'gzip'})
+        agent = make_agent()
+        agent.system = self.agent.system
+        agent.node = self.agent.node
+        agent.command_results_version = self.agent.command_results_version
+        main.app.agents[self.uuid] = agent
+        other = self.client.get('/%s/v1/commands/' % self.uuid,
+                                headers={'Accept-Encoding': 'gzip'})
+        self.assertNotEqual(resp.get_etag()[0], other.get_etag()[0])
+        self.assertEqual([], json.loads(
+            gzip.decompress(other.get_data()))['commands'])
+
+
+class AdminTestCase(unittest.TestCase):
+
+    token = 'secret'
+
+    def setUp(self):
+        self.client = main.app.test_client()
+        patcher = mock.patch.object(
+            SharedSettings, '_current',
+            Settings(advertise_ip='192.0.2.1', admin_token=self.token))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertProtected(self, method, path, **kwargs):
+        resp = self.client.open(path, method=method, **kwargs)
+        self.assertEqual(401, resp.status_code)
+        resp = self.client.open(path, method=method,
+                                headers={'X-Admin-Token': 'wrong'}, **kwargs)
+        self.assertEqual(401, resp.status_code)
+        resp = self.client.open(path, method=method,
+                                headers={'X-Admin-Token': self.token},
+                                **kwargs)
+        self.assertNotEqual(401, resp.status_code)
+        return resp
+
+
+class TestAdminToken(AdminTestCase):
+
+    def test_disabled_without_token(self):
+        with mock.patch.object(SharedSettings, '_current',
+                               Settings(advertise_ip='192.0.2.1')):
+            for method, path in (('GET', '/admin/agents'),
+                                 ('GET', '/admin/tuning'),
+                                 ('PATCH', '/admin/tuning'),
+                                 ('GET', '/debug/timers')):
+                resp = self.client.open(path, method=method,
+                                        headers={'X-Admin-Token': ''})
+                self.assertEqual(403, resp.status_code)
+
+    @mock.patch.object(main, 'ensure_runtime', autospec=True)
+    @mock.patch.object(main.RuntimeTuning, 'update', autospec=True)
+    def test_tuning_actor(self, mock_update, mock_runtime):
+        mock_update.return_value = {'log_level': 'INFO'}
+        resp = self.client.patch('/admin/tuning',
+                                 json={'log_level': 'INFO'},
+                                 headers={'X-Admin-Token': self.token,
+                                          'X-Admin-User': 'alice'})
+        self.assertEqual(200, resp.status_code)
+        mock_update.assert_called_once_with({'log_level': 'INFO'},
+                                            actor='alice (127.0.0.1)')
+
+
+class TestDebugEndpoints(AdminTestCase):
+
+    def test_compression(self):
+        resp = self.assertProtected('GET', '/debug/compression')
+        self.assertEqual(200, resp.status_code)
+
+    def test_timers(self):
+        resp = self.assertProtected('GET', '/debug/timers')
+        self.assertEqual(200, resp.status_code)
+
+    def test_profile(self):
+        with mock.patch.object(main.SamplingProfiler, 'enabled', False):
+            resp = self.assertProtected('GET', '/debug/profile?seconds=1')
+        self.assertEqual(404, resp.status_code)
+
+    def test_memory(self):
+        MemoryMonitor.initialize({}, mock.Mock(), main.app)
+        resp = self.assertProtected('GET', '/debug/memory')
+        self.assertEqual(200, resp.status_code)
+
+    def test_memory_snapshot(self):
+        self.addCleanup(tracemalloc.stop)
+        self.assertProtected('POST', '/debug/memory/snapshot?limit=x')
+        self.assertFalse(tracemalloc.is_tracing())
+        resp = self.client.post('/debug/memory/snapshot?limit=2',
+                                headers={'X-Admin-Token': self.token})
+        self.assertEqual(200, resp.status_code)
+        self.assertTrue(tracemalloc.is_tracing())
+        self.assertLessEqual(len(resp.get_json()['top']), 2)
+        resp = self.assertProtected('DELETE', '/debug/memory/snapshot')
+        self.assertEqual({'was_tracing': True}, resp.get_json())
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_traces(self):
+        resp = self.assertProtected('GET', '/debug/traces?format=otlp')
+        self.assertEqual(200, resp.status_code)
+        self.assertIn('resourceSpans', resp.get_json())
+
+    def test_inspection(self):
+        resp = self.assertProtected('GET', '/debug/inspection')
+        self.assertEqual(200, resp.status_code)
+        self.assertIn('queue_wait', resp.get_json())
+
+    def test_redfish(self):
+        resp = self.assertProtected('GET', '/debug/redfish')
+        self.assertEqual(200, resp.status_code)
+        self.assertIn('count', resp.get_json())
+
+    def test_trace_phases(self):
+        resp = self.assertProtected('GET', '/debug/traces/phases')
+        self.assertEqual(200, resp.status_code)
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        for patcher in (
+                mock.patch.object(main, '_runtime_ready', False),
+                mock.patch.object(SharedSettings, '_current',
+                                  Settings(advertise_ip='192.0.2.1',
+                                           api_url=None,
+                                           inspection_callback_url=None)),
+                mock.patch.object(main.FakeIronicPythonAgent, 'initialize'),
+                mock.patch.object(main.BulkRegistrar, 'initialize'),
+                mock.patch.object(main.RuntimeTuning, 'initialize')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_runtime_initialized_once(self):
+        threads = [threading.Thread(target=main.ensure_runtime)
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        main.ensure_runtime()
+        self.assertTrue(main._runtime_ready)
+        main.FakeIronicPythonAgent.initialize.assert_called_once()
+        main.BulkRegistrar.initialize.assert_called_once()
+        main.RuntimeTuning.initialize.assert_called_once()
+
+    @mock.patch.object(main.RedfishClient, 'warm_up')
+    @mock.patch.object(main.Inspector, 'warm_up')
+    @mock.patch.object(main.base, 'preload_extensions')
+    def test_warm_up(self, preload, inspector, redfish):
+        main.warm_up()
+        main.warm_up()
+        main.FakeIronicPythonAgent.initialize.assert_called_once()
+        self.assertEqual(2, preload.call_count)
+        inspector.assert_not_called()
+        self.assertEqual(2, redfish.call_count)
+
+    @mock.patch.object(main.app, 'run')
+    @mock.patch.object(main, 'warm_up')
+    @mock.patch.object(main.app.config, 'from_pyfile')
+    @mock.patch.object(main, 'parse_args')
+    def test_warm_up_in_serving_process_only(self, parse_args, from_pyfile,
+                                             warm_up, run):
+        parse_args.return_value = mock.Mock(config='/etc/fake-ipa.conf')
+        # With debug, the first process only watches the files
+        for serving in (False, True):
+            warm_up.reset_mock()
+            with contextlib.ExitStack() as stack:
+                for component in (main.ResponseCompressor,
+                                  main.TrafficCapture, main.SamplingProfiler,
+                                  main.MemoryMonitor, main.Tracer):
+                    stack.enter_context(
+                        mock.patch.object(component, 'initialize'))
+                stack.enter_context(mock.patch.object(
+                    main.Settings, 'from_config',
+                    return_value=main.app.settings))
+                stack.enter_context(mock.patch.object(
+                    main, 'is_running_from_reloader', return_value=serving))
+                self.assertEqual(0, main.main())
+            self.assertEqual(serving, warm_up.called)
+            run.assert_called_once()
+            run.reset_mock()
@@ -0,0 +1,29 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+from fake_ipa import metrics
+
+
+class TestPercentiles(unittest.TestCase):
+
+    def test_percentiles(self):
+        self.assertEqual({'p50': 51, 'p90': 91, 'p99': 100, 'max': 100},
+                         metrics.percentiles(range(100, 0, -1)))
+        self.assertEqual({'p50': 0.123, 'p90': 0.123, 'p99': 0.123,
+                          'max': 0.123}, metrics.percentiles([0.12345]))
+
+    def test_empty(self):
+        self.assertEqual({}, metrics.percentiles([]))
+        self.assertIsNone(metrics.percentile([], 90))
@@ -0,0 +1,81 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import dataclasses
+import logging
+import time
+import unittest
+from unittest import mock
+
+from fake_ipa.redfish import RedfishClient
+from fake_ipa.settings import Settings
+
+LOG = logging.getLogger(__name__)
+
+
+class TestRedfishClient(unittest.TestCase):
+
+    def tearDown(self):
+        RedfishClient.pool.shutdown()
+
+    def test_initialize_without_url(self):
+        settings = Settings(advertise_ip='192.0.2.1')
+        with self.assertLogs(LOG, 'WARNING'):
+            RedfishClient.initialize({}, LOG, settings)
+        self.assertIsNone(RedfishClient.url)
+        with mock.patch.object(RedfishClient.pool, 'submit') as submit:
+            RedfishClient.reset('uuid', 'ForceOff')
+        submit.assert_not_called()
+
+    def test_initialize_with_url(self):
+        settings = Settings(advertise_ip='192.0.2.1',
+                            redfish_url='http://192.0.2.2:8000')
+        RedfishClient.initialize({}, LOG, dataclasses.replace(
+            settings, redfish_workers=3))
+        adapter = RedfishClient.session.get_adapter('http://192.0.2.2:8000/')
+        self.assertEqual(3, adapter._pool_maxsize)
+        with mock.patch.object(RedfishClient.pool, 'submit') as submit:
+            RedfishClient.reset('uuid', 'ForceOff')
+        submit.assert_called_once_with(RedfishClient._send_reset, 'uuid',
+                                       'ForceOff', mock.ANY)
+
+    def test_coalesce(self):
+        settings = Settings(advertise_ip='192.0.2.1',
+                            redfish_url='http://192.0.2.2:8000')
+        RedfishClient.initialize({}, LOG, dataclasses.replace(
+            settings, redfish_coalesce_window=60))
+        RedfishClient.reset('uuid', 'ForceOff')
+        RedfishClient.reset('uuid', 'On')
+        RedfishClient._flush_timer.cancel()
+        with mock.patch.object(RedfishClient.pool, 'submit') as submit:
+            RedfishClient._flush()
+        submit.assert_called_once_with(RedfishClient._send_reset, 'uuid',
+                                       'On', mock.ANY)
+
+    def test_report(self):
+        settings = Settings(advertise_ip='192.0.2.1',
+                            redfish_url='http://192.0.2.2:8000')
+        RedfishClient.initialize({}, LOG, settings)
+        with mock.patch.object(RedfishClient, 'latencies',
+                               collections.deque(maxlen=3)), \
+                mock.patch.object(RedfishClient, '_post_reset',
+                                  autospec=True) as post:
+            post.return_value.status_code = 204
+            for requested in range(5):
+                RedfishClient._send_reset('uuid', 'On',
+                                          time.monotonic() - requested)
+            report = RedfishClient.report()
+        self.assertEqual(3, report['count'])
+        self.assertGreaterEqual(report['p50'], 3)
+        self.assertLess(report['max'], 5)
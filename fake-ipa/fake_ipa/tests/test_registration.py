@@ -0,0 +1,113 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import json
+import logging
+import threading
+import types
+import unittest
+from unittest import mock
+
+from fake_ipa import ironic_api_client
+from fake_ipa import registration
+from fake_ipa.settings import Settings
+
+LOG = logging.getLogger(__name__)
+
+
+class TestBulkRegistrar(unittest.TestCase):
+
+    def setUp(self):
+        self.api = types.SimpleNamespace(
+            booted_q=set(), booted_lock=threading.Lock(),
+            settings=Settings(advertise_ip='192.0.2.1'))
+        patcher = mock.patch.multiple(
+            registration.BulkRegistrar, create=True,
+            pending=collections.deque(), registered=0, failed=0,
+            _wakeup=threading.Event(), _lock=threading.Lock(),
+            _logger=LOG, api=self.api, lookup_timeout=30)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(registration, 'AgentPool', autospec=True)
+        self.pool = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_register(self):
+        self.assertEqual(2, registration.BulkRegistrar.register(
+            ['uuid-1', {'uuid': 'uuid-2', 'nics': [{'mac': 'm'}]}]))
+        self.assertEqual(
+            [{'uuid': 'uuid-1', 'node_uuid': 'uuid-1', 'name': 'uuid-1',
+              'nics': []},
+             {'uuid': 'uuid-2', 'name': 'uuid-2', 'nics': [{'mac': 'm'}]}],
+            list(registration.BulkRegistrar.pending))
+
+    def test_register_invalid(self):
+        self.assertRaises(ValueError, registration.BulkRegistrar.register,
+                          ['uuid-1', {'name': 'no-uuid'}])
+        self.assertEqual(0, len(registration.BulkRegistrar.pending))
+
+    def test_register_one(self):
+        system = {'uuid': 'uuid-1', 'node_uuid': 'node-1', 'name': 'n'}
+        registration.BulkRegistrar._register_one(system)
+        self.pool.acquire.assert_called_once_with(
+            system, 'http://localhost:6385', lookup_timeout=30)
+        self.pool.acquire.return_value.register.assert_called_once_with(
+            node_uuid='node-1')
+        self.assertEqual({'uuid-1'}, self.api.booted_q)
+        self.assertEqual({'pending': 0, 'registered': 1, 'failed': 0},
+                         registration.BulkRegistrar.status())
+
+    def test_register_one_running(self):
+        self.api.booted_q.add('uuid-1')
+        registration.BulkRegistrar._register_one({'uuid': 'uuid-1',
+                                                  'name': 'n'})
+        self.pool.acquire.assert_not_called()
+
+    def test_register_one_failed(self):
+        self.pool.acquire.return_value.register.side_effect = RuntimeError
+        registration.BulkRegistrar._register_one({'uuid': 'uuid-1',
+                                                  'name': 'n'})
+        self.assertEqual(set(), self.api.booted_q)
+        self.assertEqual(1, registration.BulkRegistrar.failed)
+
+
+class TestLookup(unittest.TestCase):
+
+    def setUp(self):
+        ironic_api_client.APIClient.initialize(
+            {}, LOG, Settings(advertise_ip='192.0.2.1'))
+        patcher = mock.patch.object(ironic_api_client.APIClient,
+                                    '_ironic_api_version', (1, 68))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _lookup(self, node, node_uuid):
+        client = ironic_api_client.APIClient(node, 'http://192.0.2.2:6385')
+        with mock.patch.object(client, '_request') as request:
+            request.return_value.status_code = 200
+            request.return_value.content = json.dumps(
+                {'node': {'uuid': 'node-1'},
+                 'config': {'heartbeat_timeout': 300}})
+            self.assertEqual('node-1', client._do_lookup(
+                node_uuid)['node']['uuid'])
+        return request.call_args[1]['params']
+
+    def test_lookup_by_address(self):
+        self.assertEqual({'addresses': '52:54:00:00:00:01'}, self._lookup(
+            {'nics': [{'mac': '52:54:00:00:00:01'}]}, None))
+
+    def test_lookup_without_nics(self):
+        self.assertEqual({'node_uuid': 'node-1'},
+                         self._lookup({'uuid': 'uuid-1', 'nics': []},
+                                      'node-1'))
@@ -0,0 +1,107 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+import unittest
+from unittest import mock
+
+from fake_ipa import replay
+
+UUID = '1be26c0b-03f2-4d2e-ae87-c02d7f33c123'
+
+
+def record(method, route, path, **kwargs):
+    return dict(type='in', t=0, latency=0.01, method=method, route=route,
+                path=path, status=200, **kwargs)
+
+
+def response(status=200, body=None, timing='app;dur=12.5'):
+    resp = mock.Mock(status_code=status, ok=status < 400,
+                     headers={'Server-Timing': timing} if timing else {})
+    resp.json.return_value = body or {}
+    return resp
+
+
+class TestReplayer(unittest.TestCase):
+
+    def setUp(self):
+        self.replayer = replay.Replayer('http://fake-ipa:9999/')
+        self.replayer.session = mock.Mock()
+
+    def test_map_ids(self):
+        self.replayer.ids = {'old-1': 'new-1'}
+        path, query = self.replayer._map_ids(record(
+            'GET', '/<uuid>/v1/commands/<cmd>',
+            '/%s/v1/commands/old-1' % UUID, query='wait=true'))
+        self.assertEqual('/%s/v1/commands/new-1' % UUID, path)
+        self.assertEqual([('wait', 'true')], query)
+        path, query = self.replayer._map_ids(record(
+            'GET', '/<uuid>/v1/commands/', '/%s/v1/commands/' % UUID,
+            query='since=old-1'))
+        self.assertEqual('/%s/v1/commands/' % UUID, path)
+        self.assertEqual([('since', 'new-1')], query)
+
+    def test_unknown_ids_kept(self):
+        path, query = self.replayer._map_ids(record(
+            'GET', '/<uuid>/v1/commands/<cmd>',
+            '/%s/v1/commands/old-2' % UUID, query='since=old-1'))
+        self.assertEqual('/%s/v1/commands/old-2' % UUID, path)
+        self.assertEqual([('since', 'old-1')], query)
+
+    def test_send_maps_result_id(self):
+        self.replayer.session.request.side_effect = [
+            response(body={'id': 'new-1'}), response()]
+        self.replayer._send(record('POST', '/<uuid>/v1/commands/',
+                                   '/%s/v1/commands/' % UUID,
+                                   body={'name': 'x', 'params': {}},
+                                   result_id='old-1'),
+                            time.monotonic(), None)
+        self.assertEqual({'old-1': 'new-1'}, self.replayer.ids)
+        self.replayer._send(record('GET', '/<uuid>/v1/commands/<cmd>',
+                                   '/%s/v1/commands/old-1' % UUID),
+                            time.monotonic(), None)
+        self.replayer.session.request.assert_called_with(
+            'GET', 'http://fake-ipa:9999/%s/v1/commands/new-1' % UUID,
+            params=[], json=None)
+
+    def test_failed_command_not_mapped(self):
+        self.replayer.session.request.return_value = response(status=409)
+        self.replayer._send(record('POST', '/<uuid>/v1/commands/',
+                                   '/%s/v1/commands/' % UUID,
+                                   result_id='old-1'),
+                            time.monotonic(), None)
+        self.assertEqual({}, self.replayer.ids)
+
+    def test_server_latency(self):
+        self.replayer.session.request.side_effect = [
+            response(), response(timing=None)]
+        for _ in range(2):
+            self.replayer._send(record('PUT', '/', '/'),
+                                time.monotonic(), None)
+        self.assertEqual([('PUT /', 200, 0.0125), ('PUT /', 200, None)],
+                         self.replayer.samples)
+        self.assertEqual(2, len(self.replayer.round_trips))
+        routes = replay.summarize(self.replayer.samples)
+        self.assertEqual(2, routes['PUT /']['count'])
+        self.assertEqual(12.5, routes['PUT /']['p90'])
+
+
+class TestServerLatency(unittest.TestCase):
+
+    def test_parse(self):
+        for header, expected in (('app;dur=12.5', 0.0125),
+                                 ('db;dur=1, app;dur=2', 0.002),
+                                 ('db;dur=1', None),
+                                 ('', None)):
+            resp = mock.Mock(headers={'Server-Timing': header})
+            self.assertEqual(expected, replay.server_latency(resp))
@@ -0,0 +1,130 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import dataclasses
+import unittest
+from unittest import mock
+
+from fake_ipa.fake_agent import FakeIronicPythonAgent
+from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.ironic_api_client import APIClient
+from fake_ipa import main
+from fake_ipa.settings import Settings
+from fake_ipa.settings import SharedSettings
+
+CONFIG = {'FAKE_IPA_ADVERTISE_ADDRESS_IP': '192.0.2.1'}
+
+
+class TestSettings(unittest.TestCase):
+
+    def test_defaults(self):
+        settings = Settings.from_config(CONFIG)
+        self.assertEqual(Settings(advertise_ip='192.0.2.1'), settings)
+        self.assertEqual('http', settings.advertise_protocol)
+
+    def test_values(self):
+        settings = Settings.from_config(dict(
+            CONFIG,
+            FAKE_IPA_ADVERTISE_ADDRESS_PORT=8443,
+            FAKE_IPA_API_URL='https://192.0.2.2:6385/',
+            FAKE_IPA_INSPECTION_CALLBACK_URL=None,
+            FAKE_IPA_MIN_BOOT_TIME=1,
+            FAKE_IPA_MAX_BOOT_TIME=1,
+            FAKE_IPA_HEARTBEATER_THREADS=8,
+            FAKE_IPA_CERTFILE='cert.pem',
+            FAKE_IPA_KEYFILE='key.pem',
+            FAKE_IPA_INSECURE=True,
+            FAKE_IPA_ADMIN_TOKEN='secret'))
+        self.assertEqual(8443, settings.advertise_port)
+        self.assertEqual('https://192.0.2.2:6385', settings.api_url)
+        self.assertIsNone(settings.inspection_callback_url)
+        self.assertEqual((1, 1), (settings.min_boot_time,
+                                  settings.max_boot_time))
+        self.assertEqual(8, settings.heartbeater_threads)
+        self.assertEqual('https', settings.advertise_protocol)
+        self.assertEqual((False, ('cert.pem', 'key.pem')),
+                         (settings.verify, settings.cert))
+        self.assertNotIn('secret', repr(settings))
+
+    def test_knobs(self):
+        settings = Settings.from_config(dict(
+            CONFIG,
+            FAKE_IPA_REDFISH_COALESCE_WINDOW=0.5,
+            FAKE_IPA_IMAGE_DOWNLOAD=True,
+            FAKE_IPA_IMAGE_SIZE_MB=0.5,
+            FAKE_IPA_SYSTEM_LOGS_FILE_MIX={'journal': 2, 'dmesg': 0.5},
+            FAKE_IPA_CAPTURE_FILE='',
+            FAKE_IPA_DEDUP_CACHE_SIZE=0))
+        self.assertEqual(0.5, settings.redfish_coalesce_window)
+        self.assertTrue(settings.image_download)
+        self.assertEqual(0.5, settings.image_size_mb)
+        self.assertEqual({'journal': 2, 'dmesg': 0.5},
+                         settings.system_logs_file_mix)
+        self.assertIsNone(settings.capture_file)
+        self.assertEqual(0, settings.dedup_cache_size)
+
+    def test_invalid(self):
+        for config in (
+                {},
+                dict(CONFIG, FAKE_IPA_MIN_BOOT_TIME=10,
+                     FAKE_IPA_MAX_BOOT_TIME=5),
+                dict(CONFIG, FAKE_IPA_MIN_BOOT_TIME='10'),
+                dict(CONFIG, FAKE_IPA_ADVERTISE_ADDRESS_PORT=70000),
+                dict(CONFIG, SUSHY_FAKE_IPA_LISTEN_PORT=0),
+                dict(CONFIG, FAKE_IPA_API_URL='localhost:6385'),
+                dict(CONFIG, FAKE_IPA_CERTFILE='cert.pem'),
+                dict(CONFIG, FAKE_IPA_HEARTBEATER_THREADS=0),
+                dict(CONFIG, FAKE_IPA_HEARTBEATER_THREADS=True),
+                dict(CONFIG, FAKE_IPA_HEARTBEATER_THREADS=257),
+                dict(CONFIG, FAKE_IPA_COMMAND_WAIT_TIMEOUT=0),
+                dict(CONFIG, FAKE_IPA_INSPECTION_WORKERS=0),
+                dict(CONFIG, FAKE_IPA_INSPECTION_READ_TIMEOUT=0),
+                dict(CONFIG, FAKE_IPA_REDFISH_COALESCE_WINDOW=-1),
+                dict(CONFIG, FAKE_IPA_REGISTRATION_RATE='100'),
+                dict(CONFIG, FAKE_IPA_HEARTBEAT_STRESS_THREADS=1000),
+                dict(CONFIG, FAKE_IPA_IMAGE_DOWNLOAD='yes'),
+                dict(CONFIG, FAKE_IPA_IMAGE_DOWNLOAD_PER_NODE=0),
+                dict(CONFIG, FAKE_IPA_IMAGE_DOWNLOAD_READ_TIMEOUT=0),
+                dict(CONFIG, FAKE_IPA_IMAGE_NODE_BANDWIDTH_MBIT=0),
+                dict(CONFIG, FAKE_IPA_SYSTEM_LOGS_FILE_MIX={'journal': 0}),
+                dict(CONFIG, FAKE_IPA_COMPRESSION_LEVEL=10),
+                dict(CONFIG, FAKE_IPA_SOAK_WINDOW=1),
+                dict(CONFIG, FAKE_IPA_TRACE_BUFFER_SIZE=0)):
+            self.assertRaises(ValueError, Settings.from_config, config)
+
+    def test_frozen(self):
+        settings = Settings(advertise_ip='192.0.2.1')
+        self.assertRaises(dataclasses.FrozenInstanceError, setattr,
+                          settings, 'min_boot_time', 0)
+
+
+class TestSharedSettings(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(SharedSettings, '_current', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_shared(self):
+        settings = Settings(advertise_ip='192.0.2.1')
+        APIClient.initialize({}, mock.Mock(), settings)
+        replaced = dataclasses.replace(settings, min_boot_time=0)
+        SharedSettings.set(replaced)
+        for holder in (main.app, FakeIronicPythonAgent, Heatbeater, APIClient,
+                       Heatbeater(), FakeIronicPythonAgent({}, None)):
+            self.assertIs(replaced, holder.settings)
+
+    def test_assignment(self):
+        settings = Settings(advertise_ip='192.0.2.1')
+        main.app.settings = settings
+        self.assertIs(settings, Heatbeater.settings)
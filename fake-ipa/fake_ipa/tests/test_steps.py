@@ -0,0 +1,51 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import unittest
+from unittest import mock
+
+from fake_ipa import encoding
+from fake_ipa import steps
+from fake_ipa.steps import StepCatalog
+
+
+class TestStepCatalog(unittest.TestCase):
+
+    def tearDown(self):
+        StepCatalog.initialize({}, mock.Mock())
+
+    def test_synthetic_steps(self):
+        StepCatalog.initialize({'FAKE_IPA_SYNTHETIC_STEPS': 4,
+                                'FAKE_IPA_SYNTHETIC_HARDWARE_MANAGERS': 2},
+                               mock.Mock())
+        data = json.loads(encoding.RESTJSONEncoder().encode(
+            StepCatalog.steps_response('clean')))
+        self.assertEqual(
+            ['FakeHardwareManager0', 'FakeHardwareManager1',
+             'GenericHardwareManager'], sorted(data['clean_steps']))
+        self.assertEqual(2, len(data['clean_steps']['FakeHardwareManager1']))
+
+    def test_invalid_step(self):
+        self.assertRaises(ValueError, steps._validate_steps, 'clean_steps',
+                          {'Manager': [{'step': 'x', 'priority': 'high',
+                                        'interface': 'deploy'}]})
+
+    def test_invalid_synthetic_knobs(self):
+        for config in ({'FAKE_IPA_SYNTHETIC_STEPS': 4,
+                        'FAKE_IPA_SYNTHETIC_HARDWARE_MANAGERS': 0},
+                       {'FAKE_IPA_SYNTHETIC_HARDWARE_MANAGERS': '2'},
+                       {'FAKE_IPA_SYNTHETIC_STEPS': -1},
+                       {'FAKE_IPA_SYNTHETIC_STEPS': True}):
+            self.assertRaises(ValueError, StepCatalog.initialize, config,
+                              mock.Mock())
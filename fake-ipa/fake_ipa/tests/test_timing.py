@@ -0,0 +1,139 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from fake_ipa import timing
+from fake_ipa.timing import CommandProfile
+from fake_ipa.timing import CommandTimings
+
+
+class TestDistributions(unittest.TestCase):
+
+    def test_fixed(self):
+        self.assertEqual(3.0, timing.make_distribution(
+            {'type': 'fixed', 'value': 3}).sample())
+
+    def test_uniform(self):
+        latency = timing.make_distribution(
+            {'type': 'uniform', 'min': 1, 'max': 2})
+        for _ in range(100):
+            self.assertTrue(1 <= latency.sample() <= 2)
+
+    def test_normal_floored_at_min(self):
+        latency = timing.make_distribution(
+            {'type': 'normal', 'mean': 0, 'stddev': 10, 'min': 1})
+        self.assertEqual(1, min(latency.sample() for _ in range(100)))
+
+    def test_histogram(self):
+        latency = timing.make_distribution(
+            {'type': 'histogram', 'buckets': [[10, 1], [20, 1000]]})
+        samples = [latency.sample() for _ in range(1000)]
+        self.assertTrue(all(0 <= s <= 20 for s in samples))
+        self.assertGreater(sum(s > 10 for s in samples), 900)
+
+    def test_invalid(self):
+        for spec in ({'type': 'gamma'},
+                     {'type': 'fixed'},
+                     {'type': 'fixed', 'value': -1},
+                     {'type': 'uniform', 'min': 2, 'max': 1},
+                     {'type': 'uniform', 'min': -1, 'max': 1},
+                     {'type': 'normal', 'mean': 5, 'stddev': -1},
+                     {'type': 'histogram', 'buckets': []},
+                     {'type': 'histogram', 'buckets': [[20, 1], [10, 1]]},
+                     {'type': 'histogram', 'buckets': [[-10, 1], [10, 1]]},
+                     {'type': 'histogram', 'buckets': [[10, 0], [20, 1]]},
+                     {'type': 'histogram', 'buckets': [[10, -1], [20, 2]]}):
+            self.assertRaises(ValueError, timing.make_distribution, spec)
+
+
+class TestCommandProfile(unittest.TestCase):
+
+    def _draw(self, draw, **kwargs):
+        profile = CommandProfile({'type': 'fixed', 'value': 1}, **kwargs)
+        with mock.patch.object(timing.random, 'random', return_value=draw):
+            return profile.outcome()
+
+    def test_outcome(self):
+        kwargs = {'failure_probability': 0.2, 'timeout_probability': 0.1}
+        self.assertEqual((1.0, False, True), self._draw(0.05, **kwargs))
+        self.assertEqual((1.0, True, False), self._draw(0.25, **kwargs))
+        self.assertEqual((1.0, False, False), self._draw(0.5, **kwargs))
+
+    def test_no_failure_by_default(self):
+        self.assertEqual((1.0, False, False), self._draw(0))
+
+    def test_invalid_probability(self):
+        for kwargs in ({'failure_probability': 1.5},
+                       {'timeout_probability': -0.1}):
+            self.assertRaises(ValueError, CommandProfile,
+                              {'type': 'fixed', 'value': 1}, **kwargs)
+
+
+class TestCommandTimings(unittest.TestCase):
+
+    def tearDown(self):
+        CommandTimings.initialize({}, mock.Mock())
+
+    def _value(self, command_name, command_params):
+        return CommandTimings.get_profile(
+            command_name, command_params).latency.sample()
+
+    def test_lookup_order(self):
+        CommandTimings.initialize({'FAKE_IPA_COMMAND_PROFILES': {
+            'default': {'latency': {'type': 'fixed', 'value': 1}},
+            'execute_clean_step': {'latency': {'type': 'fixed', 'value': 2}},
+            'execute_clean_step:erase_devices': {
+                'latency': {'type': 'fixed', 'value': 3}},
+        }}, mock.Mock())
+        self.assertEqual(3, self._value(
+            'execute_clean_step', {'step': {'step': 'erase_devices'}}))
+        self.assertEqual(2, self._value(
+            'execute_clean_step',
+            {'step': {'step': 'erase_devices_metadata'}}))
+        self.assertEqual(2, self._value('execute_clean_step', {}))
+        self.assertEqual(1, self._value('power_off', {}))
+
+    def test_default(self):
+        CommandTimings.initialize({}, mock.Mock())
+        for _ in range(100):
+            self.assertTrue(5 <= self._value('power_off', {}) <= 10)
+
+    def test_file_overridden_by_config(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump({
+                'power_off': {'latency': {'type': 'fixed', 'value': 1}},
+                'sync': {'latency': {'type': 'fixed', 'value': 2}},
+            }, f)
+            f.flush()
+            CommandTimings.initialize({
+                'FAKE_IPA_COMMAND_PROFILES_FILE': f.name,
+                'FAKE_IPA_COMMAND_PROFILES': {
+                    'sync': {'latency': {'type': 'fixed', 'value': 4}}},
+            }, mock.Mock())
+        self.assertEqual(1, self._value('power_off', {}))
+        self.assertEqual(4, self._value('sync', {}))
+
+    def test_invalid_profile(self):
+        for spec in ({'latency': {'type': 'fixed', 'value': -1}},
+                     {'latency': {'type': 'fixed', 'value': 1},
+                      'failure_probability': 2},
+                     {'latency': {'type': 'fixed', 'value': 1},
+                      'unknown': 1}):
+            self.assertRaises(
+                ValueError, CommandTimings.initialize,
+                {'FAKE_IPA_COMMAND_PROFILES': {'power_off': spec}},
+                mock.Mock())
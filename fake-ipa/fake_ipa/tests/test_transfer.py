@@ -0,0 +1,106 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import logging
+import threading
+import unittest
+from unittest import mock
+
+from fake_ipa import error
+from fake_ipa.settings import Settings
+from fake_ipa import transfer
+
+LOG = logging.getLogger(__name__)
+
+IMAGE = {'id': 'image', 'urls': ['http://192.0.2.1/image.qcow2'],
+         'os_hash_algo': 'sha256',
+         'os_hash_value': hashlib.sha256(b'data').hexdigest()}
+
+
+class TestBandwidthPool(unittest.TestCase):
+
+    def test_shared_bandwidth(self):
+        with mock.patch.object(transfer.time, 'monotonic', return_value=0):
+            pool = transfer.BandwidthPool(100, total_bandwidth=100)
+            first = pool.start('a', 100)
+            second = pool.start('b', 300)
+        with mock.patch.object(transfer.time, 'monotonic', return_value=2):
+            self.assertTrue(first.is_done())
+            self.assertFalse(second.is_done())
+            self.assertEqual(100, second.transferred)
+        with mock.patch.object(transfer.time, 'monotonic', return_value=4):
+            self.assertTrue(second.is_done())
+            self.assertEqual(4, second.finished)
+
+
+class TestImageDownload(unittest.TestCase):
+
+    def _session(self, data=b'data'):
+        session = mock.MagicMock()
+        resp = session.get.return_value.__enter__.return_value
+        resp.status_code = 200
+        resp.headers = {'Content-Length': str(len(data))}
+        resp.iter_content.return_value = [data]
+        return session
+
+    def test_run(self):
+        download = transfer.ImageDownload(IMAGE, 'node')
+        session = self._session()
+        download.run(session, 1024, timeout=(1, 2))
+        session.get.assert_called_once_with(IMAGE['urls'][0], stream=True,
+                                            timeout=(1, 2))
+        self.assertIsNone(download.error)
+        self.assertTrue(download.checksum_ok)
+        self.assertEqual(4, download.status()['bytes_transferred'])
+
+    def test_checksum_mismatch(self):
+        download = transfer.ImageDownload(IMAGE, 'node')
+        download.run(self._session(b'other'), 1024)
+        self.assertIsInstance(download.error, error.CommandExecutionError)
+        self.assertFalse(download.checksum_ok)
+
+    def test_unknown_algorithm(self):
+        self.assertRaises(error.InvalidCommandParamsError,
+                          transfer.ImageDownload,
+                          dict(IMAGE, os_hash_algo='nope'), 'node')
+
+
+class TestImageTransfers(unittest.TestCase):
+
+    def setUp(self):
+        transfer.ImageTransfers.initialize({}, LOG, Settings(
+            advertise_ip='192.0.2.1', image_download=True,
+            image_download_connect_timeout=1))
+        self.addCleanup(transfer.ImageTransfers.workers.shutdown)
+
+    def test_per_node_limit(self):
+        release = threading.Event()
+
+        def run(download, session, chunk_size, timeout):
+            release.wait(5)
+            download.finished = 0
+
+        with mock.patch.object(transfer.ImageDownload, 'run', autospec=True,
+                               side_effect=run) as run_mock:
+            first = transfer.ImageTransfers.start(IMAGE, 'node')
+            self.assertRaises(error.AgentIsBusy,
+                              transfer.ImageTransfers.start, IMAGE, 'node')
+            other = transfer.ImageTransfers.start(IMAGE, 'other')
+            release.set()
+            first.future.result()
+            other.future.result()
+            again = transfer.ImageTransfers.start(IMAGE, 'node')
+            again.future.result()
+        self.assertEqual((transfer.ImageTransfers.session, transfer._MB,
+                          (1, 60)), run_mock.call_args[0][1:])
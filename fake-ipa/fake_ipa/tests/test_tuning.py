@@ -0,0 +1,91 @@
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import unittest
+from unittest import mock
+
+from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.registration import BulkRegistrar
+from fake_ipa.settings import Settings
+from fake_ipa.settings import SharedSettings
+from fake_ipa.tuning import RuntimeTuning
+
+
+class FakeApplication:
+    settings = SharedSettings()
+
+
+class TestRuntimeTuning(unittest.TestCase):
+
+    def setUp(self):
+        for target, attribute, value in (
+                (SharedSettings, '_current',
+                 Settings(advertise_ip='192.0.2.1')),
+                (Heatbeater, '_threads', [mock.Mock()] * 2),
+                (Heatbeater, 'min_jitter_multiplier', 0.3),
+                (Heatbeater, 'max_jitter_multiplier', 0.6),
+                (BulkRegistrar, 'rate', 100),
+                (BulkRegistrar, 'lookup_timeout', 10)):
+            patcher = mock.patch.object(target, attribute, value,
+                                        create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(Heatbeater, 'run_heartbeater_threads',
+                                    autospec=True)
+        self.mock_run = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.logger = logging.getLogger('fake_ipa.tests.tuning')
+        for logger in (self.logger, logging.getLogger('fake_ipa')):
+            self.addCleanup(logger.setLevel, logger.level)
+        RuntimeTuning.initialize({}, self.logger, FakeApplication())
+
+    def test_update(self):
+        level = logging.getLevelName(self.logger.getEffectiveLevel())
+        parameters = RuntimeTuning.update(
+            {'heartbeater_threads': 8, 'min_boot_time': 1,
+             'log_level': 'info'}, actor='alice (192.0.2.9)')
+        self.mock_run.assert_called_once_with(8)
+        self.assertEqual(8, SharedSettings._current.heartbeater_threads)
+        self.assertEqual(1, parameters['min_boot_time'])
+        self.assertEqual('INFO', parameters['log_level'])
+        self.assertEqual(
+            [('heartbeater_threads', 2, 8, 'alice (192.0.2.9)'),
+             ('min_boot_time', 180, 1, 'alice (192.0.2.9)'),
+             ('log_level', level, 'INFO', 'alice (192.0.2.9)')],
+            [(entry['parameter'], entry['old'], entry['new'],
+              entry['actor']) for entry in RuntimeTuning.audit])
+
+    def test_unchanged_not_audited(self):
+        RuntimeTuning.update({'registration_rate': 100}, actor='alice')
+        self.assertEqual([], list(RuntimeTuning.audit))
+
+    def test_invalid(self):
+        for changes in ({'unknown': 1},
+                        {'heartbeater_threads': 0},
+                        {'heartbeater_threads': 257},
+                        {'heartbeater_threads': True},
+                        {'heartbeat_min_jitter': 1.5},
+                        {'log_level': 'LOUD'},
+                        {'min_boot_time': 10, 'max_boot_time': 5},
+                        {'heartbeat_min_jitter': 0.9}):
+            self.assertRaises(ValueError, RuntimeTuning.update, changes)
+
+    def test_all_or_nothing(self):
+        before = RuntimeTuning.get()
+        self.assertRaises(ValueError, RuntimeTuning.update,
+                          {'registration_rate': 10,
+                           'heartbeater_threads': 0})
+        self.assertEqual(before, RuntimeTuning.get())
+        self.mock_run.assert_not_called()
+        self.assertEqual([], list(RuntimeTuning.audit))
@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import itertools
+import json
+import random
+
+# Historical behaviour: every async command takes 5 to 10 seconds
+DEFAULT_PROFILE = {'latency': {'type': 'uniform', 'min': 5, 'max': 10}}
+
+
+class Fixed:
+    def __init__(self, value):
+        if value < 0:
+            raise ValueError('fixed latency must not be negative, got %s'
+                             % value)
+        self.value = float(value)
+
+    def sample(self):
+        return self.value
+
+
+class Uniform:
+    def __init__(self, min, max):
+        if min > max:
+            raise ValueError('uniform latency min %s > max %s' % (min, max))
+        if min < 0:
+            raise ValueError('uniform latency min must not be negative, '
+                             'got %s' % min)
+        self.min = float(min)
+        self.max = float(max)
+
+    def sample(self):
+        return random.uniform(self.min, self.max)
+
+
+class Normal:
+    def __init__(self, mean, stddev, min=0):
+        if stddev < 0 or min < 0:
+            raise ValueError('normal latency stddev %s and min %s must not '
+                             'be negative' % (stddev, min))
+        self.mean = float(mean)
+        self.stddev = float(stddev)
+        self.min = float(min)
+
+    def sample(self):
+        return max(self.min, random.gauss(self.mean, self.stddev))
+
+
+class Histogram:
+    """Empirical distribution, e.g. collected from real IPA logs.
+
+    :param buckets: list of ``[upper_bound, count]`` pairs sorted by upper
+        bound. A sample picks a bucket weighted by its count and then a
+        uniform value between the previous bound and its upper bound.
+    """
+
+    def __init__(self, buckets):
+        if not buckets:
+            raise ValueError('histogram latency needs at least one bucket')
+        bounds = [float(b) for b, _ in buckets]
+        if bounds != sorted(bounds):
+            raise ValueError('histogram buckets must be sorted by bound')
+        if bounds[0] < 0:
+            raise ValueError('histogram bounds must not be negative, got %s'
+                             % bounds[0])
+        if any(c <= 0 for _, c in buckets):
+            raise ValueError('histogram buckets must have a positive count')
+        self.lower = [0.0] + bounds[:-1]
+        self.upper = bounds
+        self.cumulative = list(itertools.accumulate(c for _, c in buckets))
+
+    def sample(self):
+        pick = random.uniform(0, self.cumulative[-1])
+        i = min(bisect.bisect_left(self.cumulative, pick),
+                len(self.upper) - 1)
+        return random.uniform(self.lower[i], self.upper[i])
+
+
+_DISTRIBUTIONS = {
+    'fixed': Fixed,
+    'uniform': Uniform,
+    'normal': Normal,
+    'histogram': Histogram,
+}
+
+
+def make_distribution(spec):
+    spec = dict(spec)
+    kind = spec.pop('type', None)
+    if kind not in _DISTRIBUTIONS:
+        raise ValueError('Unknown latency distribution %s, expected one of '
+                         '%s' % (kind, ', '.join(sorted(_DISTRIBUTIONS))))
+    try:
+        return _DISTRIBUTIONS[kind](**spec)
+    except TypeError as e:
+        raise ValueError('Invalid %s latency distribution: %s' % (kind, e))
+
+
+class CommandProfile:
+    """Latency and failure model of a command."""
+
+    def __init__(self, latency, failure_probability=0,
+                 timeout_probability=0):
+        for value in (failure_probability, timeout_probability):
+            if not 0 <= value <= 1:
+                raise ValueError('Probabilities must be between 0 and 1, '
+                                 'got %s' % value)
+        self.latency = make_distribution(latency)
+        self.failure_probability = failure_probability
+        self.timeout_probability = timeout_probability
+
+    def outcome(self):
+        """Draw the fate of one command execution.
+
+        :returns: a tuple (delay in seconds, fails, hangs).
+        """
+        draw = random.random()
+        hangs = draw < self.timeout_probability
+        fails = (not hangs
+                 and draw < self.timeout_probability
+                 + self.failure_probability)
+        return self.latency.sample(), fails, hangs
+
+
+class CommandTimings:
+    """Per command and per step profiles of the async commands.
+
+    Profiles are looked up by ``<command>:<step>`` for step commands, e.g.
+    ``execute_clean_step:erase_devices``, then by command name, e.g.
+    ``execute_deploy_step`` or ``power_off``, then ``default``.
+    """
+
+    profiles = {'default': CommandProfile(**DEFAULT_PROFILE)}
+
+    @classmethod
+    def initialize(cls, config, logger):
+        specs = {'default': DEFAULT_PROFILE}
+        path = config.get('FAKE_IPA_COMMAND_PROFILES_FILE')
+        if path:
+            with open(path) as f:
+                specs.update(json.load(f))
+        specs.update(config.get('FAKE_IPA_COMMAND_PROFILES') or {})
+        profiles = {}
+        for name, spec in specs.items():
+            try:
+                profiles[name] = CommandProfile(**spec)
+            except (TypeError, ValueError) as e:
+                raise ValueError('Invalid command profile %s: %s'
+                                 % (name, e))
+        cls.profiles = profiles
+        logger.info('Loaded command profiles: %s',
+                    ', '.join(sorted(profiles)))
+        return cls
+
+    @classmethod
+    def get_profile(cls, command_name, command_params):
+        step = command_params.get('step')
+        if isinstance(step, dict) and 'step' in step:
+            profile = cls.profiles.get('%s:%s' % (command_name, step['step']))
+            if profile is not None:
+                return profile
+        return cls.profiles.get(command_name, cls.profiles['default'])
@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import types
+import uuid
+
+from fake_ipa import metrics
+
+# Times are in nanoseconds since the epoch, like OTLP
+Span = collections.namedtuple('Span', [
+    'trace_id', 'span_id', 'parent_id', 'name', 'start', 'end', 'error',
+    'node', 'attributes'])
+
+
+def _trace_id(system):
+    """One trace per system, identified by its UUID."""
+    try:
+        return uuid.UUID(system['uuid']).hex
+    except (KeyError, TypeError, ValueError):
+        return hashlib.blake2b(str(system.get('uuid')).encode(),
+                               digest_size=16).hexdigest()
+
+
+class Tracer:
+    """Span tracing of the node lifecycle into an in-memory ring buffer.
+
+    Every system gets its own trace. Spans opened in the same thread while
+    another span is open, like the inspection during the boot, are its
+    children.
+    """
+
+    enabled = True
+    spans = collections.deque(maxlen=100000)
+    _local = threading.local()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._logger = logger
+        cls.enabled = settings.tracing
+        cls.spans = collections.deque(maxlen=settings.trace_buffer_size)
+        return cls
+
+    @classmethod
+    def _stack(cls):
+        try:
+            return cls._local.stack
+        except AttributeError:
+            cls._local.stack = []
+            return cls._local.stack
+
+    @classmethod
+    def record(cls, name, system, start, end=None, error=False,
+               parent_id=None, **attributes):
+        """Record a span timed by the caller.
+
+        :param start: start time in nanoseconds since the epoch.
+        :param end: end time in nanoseconds since the epoch, now if None.
+        """
+        if not cls.enabled or system is None:
+            return
+        cls.spans.append(Span(
+            _trace_id(system), os.urandom(8).hex(), parent_id, name, start,
+            end or time.time_ns(), error, system.get('name'),
+            attributes or None))
+
+    @classmethod
+    @contextlib.contextmanager
+    def span(cls, name, system, **attributes):
+        """Context manager recording a span around its block.
+
+        It yields the state of the span, setting its `error` attribute
+        marks the span as an error.
+        """
+        state = types.SimpleNamespace(error=False)
+        if not cls.enabled or system is None:
+            yield state
+            return
+        stack = cls._stack()
+        span_id = os.urandom(8).hex()
+        parent_id = stack[-1] if stack else None
+        stack.append(span_id)
+        start = time.time_ns()
+        try:
+            yield state
+        except BaseException:
+            state.error = True
+            raise
+        finally:
+            stack.pop()
+            cls.spans.append(Span(
+                _trace_id(system), span_id, parent_id, name, start,
+                time.time_ns(), state.error, system.get('name'),
+                attributes or None))
+
+    @classmethod
+    def traced(cls, name, get_system):
+        """Decorator recording a span around a function.
+
+        The span is an error if the function raises or returns False.
+
+        :param get_system: called with the arguments of the function, it
+                           returns the system the span belongs to.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    return func(*args, **kwargs)
+                with cls.span(name, get_system(*args, **kwargs)) as span:
+                    result = func(*args, **kwargs)
+                    if result is False:
+                        span.error = True
+                    return result
+            return wrapper
+        return decorator
+
+    @classmethod
+    def _select(cls, node=None):
+        spans = list(cls.spans)
+        if node:
+            trace_id = _trace_id({'uuid': node})
+            spans = [span for span in spans
+                     if span.trace_id == trace_id or span.node == node]
+        return spans
+
+    @classmethod
+    def export_jsonl(cls, node=None):
+        """Spans as JSON lines, one span per line."""
+        return ''.join(json.dumps(span._asdict()) + '\n'
+                       for span in cls._select(node))
+
+    @classmethod
+    def export_otlp(cls, node=None):
+        """Spans in the OTLP/JSON trace format."""
+        spans = []
+        for span in cls._select(node):
+            attributes = [{'key': 'node.name',
+                           'value': {'stringValue': str(span.node)}}]
+            for key, value in (span.attributes or {}).items():
+                attributes.append({'key': key,
+                                   'value': {'stringValue': str(value)}})
+            otlp_span = {
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start),
+                'endTimeUnixNano': str(span.end),
+                'attributes': attributes,
+                'status': {'code': 2 if span.error else 1},
+            }
+            if span.parent_id:
+                otlp_span['parentSpanId'] = span.parent_id
+            spans.append(otlp_span)
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': 'fake-ipa'}},
+            ]},
+            'scopeSpans': [{'scope': {'name': 'fake_ipa'}, 'spans': spans}],
+        }]}
+
+    @classmethod
+    def phases(cls):
+        """Latency percentiles in seconds of each phase across the fleet.
+
+        Besides the spans, `first_heartbeat` is the delay between the end
+        of the lookup of a node and its first heartbeat.
+        """
+        durations = collections.defaultdict(list)
+        errors = collections.Counter()
+        lookups = {}
+        first_heartbeats = {}
+        for span in cls._select():
+            durations[span.name].append((span.end - span.start) / 1e9)
+            if span.error:
+                errors[span.name] += 1
+            if span.name == 'lookup' and not span.error:
+                lookups[span.trace_id] = span.end
+            elif (span.name == 'heartbeat' and span.trace_id in lookups
+                    and span.start >= lookups[span.trace_id]
+                    and span.trace_id not in first_heartbeats):
+                first_heartbeats[span.trace_id] = (
+                    span.start - lookups[span.trace_id]) / 1e9
+        if first_heartbeats:
+            durations['first_heartbeat'] = list(first_heartbeats.values())
+        report = {}
+        for name, values in sorted(durations.items()):
+            report[name] = dict(metrics.percentiles(values, digits=6),
+                                count=len(values))
+            report[name]['errors'] = errors[name]
+        return report
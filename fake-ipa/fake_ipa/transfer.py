@@ -0,0 +1,288 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import time
+
+import requests
+
+from fake_ipa import error
+
+_MBIT = 1000 * 1000 // 8
+_MB = 1024 * 1024
+
+
+class SimulatedTransfer:
+    """An image download whose progress comes from a BandwidthPool."""
+
+    def __init__(self, pool, image_id, size):
+        self.pool = pool
+        self.image_id = image_id
+        self.size = size
+        self.transferred = 0.0
+        self.rate = 0.0
+        self.started = pool.updated
+        self.finished = None
+        self.error = None
+
+    def is_done(self):
+        self.pool.advance()
+        return self.finished is not None
+
+    def status(self):
+        """Progress of the transfer, reported in the command result."""
+        self.pool.advance()
+        elapsed = (self.finished or self.pool.updated) - self.started
+        return {
+            'image': self.image_id,
+            'bytes_transferred': int(self.transferred),
+            'bytes_total': self.size,
+            'progress': round(100.0 * self.transferred / self.size, 1)
+            if self.size else 100.0,
+            'rate_mbit': round(self.rate / _MBIT, 1),
+            'elapsed': round(elapsed, 1),
+        }
+
+
+class BandwidthPool:
+    """Fluid model of concurrent downloads sharing a link.
+
+    Every active transfer gets the same share of the aggregate bandwidth,
+    capped by the per-node bandwidth. Progress is computed lazily: each
+    call advances the model to the current time, finishing transfers and
+    redistributing their bandwidth in order.
+    """
+
+    def __init__(self, node_bandwidth, total_bandwidth=0):
+        """Construct an instance of BandwidthPool.
+
+        :param node_bandwidth: per transfer limit in bytes per second
+        :param total_bandwidth: aggregate limit in bytes per second, 0
+                                means unlimited
+        """
+        self.node_bandwidth = node_bandwidth
+        self.total_bandwidth = total_bandwidth
+        self.active = []
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def start(self, image_id, size):
+        with self._lock:
+            self._advance(time.monotonic())
+            transfer = SimulatedTransfer(self, image_id, size)
+            if size <= 0:
+                transfer.finished = self.updated
+            else:
+                self.active.append(transfer)
+                self._rebalance()
+            return transfer
+
+    def advance(self):
+        with self._lock:
+            self._advance(time.monotonic())
+
+    def _rebalance(self):
+        rate = self.node_bandwidth
+        if self.total_bandwidth and self.active:
+            rate = min(rate, self.total_bandwidth / len(self.active))
+        for transfer in self.active:
+            transfer.rate = rate
+
+    def _advance(self, now):
+        now = max(now, self.updated)
+        while self.active:
+            rate = self.active[0].rate
+            left = min(t.size - t.transferred for t in self.active)
+            finish_at = self.updated + left / rate
+            until = min(finish_at, now)
+            for transfer in self.active:
+                transfer.transferred += rate * (until - self.updated)
+            self.updated = until
+            if finish_at > now:
+                return
+            for transfer in list(self.active):
+                if transfer.size - transfer.transferred < 1:
+                    transfer.transferred = transfer.size
+                    transfer.finished = finish_at
+                    transfer.rate = 0.0
+                    self.active.remove(transfer)
+            self._rebalance()
+        self.updated = now
+
+
+class ImageDownload:
+    """A real image download, hashed and discarded chunk by chunk."""
+
+    def __init__(self, image_info, node):
+        self.image_id = image_info['id']
+        self.node = node
+        self.url = image_info['urls'][0]
+        algo = image_info.get('os_hash_algo')
+        self.expected = image_info.get('os_hash_value')
+        if not algo or not self.expected:
+            # Legacy checksum field, always md5
+            algo = 'md5'
+            self.expected = image_info.get('checksum')
+        try:
+            self.hasher = hashlib.new(algo)
+        except ValueError:
+            raise error.InvalidCommandParamsError(
+                'Unsupported checksum algorithm {} for image {}'.format(
+                    algo, self.image_id))
+        self.size = None
+        self.transferred = 0
+        self.started = time.monotonic()
+        self.first_byte = None
+        self.finished = None
+        self.checksum_ok = None
+        self.error = None
+        self.future = None
+
+    def run(self, session, chunk_size, timeout=None):
+        """Download the image.
+
+        :param session: the requests session to use
+        :param chunk_size: read size in bytes
+        :param timeout: connect and read timeouts, as passed to requests
+        """
+        self.started = time.monotonic()
+        try:
+            with session.get(self.url, stream=True, timeout=timeout) as resp:
+                if resp.status_code != requests.codes.OK:
+                    raise error.CommandExecutionError(
+                        'Error %d downloading image %s from %s'
+                        % (resp.status_code, self.image_id, self.url))
+                length = resp.headers.get('Content-Length')
+                self.size = int(length) if length else None
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    if self.first_byte is None:
+                        self.first_byte = time.monotonic()
+                    self.hasher.update(chunk)
+                    self.transferred += len(chunk)
+            if self.expected:
+                self.checksum_ok = self.hasher.hexdigest() == self.expected
+                if not self.checksum_ok:
+                    raise error.CommandExecutionError(
+                        'Image %s checksum mismatch, expected %s got %s'
+                        % (self.image_id, self.expected,
+                           self.hasher.hexdigest()))
+        except Exception as e:
+            if not isinstance(e, error.RESTError):
+                e = error.CommandExecutionError(str(e))
+            self.error = e
+        finally:
+            self.finished = time.monotonic()
+
+    def is_done(self):
+        return self.finished is not None
+
+    def status(self):
+        """Progress and statistics of the download."""
+        end = self.finished or time.monotonic()
+        elapsed = end - self.started
+        return {
+            'image': self.image_id,
+            'bytes_transferred': self.transferred,
+            'bytes_total': self.size,
+            'rate_mbit': round(self.transferred / elapsed / _MBIT, 1)
+            if elapsed else 0.0,
+            'time_to_first_byte': round(self.first_byte - self.started, 3)
+            if self.first_byte else None,
+            'checksum_ok': self.checksum_ok,
+            'elapsed': round(elapsed, 1),
+        }
+
+
+class ImageTransfers:
+    """Image downloads of all the agents.
+
+    Downloads are simulated with a BandwidthPool, unless
+    FAKE_IPA_IMAGE_DOWNLOAD is set, in which case the images are really
+    downloaded by a bounded pool of workers sharing a pooled session, with
+    a bounded number of concurrent downloads per node.
+    """
+
+    # node -> statistics of its last real download
+    stats = {}
+    # node -> semaphore bounding its concurrent real downloads
+    _node_slots = {}
+    _node_slots_lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, settings):
+        cls._logger = logger
+        cls.download = settings.image_download
+        if cls.download:
+            workers = settings.image_download_workers
+            cls.chunk_size = settings.image_download_chunk_size
+            cls.per_node = settings.image_download_per_node
+            cls.timeout = (settings.image_download_connect_timeout,
+                           settings.image_download_read_timeout)
+            cls._node_slots = {}
+            cls.session = requests.Session()
+            cls.session.verify = settings.verify
+            cls.session.cert = settings.cert
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4,
+                                                    pool_maxsize=workers)
+            cls.session.mount('http://', adapter)
+            cls.session.mount('https://', adapter)
+            cls.workers = ThreadPoolExecutor(max_workers=workers,
+                                             thread_name_prefix='image')
+        cls.image_size = int(settings.image_size_mb * _MB)
+        cls.pool = BandwidthPool(settings.image_node_bandwidth_mbit * _MBIT,
+                                 settings.image_total_bandwidth_mbit * _MBIT)
+        return cls
+
+    @classmethod
+    def start(cls, image_info, node=None):
+        if cls.download:
+            return cls._start_download(image_info, node)
+        size = image_info.get('image_size') or cls.image_size
+        cls._logger.debug('Starting simulated download of image %s, '
+                          '%d bytes', image_info.get('id'), size)
+        return cls.pool.start(image_info.get('id'), size)
+
+    @classmethod
+    def _start_download(cls, image_info, node):
+        if not image_info.get('urls'):
+            raise error.InvalidCommandParamsError(
+                'image_info of image {} has no urls'.format(image_info['id']))
+        download = ImageDownload(image_info, node)
+        with cls._node_slots_lock:
+            slots = cls._node_slots.setdefault(
+                node, threading.BoundedSemaphore(cls.per_node))
+        if not slots.acquire(blocking=False):
+            raise error.AgentIsBusy('download of image %s'
+                                    % download.image_id)
+        cls._logger.debug('Downloading image %s from %s for %s',
+                          download.image_id, download.url, node)
+
+        def _run():
+            try:
+                download.run(cls.session, cls.chunk_size, cls.timeout)
+            finally:
+                slots.release()
+            stats = download.status()
+            cls.stats[node] = stats
+            if download.error:
+                cls._logger.error('Download of image %s for %s failed: %s',
+                                  download.image_id, node, download.error)
+            else:
+                cls._logger.info('Downloaded image %s for %s: %s',
+                                 download.image_id, node, stats)
+
+        download.future = cls.workers.submit(_run)
+        return download
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+# Copyright 2024 Ericsson Software Technology
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+import collections
+import dataclasses
+import logging
+import threading
+import time
+
+from fake_ipa.heartbeater import Heatbeater
+from fake_ipa.registration import BulkRegistrar
+from fake_ipa.settings import MAX_HEARTBEATER_THREADS
+from fake_ipa.settings import SharedSettings
+
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+
+def _int(minimum, maximum=None):
+    def check(name, value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError('%s must be an integer, got %r' % (name, value))
+        if value < minimum:
+            raise ValueError('%s must be at least %d, got %d'
+                             % (name, minimum, value))
+        if maximum is not None and value > maximum:
+            raise ValueError('%s must be at most %d, got %d'
+                             % (name, maximum, value))
+        return value
+    return check
+
+
+def _multiplier(name, value):
+    if (isinstance(value, bool) or not isinstance(value, (int, float))
+            or not 0 < value <= 1):
+        raise ValueError('%s must be a number in ]0, 1], got %r'
+                         % (name, value))
+    return value
+
+
+def _log_level(name, value):
+    if not isinstance(value, str) or value.upper() not in LOG_LEVELS:
+        raise ValueError('%s must be one of %s, got %r'
+                         % (name, ', '.join(LOG_LEVELS), value))
+    return value.upper()
+
+
+class RuntimeTuning:
+    """Tuning parameters read and updated while FakeIPA runs.
+
+    Updates are validated together and applied to the running components:
+    the heartbeater pool is resized, the agents and schedulers read the new
+    values on their next iteration. Every change is audit logged.
+    """
+
+    audit = collections.deque(maxlen=1000)
+    _lock = threading.Lock()
+
+    @classmethod
+    def initialize(cls, config, logger, api):
+        cls._logger = logger
+        cls.api = api
+        cls.audit = collections.deque(maxlen=api.settings.tuning_audit_size)
+        return cls
+
+    @classmethod
+    def _parameters(cls):
+        """Map of parameter name to (validator, getter, setter)."""
+        return {
+            'heartbeater_threads': (
+                _int(1, MAX_HEARTBEATER_THREADS), Heatbeater.nb_threads,
+                cls._set_heartbeater_threads),
+            'heartbeat_min_jitter': (
+                _multiplier,
+                lambda: Heatbeater.min_jitter_multiplier,
+                lambda value: setattr(Heatbeater, 'min_jitter_multiplier',
+                                      value)),
+            'heartbeat_max_jitter': (
+                _multiplier,
+                lambda: Heatbeater.max_jitter_multiplier,
+                lambda value: setattr(Heatbeater, 'max_jitter_multiplier',
+                                      value)),
+            'min_boot_time': (
+                _int(0), lambda: cls.api.settings.min_boot_time,
+                lambda value: cls._set_setting('min_boot_time', value)),
+            'max_boot_time': (
+                _int(0), lambda: cls.api.settings.max_boot_time,
+                lambda value: cls._set_setting('max_boot_time', value)),
+            'registration_rate': (
+                _int(1), lambda: BulkRegistrar.rate,
+                lambda value: setattr(BulkRegistrar, 'rate', value)),
+            'registration_lookup_timeout': (
+                _int(1), lambda: BulkRegistrar.lookup_timeout,
+                lambda value: setattr(BulkRegistrar, 'lookup_timeout',
+                                      value)),
+            'log_level': (
+                _log_level,
+                lambda: logging.getLevelName(
+                    cls._logger.getEffectiveLevel()),
+                cls._set_log_level),
+        }
+
+    @classmethod
+    def _set_setting(cls, name, value):
+        # Shared by all the components, see SharedSettings
+        SharedSettings.set(dataclasses.replace(cls.api.settings,
+                                               **{name: value}))
+
+    @classmethod
+    def _set_heartbeater_threads(cls, value):
+        Heatbeater.run_heartbeater_threads(value)
+        cls._set_setting('heartbeater_threads', value)
+
+    @classmethod
+    def _set_log_level(cls, value):
+        cls._logger.setLevel(value)
+        # Module loggers of the extensions
+        logging.getLogger('fake_ipa').setLevel(value)
+
+    @classmethod
+    def get(cls):
+        return {name: getter()
+                for name, (_, getter, _) in cls._parameters().items()}
+
+    @classmethod
+    def update(cls, changes, actor=None):
+        """Validate and apply tuning changes.
+
+        :param changes: dict of parameter name to new value.
+        :param actor: who requested the changes, recorded in the audit log.
+        :raises: ValueError if a parameter is unknown or a value invalid,
+                 nothing is changed then.
+        :returns: the parameters after the update.
+        """
+        parameters = cls._parameters()
+        unknown = sorted(set(changes) - set(parameters))
+        if unknown:
+            raise ValueError('Unknown tuning parameters: %s'
+                             % ', '.join(unknown))
+        with cls._lock:
+            current = cls.get()
+            values = {name: parameters[name][0](name, value)
+                      for name, value in changes.items()}
+            updated = dict(current, **values)
+            if updated['min_boot_time'] > updated['max_boot_time']:
+                raise ValueError('min_boot_time is greater than '
+                                 'max_boot_time')
+            if (updated['heartbeat_min_jitter']
+                    > updated['heartbeat_max_jitter']):
+                raise ValueError('heartbeat_min_jitter is greater than '
+                                 'heartbeat_max_jitter')
+            for name, value in values.items():
+                if value == current[name]:
+                    continue
+                parameters[name][2](value)
+                cls.audit.append({'time': time.time(), 'actor': actor,
+                                  'parameter': name, 'old': current[name],
+                                  'new': value})
+                cls._logger.warning('Tuning: %s changed from %r to %r by %s',
+                                    name, current[name], value, actor)
+            return cls.get()
@@ -0,0 +1,9 @@
+# FakeIPA configuration for fake-ipa-fleet, with the Ironic stand-in
+# listening on the same host.
+FAKE_IPA_API_URL = "http://127.0.0.1:6385"
+FAKE_IPA_INSPECTION_CALLBACK_URL = "http://127.0.0.1:6385/v1/continue_inspection"
+FAKE_IPA_REDFISH_URL = "http://127.0.0.1:6385"
+FAKE_IPA_ADVERTISE_ADDRESS_IP = "127.0.0.1"
+FAKE_IPA_MIN_BOOT_TIME = 1
+FAKE_IPA_MAX_BOOT_TIME = 5
+FAKE_IPA_IMAGE_SIZE_MB = 512